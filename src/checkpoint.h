@@ -0,0 +1,115 @@
+#pragma once
+
+#include <cstdint>
+#include <cstring>
+#include <filesystem>
+#include <fstream>
+#include <memory>
+#include <string>
+#include <string_view>
+#include <nlohmann/json.hpp>
+
+#include "rocksdb/db.h"
+#include "utilities/checkpoint.h"
+
+// A database saved at the end of the load phase of a trace (--checkpoint),
+// so later runs start from it and replay only the phases after the load.
+// INFO next to the RocksDB files records the trace, how many of its
+// operations went into the database and a hash of them.
+namespace checkpoint {
+  inline const std::string INFO = "harness.json";
+
+  // Hash of the lines of a load phase. Tectonic and YCSB draw new keys every
+  // time they generate a workload, so a checkpoint only fits the trace whose
+  // load phase hashes the same, the number of operations doesn't tell.
+  // Mixes 8 bytes at a time, it runs on every line the harness reads.
+  struct Hash {
+    uint64_t value = 0xcbf29ce484222325;
+
+    void update(const std::string_view line) {
+      size_t i = 0;
+      for (; i + sizeof(uint64_t) <= line.size(); i += sizeof(uint64_t)) {
+        uint64_t word;
+        std::memcpy(&word, line.data() + i, sizeof(word));
+        mix(word);
+      }
+      uint64_t rest = 0;
+      std::memcpy(&rest, line.data() + i, line.size() - i);
+      mix(rest);
+      mix(line.size());
+    }
+
+  private:
+    void mix(const uint64_t word) {
+      value = (value ^ word) * 0x9e3779b97f4a7c15;
+      value ^= value >> 32;
+    }
+  };
+
+  struct Info {
+    std::string workload;
+    std::string phase;
+    size_t lines = 0;
+    uint64_t hash = 0;
+  };
+
+  inline rocksdb::Status save(rocksdb::DB *db, const std::string &dir, const Info &info) {
+    rocksdb::Checkpoint *created;
+    rocksdb::Status s = rocksdb::Checkpoint::Create(db, &created);
+    if (!s.ok()) return s;
+    const std::unique_ptr<rocksdb::Checkpoint> checkpoint(created);
+    // Saved under a temporary name with its INFO and then renamed, so a
+    // crash never leaves a checkpoint that a later run would restore.
+    const std::string tmp = dir + ".tmp";
+    std::error_code error;
+    std::filesystem::remove_all(tmp, error);
+    // Flushes the memtables first, so opening a clone doesn't replay a WAL.
+    s = checkpoint->CreateCheckpoint(tmp);
+    if (!s.ok()) return s;
+
+    {
+      std::ofstream file(std::filesystem::path(tmp) / INFO);
+      file << nlohmann::json{{"workload", info.workload}, {"phase", info.phase}, {"lines", info.lines}, {"hash", info.hash}}
+                .dump()
+           << '\n';
+      if (!file) return rocksdb::Status::IOError("couldn't write " + INFO);
+    }
+    std::filesystem::rename(tmp, dir, error);
+    return error ? rocksdb::Status::IOError("couldn't rename checkpoint: " + error.message()) : rocksdb::Status::OK();
+  }
+
+  inline Info load_info(const std::string &dir) {
+    std::ifstream file(std::filesystem::path(dir) / INFO);
+    const nlohmann::json info = nlohmann::json::parse(file, nullptr, false);
+    if (!info.is_object()) return {};
+    return {
+      info.value("workload", ""), info.value("phase", ""), info.value("lines", size_t{0}), info.value("hash", uint64_t{0})
+    };
+  }
+
+  // Replaces `db_name` with a copy of the checkpoint. Table and blob files
+  // are immutable and hard linked (copied where that fails, e.g. across file
+  // systems), so a clone takes no space. RocksDB deletes them from the clone
+  // when they get compacted away, that only drops the link.
+  inline rocksdb::Status clone(const std::string &dir, const std::string &db_name) {
+    namespace fs = std::filesystem;
+    try {
+      fs::remove_all(db_name);
+      fs::create_directories(db_name);
+      for (const fs::directory_entry &entry : fs::directory_iterator(dir)) {
+        const fs::path &from = entry.path();
+        if (from.filename() == INFO) continue;
+        const fs::path to = fs::path(db_name) / from.filename();
+        std::error_code linked;
+        if (from.extension() == ".sst" || from.extension() == ".blob")
+          fs::create_hard_link(from, to, linked);
+        else
+          linked = std::make_error_code(std::errc::operation_not_supported);
+        if (linked) fs::copy_file(from, to);
+      }
+    } catch (const fs::filesystem_error &e) {
+      return rocksdb::Status::IOError(e.what());
+    }
+    return rocksdb::Status::OK();
+  }
+}
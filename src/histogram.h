@@ -0,0 +1,166 @@
+#pragma once
+
+#include <algorithm>
+#include <array>
+#include <atomic>
+#include <cmath>
+#include <cstdint>
+#include <functional>
+#include <limits>
+#include <nlohmann/json.hpp>
+
+namespace stats {
+  // Log-bucketed latency histogram in the style of HdrHistogram. Values below
+  // 2^SUB_BITS get a bucket each, larger values are bucketed by their top
+  // SUB_BITS bits, so a bucket is at most 1/2^(SUB_BITS-1) of its lower bound
+  // wide. Memory is constant (BUCKETS counters) however many values are
+  // recorded, and histograms with the same SUB_BITS merge by adding counts.
+  class Histogram {
+  public:
+    static constexpr int SUB_BITS = 7;
+    static constexpr uint64_t SUB_COUNT = uint64_t{1} << SUB_BITS;
+    static constexpr uint64_t HALF_SUB_COUNT = SUB_COUNT / 2;
+    static constexpr size_t BUCKETS = (64 - SUB_BITS) * HALF_SUB_COUNT + SUB_COUNT;
+
+    static size_t bucket(const uint64_t value) {
+      if (value < SUB_COUNT) return value;
+      const int shift = 64 - __builtin_clzll(value) - SUB_BITS;
+      return shift * HALF_SUB_COUNT + (value >> shift);
+    }
+
+    // Largest value that falls into bucket i.
+    static uint64_t bucket_max(const size_t i) {
+      if (i < SUB_COUNT) return i;
+      const size_t shift = i / HALF_SUB_COUNT - 1;
+      return ((i - shift * HALF_SUB_COUNT + 1) << shift) - 1;
+    }
+
+    void record(const uint64_t value) {
+      counts_[bucket(value)]++;
+      count_++;
+      sum_ += value;
+      min_ = std::min(min_, value);
+      max_ = std::max(max_, value);
+    }
+
+    void merge(const Histogram &other) {
+      for (size_t i = 0; i < BUCKETS; i++) counts_[i] += other.counts_[i];
+      count_ += other.count_;
+      sum_ += other.sum_;
+      min_ = std::min(min_, other.min_);
+      max_ = std::max(max_, other.max_);
+    }
+
+    void reset() { *this = Histogram(); }
+
+    [[nodiscard]] uint64_t count() const { return count_; }
+    [[nodiscard]] uint64_t max() const { return max_; }
+
+    // Upper end of the bucket holding the p-th percentile, clamped to the
+    // recorded range, so it is never below the exact percentile.
+    [[nodiscard]] uint64_t percentile(const double p) const {
+      if (count_ == 0) return 0;
+      const auto rank = std::max<uint64_t>(1, static_cast<uint64_t>(std::ceil(p / 100.0 * count_)));
+      uint64_t seen = 0;
+      for (size_t i = 0; i < BUCKETS; i++) {
+        seen += counts_[i];
+        if (seen >= rank) return std::clamp(bucket_max(i), min_, max_);
+      }
+      return max_;
+    }
+
+    // Only the non-empty buckets, as parallel index and count arrays.
+    [[nodiscard]] nlohmann::json to_json() const {
+      nlohmann::json index = nlohmann::json::array();
+      nlohmann::json counts = nlohmann::json::array();
+      for (size_t i = 0; i < BUCKETS; i++) {
+        if (counts_[i] == 0) continue;
+        index.push_back(i);
+        counts.push_back(counts_[i]);
+      }
+      return {
+        {"sub_bits", SUB_BITS},
+        {"count", count_},
+        {"sum", sum_},
+        {"min", count_ ? min_ : 0},
+        {"max", max_},
+        {"index", index},
+        {"counts", counts},
+      };
+    }
+
+  private:
+    friend class ConcurrentHistogram;
+
+    std::array<uint64_t, BUCKETS> counts_{};
+    uint64_t count_ = 0;
+    uint64_t sum_ = 0;
+    uint64_t min_ = std::numeric_limits<uint64_t>::max();
+    uint64_t max_ = 0;
+  };
+
+  // Histogram one thread records into while another one takes what was
+  // recorded since its last `take`, without locks. Counts only grow, so the
+  // recording thread updates them with plain atomic stores and `take`
+  // subtracts the counts it saw the last time. A value recorded during a
+  // `take` lands in this or the next one.
+  class ConcurrentHistogram {
+  public:
+    static constexpr uint64_t NO_MIN = std::numeric_limits<uint64_t>::max();
+
+    // Only ever called by the same thread.
+    void record(const uint64_t value) {
+      if (value < min_.load(std::memory_order_relaxed)) exchange_if(min_, value, std::less<>());
+      if (value > max_.load(std::memory_order_relaxed)) exchange_if(max_, value, std::greater<>());
+      add(sum_, value);
+      // Released after min and max, so a take that sees the value sees them too.
+      std::atomic<uint64_t> &count = counts_[Histogram::bucket(value)];
+      count.store(count.load(std::memory_order_relaxed) + 1, std::memory_order_release);
+    }
+
+    // Only ever called by one thread at a time.
+    [[nodiscard]] Histogram take() {
+      Histogram h;
+      for (size_t i = 0; i < Histogram::BUCKETS; i++) {
+        const uint64_t count = counts_[i].load(std::memory_order_acquire);
+        h.counts_[i] = count - taken_[i];
+        h.count_ += h.counts_[i];
+        taken_[i] = count;
+      }
+      const uint64_t sum = sum_.load(std::memory_order_relaxed);
+      h.sum_ = sum - taken_sum_;
+      taken_sum_ = sum;
+      h.min_ = min_.exchange(NO_MIN, std::memory_order_relaxed);
+      h.max_ = max_.exchange(0, std::memory_order_relaxed);
+      if (h.count_ > 0) {
+        // A value whose min and max went to the previous take, keep them in its bucket range.
+        size_t lowest = 0, highest = Histogram::BUCKETS - 1;
+        while (h.counts_[lowest] == 0) lowest++;
+        while (h.counts_[highest] == 0) highest--;
+        h.min_ = std::min(h.min_, Histogram::bucket_max(lowest));
+        h.max_ = std::max({h.max_, h.min_, highest == 0 ? 0 : Histogram::bucket_max(highest - 1) + 1});
+      }
+      return h;
+    }
+
+  private:
+    static void add(std::atomic<uint64_t> &a, const uint64_t n) {
+      a.store(a.load(std::memory_order_relaxed) + n, std::memory_order_relaxed);
+    }
+
+    // `take` resets min and max concurrently, so they can't just be stored.
+    template <typename Compare>
+    static void exchange_if(std::atomic<uint64_t> &a, const uint64_t value, Compare better) {
+      uint64_t current = a.load(std::memory_order_relaxed);
+      while (better(value, current) && !a.compare_exchange_weak(current, value, std::memory_order_relaxed)) {}
+    }
+
+    std::array<std::atomic<uint64_t>, Histogram::BUCKETS> counts_{};
+    std::atomic<uint64_t> sum_ = 0;
+    std::atomic<uint64_t> min_ = NO_MIN;
+    std::atomic<uint64_t> max_ = 0;
+    // Only touched by `take`: the cumulative counts at the last one.
+    std::array<uint64_t, Histogram::BUCKETS> taken_{};
+    uint64_t taken_sum_ = 0;
+  };
+}
@@ -2,15 +2,28 @@
 #include "rocksdb/db.h"
 #include "utilities/options_util.h"
 
+#include <charconv>
 #include <cstdlib>
+#include <filesystem>
 #include <fstream>
+#include <limits>
 #include <memory>
+#include <optional>
+#include <string_view>
+#include <thread>
 #include <fmt/base.h>
 #include <nlohmann/json.hpp>
 
 #include "iostats_context.h"
+#include "merge_operator.h"
 #include "perf_context.h"
 #include "statistics.h"
+#include "checkpoint.h"
+#include "histogram.h"
+#include "sampler.h"
+#include "timeline.h"
+#include "queue.h"
+#include "trace.h"
 #include "../cmake-build-debug/_deps/fmt-src/include/fmt/xchar.h"
 
 using json = nlohmann::json;
@@ -57,122 +70,620 @@ std::tuple<rocksdb::Status, rocksdb::Options, rocksdb::ReadOptions, rocksdb::Wri
     exit(EXIT_FAILURE);        \
   } while (0)
 
-namespace stats {
-  double percentile(const std::vector<uint64_t> &data, double percentile) {
-    if (data.empty()) return 0.0;
-    if (percentile < 0.0 || percentile > 100.0) throw std::out_of_range("percentile out of range");
+#ifdef STATS
+constexpr bool STATS_ENABLED = true;
+#else
+constexpr bool STATS_ENABLED = false;
+#endif
 
-    const size_t len = data.size();
-    const double pos = (percentile / 100.0) * static_cast<double>(len - 1); // fractional index
-    const auto idx = static_cast<size_t>(pos);
-    const double frac = pos - static_cast<double>(idx);
+// With --batch-size, WRITE_BATCH and MULTI_GET hold the latency of whole
+// batches and every operation in a batch gets the batch latency divided by
+// the batch size.
+enum Op : size_t {
+  INSERT,
+  UPDATE,
+  POINT_QUERY,
+  MERGE,
+  POINT_DELETE,
+  RANGE_DELETE,
+  RANGE_QUERY,
+  WRITE_BATCH,
+  MULTI_GET,
+  N_OPS,
+};
+const std::vector<std::string> OP_NAMES = {
+  "insert",
+  "update",
+  "point query",
+  "merge",
+  "point delete",
+  "range delete",
+  "range query",
+  "write batch",
+  "multiget",
+};
+
+// How the trace is split over replay threads: by key keeps the order of the
+// operations on every key, round robin balances the threads best.
+enum class Partition { KEY_HASH, ROUND_ROBIN };
+
+// What follows the start key of a range query, Tectonic's `range_format`:
+// the number of keys to read, or the end key (exclusive).
+enum class RangeFormat { START_COUNT, START_END };
+
+struct Config {
+  std::string rocksdb_options_filename;
+  std::string workload_filename;
+  std::string stats_filename;    // STATS only
+  std::string latency_filename;  // STATS only
+  std::string timeline_filename; // empty for no timeline
+  std::string properties_filename; // empty for no property sampling
+  std::chrono::milliseconds interval{1000}; // of the timeline and the property sampler
+  size_t threads = 1;
+  Partition partition = Partition::KEY_HASH;
+  size_t batch_size = 1; // 1 for no batching
+  std::string merge_operator; // empty to keep the one in the options file
+  RangeFormat range_format = RangeFormat::START_END;
+  std::string checkpoint_dir; // empty for no checkpoint
+  std::string load_phase = "load";
+  // Name and number of operations of every phase (--phases), empty to split at phase markers.
+  std::vector<std::pair<std::string, size_t>> phases;
+};
+
+void usage(const char *program) {
+  fmt::println(
+    stderr,
+    "Usage: {} [--timeline <file>] [--properties <file>] [--interval-ms <ms>] [--threads <n>] [--partition hash|round-robin] "
+    "[--batch-size <n>] [--merge-operator <id>] [--range-format start-end|start-count] "
+    "[--checkpoint <dir> [--load-phase <name>]] [--phases <name>=<ops>,...] "
+    "<rocksdb-options> <workload-file|->{}",
+    program,
+    STATS_ENABLED ? " <stats-file> <latency-file>" : ""
+  );
+}
+
+// `load=1000,run=5000` as {{"load", 1000}, {"run", 5000}}, nothing if it doesn't parse.
+std::optional<std::vector<std::pair<std::string, size_t>>> parse_phases(const std::string_view value) {
+  std::vector<std::pair<std::string, size_t>> phases;
+  for (size_t start = 0; start <= value.size();) {
+    const size_t end = std::min(value.find(',', start), value.size());
+    const std::string_view phase = value.substr(start, end - start);
+    const size_t eq = phase.find('=');
+    if (eq == 0 || eq == std::string_view::npos) return std::nullopt;
+    const std::string_view ops = phase.substr(eq + 1);
+    size_t n = 0;
+    const auto [end_of_n, error] = std::from_chars(ops.data(), ops.data() + ops.size(), n);
+    if (error != std::errc() || end_of_n != ops.data() + ops.size()) return std::nullopt;
+    phases.emplace_back(phase.substr(0, eq), n);
+    start = end + 1;
+  }
+  return phases;
+}
 
-    const auto v1 = static_cast<double>(data[idx]);
-    if (idx + 1 < len) {
-      const auto v2 = static_cast<double>(data[idx + 1]);
-      return (v1 * (1.0 - frac)) + (v2 * frac); // linear interpolation
+Config parse_args(const int argc, char *argv[]) {
+  Config config;
+  std::vector<std::string> positional;
+  for (int i = 1; i < argc; i++) {
+    const std::string arg = argv[i];
+    if (arg.rfind("--", 0) != 0) {
+      positional.push_back(arg);
+      continue;
+    }
+    if (i + 1 == argc) {
+      fmt::println(stderr, "Error: missing value for {}", arg);
+      usage(argv[0]);
+      exit(EXIT_FAILURE);
+    }
+    const std::string value = argv[++i];
+    if (arg == "--timeline") {
+      config.timeline_filename = value;
+    } else if (arg == "--properties") {
+      config.properties_filename = value;
+    } else if (arg == "--interval-ms") {
+      config.interval = std::chrono::milliseconds(std::stoul(value));
+    } else if (arg == "--threads") {
+      config.threads = std::max<size_t>(1, std::stoul(value));
+    } else if (arg == "--partition" && (value == "hash" || value == "round-robin")) {
+      config.partition = value == "hash" ? Partition::KEY_HASH : Partition::ROUND_ROBIN;
+    } else if (arg == "--batch-size") {
+      config.batch_size = std::max<size_t>(1, std::stoul(value));
+    } else if (arg == "--merge-operator") {
+      config.merge_operator = value;
+    } else if (arg == "--range-format" && (value == "start-end" || value == "start-count")) {
+      config.range_format = value == "start-end" ? RangeFormat::START_END : RangeFormat::START_COUNT;
+    } else if (arg == "--checkpoint") {
+      config.checkpoint_dir = value;
+    } else if (arg == "--load-phase") {
+      config.load_phase = value;
+    } else if (arg == "--phases" && parse_phases(value)) {
+      config.phases = *parse_phases(value);
+    } else {
+      fmt::println(stderr, "Error: unknown option {} {}", arg, value);
+      usage(argv[0]);
+      exit(EXIT_FAILURE);
     }
-    return v1;
   }
 
-  void dump_latency(std::ofstream &file, const std::vector<uint64_t> &data, const std::string &operation) {
-    file << operation << std::endl;
-    file << "p0," << percentile(data, 0) << std::endl;
-    file << "p25," << percentile(data, 25) << std::endl;
-    file << "p50," << percentile(data, 50) << std::endl;
-    file << "p75," << percentile(data, 75) << std::endl;
-    file << "p95," << percentile(data, 95) << std::endl;
+  if (positional.size() < (STATS_ENABLED ? 4 : 2)) {
+    fmt::println(stderr, "Error: not enough arguments.");
+    usage(argv[0]);
+    exit(EXIT_FAILURE);
   }
+  config.rocksdb_options_filename = positional[0];
+  config.workload_filename = positional[1];
+#ifdef STATS
+  config.stats_filename = positional[2];
+  config.latency_filename = positional[3];
+#endif // STATS
+  return config;
 }
 
-[[nodiscard]] rocksdb::Status benchmark(
-  const std::string &rocksdb_options_filename,
-  const std::string &workload_filename,
-#ifdef STATS
-  const std::string &stats_filename,
-  const std::string &latency_filename,
-#endif
-  const std::string &db_name = "./db"
+using Latencies = std::array<stats::Histogram, N_OPS>;
+
+// Bounded so the reader can't run far ahead of the replay threads.
+constexpr size_t QUEUE_CAPACITY = 4096;
+
+rocksdb::Slice to_slice(const std::string_view s) { return {s.data(), s.size()}; }
+
+// Consecutive writes (I/U/M/D/R) or point queries of one replay thread, waiting to be
+// sent as a single WriteBatch or MultiGet. Only one of the two is ever
+// pending, any other operation sends it first.
+struct Batch {
+  rocksdb::WriteBatch writes;
+  std::vector<Op> write_ops;
+  std::vector<rocksdb::Slice> keys;
+  std::vector<std::string> key_copies; // what `keys` point to when lines don't outlive execute
+};
+
+struct Replayer {
+  rocksdb::DB *db;
+  rocksdb::ReadOptions read_opts;
+  rocksdb::WriteOptions write_opts;
+  stats::Timeline *timeline;
+  bool timed;
+  size_t batch_size;
+  RangeFormat range_format;
+  bool stable_lines; // false for a streamed trace, see TraceReader
+
+  void record(const size_t thread, const Op op, const hrc::time_point start, Latencies &latency) const {
+    if (!timed) return;
+    const auto now = hrc::now();
+    const uint64_t elapsed = std::chrono::duration_cast<ns>(now - start).count();
+    if constexpr (STATS_ENABLED) latency[op].record(elapsed);
+    if (timeline) timeline->record(thread, op, elapsed);
+  }
+
+  // Records the batch as `batch_op` and each of `ops` with its share of the batch latency.
+  void record_batch(
+    const size_t thread,
+    const Op batch_op,
+    const std::vector<Op> &ops,
+    const hrc::time_point start,
+    Latencies &latency
+  ) const {
+    if (!timed) return;
+    const auto now = hrc::now();
+    const uint64_t elapsed = std::chrono::duration_cast<ns>(now - start).count();
+    const uint64_t per_op = elapsed / ops.size();
+    if constexpr (STATS_ENABLED) {
+      latency[batch_op].record(elapsed);
+      for (const Op op : ops) latency[op].record(per_op);
+    }
+    if (timeline) {
+      timeline->record(thread, batch_op, elapsed);
+      for (const Op op : ops) timeline->record(thread, op, per_op);
+    }
+  }
+
+  void flush_writes(const size_t thread, Batch &batch, Latencies &latency) const {
+    if (batch.write_ops.empty()) return;
+    const auto start = timed ? hrc::now() : hrc::time_point();
+    const rocksdb::Status s = db->Write(write_opts, &batch.writes);
+    record_batch(thread, WRITE_BATCH, batch.write_ops, start, latency);
+    if (!s.ok()) fmt::println(stderr, "Error writing batch {}", s.ToString());
+    batch.writes.Clear();
+    batch.write_ops.clear();
+  }
+
+  void flush_reads(const size_t thread, Batch &batch, Latencies &latency) const {
+    if (batch.keys.empty()) return;
+    const size_t n = batch.keys.size();
+    std::vector<rocksdb::PinnableSlice> values(n);
+    std::vector<rocksdb::Status> statuses(n);
+    const auto start = timed ? hrc::now() : hrc::time_point();
+    db->MultiGet(read_opts, db->DefaultColumnFamily(), n, batch.keys.data(), values.data(), statuses.data());
+    record_batch(thread, MULTI_GET, std::vector<Op>(n, POINT_QUERY), start, latency);
+    for (const rocksdb::Status &s : statuses) {
+      if (!s.ok() && !s.IsNotFound()) fmt::println(stderr, "Error point querying {}", s.ToString());
+    }
+    batch.keys.clear();
+  }
+
+  // Sends whatever is pending, at the end of the trace.
+  void flush(const size_t thread, Batch &batch, Latencies &latency) const {
+    flush_writes(thread, batch, latency);
+    flush_reads(thread, batch, latency);
+  }
+
+  // Number of keys a range query with argument `arg` reads at most, none if
+  // it is START_COUNT and `arg` is no count.
+  std::optional<size_t> range_limit(const std::string_view arg) const {
+    if (range_format == RangeFormat::START_END) return std::numeric_limits<size_t>::max();
+    size_t limit = 0;
+    const auto [end, error] = std::from_chars(arg.data(), arg.data() + arg.size(), limit);
+    if (error != std::errc() || end != arg.data() + arg.size()) return std::nullopt;
+    return limit;
+  }
+
+  // Reads at most `limit` keys of the range starting at `start`, `arg` is its end with START_END.
+  rocksdb::Status scan(const rocksdb::Slice &start, const std::string_view arg, const size_t limit) const {
+    rocksdb::ReadOptions opts = read_opts;
+    const rocksdb::Slice end = to_slice(arg);
+    if (range_format == RangeFormat::START_END) opts.iterate_upper_bound = &end;
+
+    const std::unique_ptr<rocksdb::Iterator> it(db->NewIterator(opts));
+    size_t n = 0;
+    for (it->Seek(start); it->Valid() && n < limit; it->Next()) n++;
+    return it->status();
+  }
+
+  // `line` points into the mapped trace, keys and values go to RocksDB without
+  // a copy. Lines of a streamed trace are gone once this returns.
+  void execute(const std::string_view line, const size_t thread, Batch &batch, Latencies &latency) const {
+    rocksdb::Status s;
+    const TraceLine parsed = parse_line(line);
+    const std::string_view operation = parsed.op;
+    const rocksdb::Slice key = to_slice(parsed.key);
+    const rocksdb::Slice arg = to_slice(parsed.arg);
+
+    if (batch_size > 1) {
+      if (operation == "I" || operation == "U" || operation == "M" || operation == "D" || operation == "R") {
+        flush_reads(thread, batch, latency);
+        if (operation == "M") {
+          s = batch.writes.Merge(key, arg);
+          batch.write_ops.push_back(MERGE);
+        } else if (operation == "D") {
+          s = batch.writes.Delete(key);
+          batch.write_ops.push_back(POINT_DELETE);
+        } else if (operation == "R") {
+          s = batch.writes.DeleteRange(key, arg);
+          batch.write_ops.push_back(RANGE_DELETE);
+        } else {
+          s = batch.writes.Put(key, arg);
+          batch.write_ops.push_back(operation == "I" ? INSERT : UPDATE);
+        }
+        if (!s.ok()) fmt::println(stderr, "Error batching write {}", s.ToString());
+        if (batch.write_ops.size() == batch_size) flush_writes(thread, batch, latency);
+        return;
+      }
+      if (operation == "P") {
+        flush_writes(thread, batch, latency);
+        if (stable_lines) {
+          batch.keys.push_back(key);
+        } else {
+          // Sized once before the first copy, so the copies never move.
+          if (batch.key_copies.size() < batch_size) batch.key_copies.resize(batch_size);
+          std::string &copy = batch.key_copies[batch.keys.size()];
+          copy.assign(parsed.key);
+          batch.keys.push_back(to_slice(copy));
+        }
+        if (batch.keys.size() == batch_size) flush_reads(thread, batch, latency);
+        return;
+      }
+      flush(thread, batch, latency);
+    }
+
+    const auto start = timed ? hrc::now() : hrc::time_point();
+    if (operation == "I") {
+      s = db->Put(write_opts, key, arg);
+      record(thread, INSERT, start, latency);
+      if (!s.ok()) fmt::println(stderr, "Error inserting {}", s.ToString());
+    } else if (operation == "P") {
+      std::string value;
+      s = db->Get(read_opts, key, &value);
+      record(thread, POINT_QUERY, start, latency);
+      if (!s.ok() && !s.IsNotFound()) fmt::println(stderr, "Error point querying {}", s.ToString());
+    } else if (operation == "U") {
+      s = db->Put(write_opts, key, arg);
+      record(thread, UPDATE, start, latency);
+      if (!s.ok()) fmt::println(stderr, "Error updating {}", s.ToString());
+    } else if (operation == "M") {
+      s = db->Merge(write_opts, key, arg);
+      record(thread, MERGE, start, latency);
+      if (!s.ok()) fmt::println(stderr, "Error merging {}", s.ToString());
+    } else if (operation == "D") {
+      s = db->Delete(write_opts, key);
+      record(thread, POINT_DELETE, start, latency);
+      if (!s.ok()) fmt::println(stderr, "Error deleting {}", s.ToString());
+    } else if (operation == "R") {
+      s = db->DeleteRange(write_opts, db->DefaultColumnFamily(), key, arg);
+      record(thread, RANGE_DELETE, start, latency);
+      if (!s.ok()) fmt::println(stderr, "Error range deleting {}", s.ToString());
+    } else if (operation == "S") {
+      // Skipped rather than read to the end of the DB.
+      if (const std::optional<size_t> limit = range_limit(parsed.arg); !limit) {
+        fmt::println(stderr, "Error range querying: {} is not a key count", parsed.arg);
+      } else {
+        s = scan(key, parsed.arg, *limit);
+        record(thread, RANGE_QUERY, start, latency);
+        if (!s.ok()) fmt::println(stderr, "Error range querying {}", s.ToString());
+      }
+    } else {
+      fmt::println(stderr, "Unknown operation in workload file: {}", operation);
+    }
+  }
+};
+
+// What a replay thread measured in a phase, merged once all threads are done.
+struct Worker {
+  Batch batch;
+  Latencies latency;
+  std::string perf_context;
+  std::string iostats_context;
+
+  // The contexts are reset for the next phase, when the thread replays that one too.
+  void capture_contexts() {
+    if constexpr (!STATS_ENABLED) return;
+    perf_context = rocksdb::get_perf_context()->ToString();
+    iostats_context = rocksdb::get_iostats_context()->ToString();
+    rocksdb::get_perf_context()->Reset();
+    rocksdb::get_iostats_context()->Reset();
+  }
+};
+
+// The operations up to the next phase marker (see trace.h), or the next
+// `length` of them with --phases, and their stats.
+struct Phase {
+  std::string name;
+  std::optional<size_t> length;
+  size_t lines = 0;
+  std::optional<checkpoint::Hash> hash; // of the lines of the load phase, with --checkpoint
+  std::vector<Worker> workers;
+  std::string statistics; // STATS only
+
+  [[nodiscard]] Latencies latency() const {
+    Latencies merged;
+    for (const Worker &worker : workers) {
+      for (size_t op = 0; op < N_OPS; op++) merged[op].merge(worker.latency[op]);
+    }
+    return merged;
+  }
+};
+
+// Next operation of the phase, false at its end. The name of the phase
+// that follows a marker goes to `next_phase`, it stays empty at the end of
+// the trace and for phases of a given length, which skip markers.
+bool next_op(TraceReader &workload_file, Phase &phase, std::string_view &line, std::optional<std::string> &next_phase) {
+  if (phase.length && phase.lines == *phase.length) return false;
+  while (workload_file.next(line)) {
+    if (!is_phase_marker(line)) {
+      phase.lines++;
+      if (phase.hash) phase.hash->update(line);
+      return true;
+    }
+    if (!phase.length) {
+      next_phase = std::string(phase_name(line));
+      return false;
+    }
+  }
+  return false;
+}
+
+// Reads past the phase without replaying it, returns the name of the next one like replay_phase.
+std::optional<std::string> skip_phase(TraceReader &workload_file, Phase &phase) {
+  std::optional<std::string> next_phase;
+  std::string_view line;
+  while (next_op(workload_file, phase, line, next_phase)) {}
+  return next_phase;
+}
+
+// Hands the lines `read` puts in `line` to the replay threads until it returns
+// false. They are queued as `Line`, views into a mapped trace or copies of
+// streamed lines, whose buffers the queue recycles.
+template <typename Line, typename Read>
+void replay_parallel(
+  const Read &read,
+  const std::string_view &line,
+  const Replayer &replayer,
+  const Config &config,
+  Phase &phase
+) {
+  std::vector<std::unique_ptr<SpscQueue<Line>>> queues;
+  std::vector<std::thread> threads;
+  for (size_t i = 0; i < config.threads; i++) queues.push_back(std::make_unique<SpscQueue<Line>>(QUEUE_CAPACITY));
+  for (size_t i = 0; i < config.threads; i++) {
+    threads.emplace_back([&, i] {
+      Worker &worker = phase.workers[i];
+      Line queued;
+      while (queues[i]->pop(queued)) replayer.execute(queued, i, worker.batch, worker.latency);
+      replayer.flush(i, worker.batch, worker.latency);
+      worker.capture_contexts();
+    });
+  }
+
+  // This thread only reads and partitions the trace.
+  size_t next = 0;
+  Line queued;
+  while (read()) {
+    const size_t i = config.partition == Partition::KEY_HASH
+                       ? std::hash<std::string_view>{}(parse_line(line).key) % config.threads
+                       : next++ % config.threads;
+    queued = line;
+    queues[i]->push(queued);
+  }
+  for (const auto &queue : queues) queue->close();
+  for (auto &thread : threads) thread.join();
+}
+
+// Replays the trace up to the next phase marker and returns its name, or nothing at the end of the trace.
+std::optional<std::string> replay_phase(
+  TraceReader &workload_file,
+  const Replayer &replayer,
+  const Config &config,
+  Phase &phase
 ) {
-  std::ifstream workload_file(workload_filename);
+  std::optional<std::string> next_phase;
+  std::string_view line;
+  const auto read = [&] { return next_op(workload_file, phase, line, next_phase); };
+
+  phase.workers.resize(config.threads);
+  if (config.threads == 1) {
+    Worker &worker = phase.workers[0];
+    while (read()) replayer.execute(line, 0, worker.batch, worker.latency);
+    replayer.flush(0, worker.batch, worker.latency);
+    worker.capture_contexts();
+    return next_phase;
+  }
+
+  if (workload_file.is_stream())
+    replay_parallel<std::string>(read, line, replayer, config, phase);
+  else
+    replay_parallel<std::string_view>(read, line, replayer, config, phase);
+  return next_phase;
+}
+
+[[nodiscard]] rocksdb::Status benchmark(const Config &config, const std::string &db_name = "./db") {
+  TraceReader workload_file(config.workload_filename);
 
   if (!workload_file.is_open()) {
     FAIL("Error: Could not open workload file", rocksdb::Status::PathNotFound());
   }
 #ifdef STATS
-  std::ofstream stats_file(stats_filename);
-  std::ofstream latency_file(latency_filename);
+  std::ofstream stats_file(config.stats_filename);
+  std::ofstream latency_file(config.latency_filename);
 #endif // STATS
 
   std::unique_ptr<rocksdb::DB> db;
 
-  auto [s, opts, read_opts, write_opts] = load_options(rocksdb_options_filename);
+  auto [s, opts, read_opts, write_opts] = load_options(config.rocksdb_options_filename);
   if (!s.ok())
     FAIL("couldn't load options", s);
 
+  if (!config.merge_operator.empty()) {
+    s = rocksdb::MergeOperator::CreateFromString(rocksdb::ConfigOptions(), config.merge_operator, &opts.merge_operator);
+    if (!s.ok())
+      FAIL("couldn't create merge operator", s);
+  }
+
+  // With an existing checkpoint the run starts from a clone of it and skips
+  // the load phase, otherwise the checkpoint is taken at the end of that phase.
+  const bool restore = !config.checkpoint_dir.empty() && std::filesystem::exists(config.checkpoint_dir);
+  bool saved = false;
+  bool skipped = false;
+  if (restore) {
+    s = checkpoint::clone(config.checkpoint_dir, db_name);
+    if (!s.ok())
+      FAIL("couldn't clone checkpoint", s);
+  }
+
   s = rocksdb::DB::Open(opts, db_name, &db);
   if (!s.ok())
     FAIL("couldn't open db", s);
 
-#ifdef STATS
-  std::vector<uint64_t> latency_insert;
-  std::vector<uint64_t> latency_update;
-  std::vector<uint64_t> latency_point_query;
-#endif
-  std::string line;
-  while (std::getline(workload_file, line)) {
-    const size_t pos = line.find(' ');
-    const std::string operation = line.substr(0, pos);
-    constexpr size_t space_len = 1;
-    const std::string rest = line.substr(pos + space_len);
+  std::optional<stats::PropertySampler> sampler;
+  if (!config.properties_filename.empty())
+    sampler.emplace(config.properties_filename, db.get(), opts.num_levels, config.interval);
+  std::optional<stats::Timeline> timeline;
+  if (!config.timeline_filename.empty())
+    timeline.emplace(config.timeline_filename, config.interval, OP_NAMES, opts.statistics, config.threads);
+  const Replayer replayer{
+    db.get(),
+    read_opts,
+    write_opts,
+    timeline ? &*timeline : nullptr,
+    STATS_ENABLED || timeline.has_value(),
+    config.batch_size,
+    config.range_format,
+    !workload_file.is_stream(),
+  };
+
+  // Statistics are snapshotted and reset at every phase boundary, so each
+  // phase is reported on its own. Nothing before a leading marker is no phase.
+  std::vector<Phase> phases;
+  const std::string unskipped = fmt::format("before the {} phase to skip for checkpoint {}", config.load_phase, config.checkpoint_dir);
+  size_t planned = 0; // with --phases, the index of the current phase
+  std::optional<std::string> name = config.phases.empty() ? "" : config.phases[0].first;
+  while (name) {
+    Phase phase;
+    phase.name = *name;
+    if (!config.phases.empty()) phase.length = config.phases[planned].second;
+    const bool load = !config.checkpoint_dir.empty() && phase.name == config.load_phase;
+    if (load) phase.hash.emplace();
+    // Operations before the load phase would replay on top of the restored checkpoint.
+    const bool before_load = restore && !skipped && !load;
+    if (before_load && !phase.name.empty()) FAIL(fmt::format("phase {} {}", phase.name, unskipped), rocksdb::Status::InvalidArgument());
+    name = load && restore ? skip_phase(workload_file, phase) : replay_phase(workload_file, replayer, config, phase);
+    if (phase.length) {
+      if (phase.lines != *phase.length)
+        FAIL(
+          fmt::format("the trace ended after {} of the {} operations of phase {}", phase.lines, *phase.length, phase.name),
+          rocksdb::Status::InvalidArgument()
+        );
+      if (++planned < config.phases.size()) name = config.phases[planned].first;
+    }
 
-    if (operation == "I") {
-      const size_t pos2 = rest.find(' ');
-      const std::string key = rest.substr(0, pos2);
-      const std::string value = rest.substr(pos2 + space_len);
-#ifdef STATS
-      auto start = hrc::now();
-#endif
-      s = db->Put(write_opts, key, value);
-#ifdef STATS
-      auto latency = std::chrono::duration_cast<ns>(hrc::now() - start);
-      latency_insert.push_back(latency.count());
-#endif
-      if (!s.ok()) fmt::println(stderr, "Error inserting {}", s.ToString());
-    } else if (operation == "P") {
-      std::string value;
-#ifdef STATS
-      auto start = hrc::now();
-#endif
-      s = db->Get(read_opts, rest, &value);
-#ifdef STATS
-      auto latency = std::chrono::duration_cast<ns>(hrc::now() - start);
-      latency_point_query.push_back(latency.count());
-#endif
-      if (!s.ok() && !s.IsNotFound()) fmt::println(stderr, "Error point querying {}", s.ToString());
-    } else if (operation == "U") {
-      const size_t pos2 = rest.find(' ');
-      const std::string key = rest.substr(0, pos2);
-      const std::string value = rest.substr(pos2 + space_len);
-#ifdef STATS
-      auto start = hrc::now();
-#endif
-      s = db->Put(write_opts, key, value);
-#ifdef STATS
-      auto latency = std::chrono::duration_cast<ns>(hrc::now() - start);
-      latency_update.push_back(latency.count());
-#endif
-      if (!s.ok()) {
-        fmt::println(stderr, "Error updating {}", s.ToString());
-      }
-    } else {
-      fmt::println(stderr, "Unknown operation in workload file: {}", operation);
+    if (load && restore) {
+      // Anything else than the load phase the checkpoint was saved from would
+      // replay the later phases against the wrong keys.
+      const checkpoint::Info info = checkpoint::load_info(config.checkpoint_dir);
+      if (info.lines != phase.lines || info.hash != phase.hash->value)
+        FAIL(
+          fmt::format(
+            "checkpoint {} was saved from the {} operations of the {} phase of {}, the {} operations of this trace differ",
+            config.checkpoint_dir,
+            info.lines,
+            info.phase,
+            info.workload,
+            phase.lines
+          ),
+          rocksdb::Status::InvalidArgument()
+        );
+      skipped = true;
+    } else if (load) {
+      s = checkpoint::save(
+        db.get(), config.checkpoint_dir, {config.workload_filename, phase.name, phase.lines, phase.hash->value}
+      );
+      if (!s.ok())
+        FAIL("couldn't save checkpoint", s);
+      saved = true;
+    }
+
+    if (before_load && phase.lines > 0) FAIL(fmt::format("operations {}", unskipped), rocksdb::Status::InvalidArgument());
+
+    if (name && timeline) timeline->begin_phase(*name);
+    if constexpr (STATS_ENABLED) phase.statistics = opts.statistics->ToString();
+    if (name) opts.statistics->Reset();
+    if (!(load && restore) && (phase.lines > 0 || !phase.name.empty())) phases.push_back(std::move(phase));
+  }
+  if (!config.phases.empty()) {
+    std::string_view line;
+    while (workload_file.next(line)) {
+      if (!is_phase_marker(line))
+        FAIL("the trace has more operations than --phases", rocksdb::Status::InvalidArgument());
     }
   }
+  if (workload_file.failed())
+    fmt::println(stderr, "Warning: reading the workload failed, the trace ended early");
+  if (timeline) timeline->stop();
+  if (sampler) sampler->stop();
+  if (restore && !skipped)
+    FAIL(fmt::format("no {} phase in the trace to skip for checkpoint {}", config.load_phase, config.checkpoint_dir),
+         rocksdb::Status::InvalidArgument());
+  if (!config.checkpoint_dir.empty() && !restore && !saved)
+    fmt::println(stderr, "Warning: no {} phase in the trace, no checkpoint was saved", config.load_phase);
 #ifdef STATS
-  stats_file << fmt::format("[rocksdb::get_perf_context]\n{}\n", rocksdb::get_perf_context()->ToString());
-  stats_file << fmt::format("[rocksdb::get_iostats_context]\n{}\n", rocksdb::get_iostats_context()->ToString());
-  stats_file << fmt::format("[options.statistics]\n{}\n", opts.statistics->ToString());
+  // Without markers the whole trace is one unnamed phase and the files look
+  // as they always did.
+  const bool phased = phases.size() > 1 || (phases.size() == 1 && !phases[0].name.empty());
+  for (const Phase &phase : phases) {
+    if (phased) stats_file << fmt::format("[phase {}]\n", phase.name);
+    // The contexts are thread local, one section per replay thread.
+    for (const Worker &worker : phase.workers)
+      stats_file << fmt::format("[rocksdb::get_perf_context]\n{}\n", worker.perf_context);
+    for (const Worker &worker : phase.workers)
+      stats_file << fmt::format("[rocksdb::get_iostats_context]\n{}\n", worker.iostats_context);
+    stats_file << fmt::format("[options.statistics]\n{}\n", phase.statistics);
+  }
 #endif // STATS
 
   s = db->Close();
@@ -183,41 +694,32 @@ namespace stats {
   if (!s.ok())
     FAIL("couldn't destroy db", s);
 #ifdef STATS
-  std::sort(latency_insert.begin(), latency_insert.end());
-  std::sort(latency_update.begin(), latency_update.end());
-  std::sort(latency_point_query.begin(), latency_point_query.end());
-
-  stats::dump_latency(latency_file, latency_insert, "insert (ns)");
-  stats::dump_latency(latency_file, latency_update, "update (ns)");
-  stats::dump_latency(latency_file, latency_point_query, "point query (ns)");
+  // Whole run per op, plus every phase in "phases" when the trace has markers.
+  Latencies latency;
+  json phases_json = json::array();
+  for (const Phase &phase : phases) {
+    const Latencies phase_latency = phase.latency();
+    json ops = json::object();
+    for (size_t op = 0; op < N_OPS; op++) {
+      latency[op].merge(phase_latency[op]);
+      ops[OP_NAMES[op]] = phase_latency[op].to_json();
+    }
+    phases_json.push_back({{"name", phase.name}, {"ops", ops}});
+  }
+  json latency_json = json::object();
+  for (size_t op = 0; op < N_OPS; op++)
+    latency_json[OP_NAMES[op]] = latency[op].to_json();
+  if (phased) latency_json["phases"] = phases_json;
+  latency_file << latency_json.dump() << std::endl;
 #endif
 
   return rocksdb::Status::OK();
 }
 
 int main(const int argc, char *argv[]) {
-  if (argc < 3) {
-    fmt::println(stderr, "Error: not enough arguments. Usage: {} <rocksdb-options> <workload-file>", argv[0]);
-    return EXIT_FAILURE;
-  }
+  const Config config = parse_args(argc, argv);
 
-  const std::string rocksdb_options_filename = argv[1];
-  const std::string workload_filename = argv[2];
-
-#ifdef STATS
-  const std::string stats_filename = argv[3];
-  const std::string latency_filename = argv[4];
-#endif // STATS
-
-  rocksdb::Status s = benchmark(
-    rocksdb_options_filename,
-    workload_filename
-#ifdef STATS
-    ,
-    stats_filename,
-    latency_filename
-#endif // STATS
-  );
+  rocksdb::Status s = benchmark(config);
   if (!s.ok())
     FAIL("error running benchmark", s);
 
@@ -0,0 +1,84 @@
+// Parse cost per trace line, for the copying getline/substr parser the
+// harness used to have and the mapped string_view one in trace.h. Only the
+// parsing is timed, RocksDB is not involved.
+//
+//   parse-benchmark <workload-file> [repetitions]
+
+#include <algorithm>
+#include <chrono>
+#include <cstdlib>
+#include <fstream>
+#include <limits>
+#include <string>
+#include <fmt/base.h>
+
+#include "trace.h"
+
+using hrc = std::chrono::high_resolution_clock;
+
+struct Result {
+  size_t lines = 0;
+  size_t bytes = 0; // key and argument bytes, so the parse can't be optimized away
+};
+
+Result parse_copying(const std::string &filename) {
+  Result result;
+  std::ifstream file(filename);
+  std::string line;
+  while (std::getline(file, line)) {
+    const size_t pos = line.find(' ');
+    const std::string operation = line.substr(0, pos);
+    const std::string rest = line.substr(pos + 1);
+    const size_t pos2 = rest.find(' ');
+    const std::string key = rest.substr(0, pos2);
+    const std::string arg = pos2 == std::string::npos ? "" : rest.substr(pos2 + 1);
+    result.lines++;
+    result.bytes += operation.size() + key.size() + arg.size();
+  }
+  return result;
+}
+
+Result parse_mapped(const std::string &filename) {
+  Result result;
+  TraceReader file(filename);
+  std::string_view line;
+  while (file.next(line)) {
+    const TraceLine parsed = parse_line(line);
+    result.lines++;
+    result.bytes += parsed.op.size() + parsed.key.size() + parsed.arg.size();
+  }
+  return result;
+}
+
+// Best of `repetitions` runs in ns per line, the first one also warms the page cache.
+template <typename Parse>
+double time_parse(const char *name, Parse parse, const std::string &filename, const int repetitions) {
+  double best = std::numeric_limits<double>::infinity();
+  Result result;
+  for (int i = 0; i < repetitions; i++) {
+    const auto start = hrc::now();
+    result = parse(filename);
+    const std::chrono::duration<double, std::nano> elapsed = hrc::now() - start;
+    best = std::min(best, elapsed.count() / std::max<size_t>(result.lines, 1));
+  }
+  fmt::println("{:>8}: {:.1f} ns/op ({} lines, {} bytes)", name, best, result.lines, result.bytes);
+  return best;
+}
+
+int main(const int argc, char *argv[]) {
+  if (argc < 2) {
+    fmt::println(stderr, "Usage: {} <workload-file> [repetitions]", argv[0]);
+    return EXIT_FAILURE;
+  }
+  const std::string filename = argv[1];
+  const int repetitions = argc > 2 ? std::max(1, std::atoi(argv[2])) : 5;
+  if (!TraceReader(filename).is_open()) {
+    fmt::println(stderr, "Error: Could not open workload file {}", filename);
+    return EXIT_FAILURE;
+  }
+
+  const double copying = time_parse("getline", parse_copying, filename, repetitions);
+  const double mapped = time_parse("mmap", parse_mapped, filename, repetitions);
+  fmt::println("speedup: {:.1f}x", copying / mapped);
+  return 0;
+}
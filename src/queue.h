@@ -0,0 +1,49 @@
+#pragma once
+
+#include <atomic>
+#include <cstddef>
+#include <thread>
+#include <utility>
+#include <vector>
+
+// Bounded lock-free queue for exactly one producer and one consumer thread.
+// push and pop swap values in and out of the ring instead of moving them, so
+// a std::string's buffer goes back to the producer once the consumer is done
+// with it and lines are not reallocated on every push.
+template <typename T>
+class SpscQueue {
+public:
+  explicit SpscQueue(const size_t capacity) : buffer_(capacity + 1) {}
+
+  // Blocks while the queue is full. `value` gets a stale element back.
+  void push(T &value) {
+    const size_t tail = tail_.load(std::memory_order_relaxed);
+    const size_t next = (tail + 1) % buffer_.size();
+    while (next == head_.load(std::memory_order_acquire)) std::this_thread::yield();
+    std::swap(buffer_[tail], value);
+    tail_.store(next, std::memory_order_release);
+  }
+
+  // Blocks while the queue is empty, returns false once it is closed and drained.
+  bool pop(T &value) {
+    const size_t head = head_.load(std::memory_order_relaxed);
+    while (head == tail_.load(std::memory_order_acquire)) {
+      if (closed_.load(std::memory_order_acquire)) {
+        if (head == tail_.load(std::memory_order_acquire)) return false;
+        break;
+      }
+      std::this_thread::yield();
+    }
+    std::swap(buffer_[head], value);
+    head_.store((head + 1) % buffer_.size(), std::memory_order_release);
+    return true;
+  }
+
+  void close() { closed_.store(true, std::memory_order_release); }
+
+private:
+  std::vector<T> buffer_;
+  alignas(64) std::atomic<size_t> head_{0};
+  alignas(64) std::atomic<size_t> tail_{0};
+  alignas(64) std::atomic<bool> closed_{false};
+};
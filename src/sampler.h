@@ -0,0 +1,112 @@
+#pragma once
+
+#include <charconv>
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <fstream>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+#include "rocksdb/db.h"
+
+namespace stats {
+  // Integer properties sampled along with the number of files per level.
+  inline const std::vector<std::string> SAMPLED_PROPERTIES = {
+    "rocksdb.estimate-pending-compaction-bytes",
+    "rocksdb.cur-size-all-mem-tables",
+    "rocksdb.num-immutable-mem-table",
+    "rocksdb.block-cache-usage",
+    "rocksdb.total-sst-files-size",
+    "rocksdb.num-running-compactions",
+    "rocksdb.num-running-flushes",
+    "rocksdb.actual-delayed-write-rate",
+    "rocksdb.is-write-stopped",
+  };
+
+  inline const std::string FILES_AT_LEVEL = "rocksdb.num-files-at-level";
+
+  // Background thread writing the shape of the LSM tree and the state of
+  // memtables, compactions and write stalls as CSV: a header, then one row
+  // per interval with "t" (seconds since the start of the run), "unix" and
+  // every property, -1 where the DB doesn't report it.
+  class PropertySampler {
+  public:
+    using clock = std::chrono::steady_clock;
+
+    PropertySampler(
+      const std::string &filename,
+      rocksdb::DB *db,
+      const int num_levels,
+      const std::chrono::milliseconds interval
+    ) : file_(filename), db_(db), interval_(interval), start_(clock::now()) {
+      for (int level = 0; level < num_levels; level++)
+        properties_.push_back(FILES_AT_LEVEL + std::to_string(level));
+      properties_.insert(properties_.end(), SAMPLED_PROPERTIES.begin(), SAMPLED_PROPERTIES.end());
+
+      file_ << "t,unix";
+      for (const std::string &property : properties_) file_ << ',' << property;
+      file_ << '\n';
+      thread_ = std::thread([this] { run(); });
+    }
+
+    ~PropertySampler() { stop(); }
+
+    PropertySampler(const PropertySampler &) = delete;
+    PropertySampler &operator=(const PropertySampler &) = delete;
+
+    // Takes a last sample and waits for the thread, before the DB is closed.
+    void stop() {
+      {
+        std::lock_guard lock(mutex_);
+        if (stopped_) return;
+        stopped_ = true;
+      }
+      wake_.notify_one();
+      thread_.join();
+    }
+
+  private:
+    void run() {
+      std::unique_lock lock(mutex_);
+      do {
+        lock.unlock();
+        sample();
+        lock.lock();
+      } while (!wake_.wait_for(lock, interval_, [this] { return stopped_; }));
+      lock.unlock();
+      sample();
+    }
+
+    [[nodiscard]] int64_t property(const std::string &name) const {
+      if (uint64_t value; db_->GetIntProperty(name, &value)) return static_cast<int64_t>(value);
+      // The per level file counts are only reported as strings.
+      if (std::string value; db_->GetProperty(name, &value)) {
+        int64_t parsed = -1;
+        std::from_chars(value.data(), value.data() + value.size(), parsed);
+        return parsed;
+      }
+      return -1;
+    }
+
+    void sample() {
+      using seconds = std::chrono::duration<double>;
+      file_ << seconds(clock::now() - start_).count() << ','
+            << std::fixed << seconds(std::chrono::system_clock::now().time_since_epoch()).count() << std::defaultfloat;
+      for (const std::string &name : properties_) file_ << ',' << property(name);
+      file_ << '\n';
+    }
+
+    std::ofstream file_;
+    rocksdb::DB *db_;
+    std::chrono::milliseconds interval_;
+    std::vector<std::string> properties_;
+    clock::time_point start_;
+    std::mutex mutex_;
+    std::condition_variable wake_;
+    bool stopped_ = false;
+    std::thread thread_;
+  };
+}
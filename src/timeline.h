@@ -0,0 +1,162 @@
+#pragma once
+
+#include <algorithm>
+#include <chrono>
+#include <condition_variable>
+#include <fstream>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+#include <nlohmann/json.hpp>
+
+#include "histogram.h"
+#include "statistics.h"
+
+namespace stats {
+  // Tickers snapshotted with every interval, as cumulative counts.
+  inline const std::vector<rocksdb::Tickers> TIMELINE_TICKERS = {
+    rocksdb::STALL_MICROS,
+    rocksdb::COMPACT_READ_BYTES,
+    rocksdb::COMPACT_WRITE_BYTES,
+    rocksdb::FLUSH_WRITE_BYTES,
+    rocksdb::WAL_FILE_BYTES,
+    rocksdb::BYTES_WRITTEN,
+    rocksdb::BYTES_READ,
+    rocksdb::BLOCK_CACHE_HIT,
+    rocksdb::BLOCK_CACHE_MISS,
+  };
+
+  // Writes one JSON line per interval with the number of operations and
+  // their p50/p99/max latency (ns) in that interval, plus TIMELINE_TICKERS.
+  // "interval" has the actual length of the interval in seconds and "t" the
+  // seconds since the start of the run. "phase" is the trace phase the
+  // interval belongs to. Statistics are reset at every phase boundary, so the
+  // tickers count from the start of the phase.
+  //
+  // Every replay thread records into its own lock-free slot; a background
+  // thread takes the slots and writes the line at the end of every interval,
+  // so replay never waits for it.
+  class Timeline {
+  public:
+    using clock = std::chrono::steady_clock;
+
+    Timeline(
+      const std::string &filename,
+      const std::chrono::milliseconds interval,
+      const std::vector<std::string> &op_names,
+      std::shared_ptr<rocksdb::Statistics> statistics,
+      const size_t threads = 1
+    ) : file_(filename),
+        interval_(interval),
+        op_names_(op_names),
+        statistics_(std::move(statistics)),
+        start_(clock::now()),
+        last_(start_) {
+      for (size_t i = 0; i < threads; i++)
+        slots_.push_back(std::make_unique<std::vector<ConcurrentHistogram>>(op_names.size()));
+      thread_ = std::thread([this] { run(); });
+    }
+
+    ~Timeline() { stop(); }
+
+    Timeline(const Timeline &) = delete;
+    Timeline &operator=(const Timeline &) = delete;
+
+    void record(const size_t thread, const size_t op, const uint64_t latency) {
+      (*slots_[thread])[op].record(latency);
+    }
+
+    // Closes the last interval of the current phase, unless nothing was
+    // recorded in it, and starts a full interval of the next one.
+    void begin_phase(const std::string &name) {
+      {
+        std::lock_guard lock(mutex_);
+        flush(clock::now(), true);
+        phase_ = name;
+      }
+      wake_.notify_one();
+    }
+
+    // Writes the last interval and waits for the thread.
+    void stop() {
+      {
+        std::lock_guard lock(mutex_);
+        if (stopped_) return;
+        stopped_ = true;
+      }
+      wake_.notify_one();
+      thread_.join();
+    }
+
+  private:
+    void run() {
+      std::unique_lock lock(mutex_);
+      while (true) {
+        const clock::time_point end = last_ + interval_;
+        // begin_phase moves the end of the interval.
+        wake_.wait_until(lock, end, [&] { return stopped_ || last_ + interval_ != end; });
+        if (stopped_) break;
+        if (const auto now = clock::now(); now >= last_ + interval_) flush(now, false);
+      }
+      flush(clock::now(), false);
+    }
+
+    // Called with mutex_ held.
+    void flush(const clock::time_point now, const bool skip_empty) {
+      std::vector<Histogram> latency(op_names_.size());
+      bool recorded = false;
+      for (const auto &slot : slots_) {
+        for (size_t i = 0; i < op_names_.size(); i++) {
+          latency[i].merge((*slot)[i].take());
+          recorded |= latency[i].count() > 0;
+        }
+      }
+      if (skip_empty && !recorded) return;
+
+      nlohmann::json ops = nlohmann::json::object();
+      for (size_t i = 0; i < op_names_.size(); i++) {
+        const Histogram &h = latency[i];
+        ops[op_names_[i]] = {
+          {"count", h.count()},
+          {"p50", h.percentile(50)},
+          {"p99", h.percentile(99)},
+          {"max", h.max()},
+        };
+      }
+
+      nlohmann::json tickers = nlohmann::json::object();
+      for (const auto &[ticker, name] : rocksdb::TickersNameMap) {
+        if (std::find(TIMELINE_TICKERS.begin(), TIMELINE_TICKERS.end(), ticker) != TIMELINE_TICKERS.end())
+          tickers[name] = statistics_->getTickerCount(ticker);
+      }
+
+      using seconds = std::chrono::duration<double>;
+      file_ << nlohmann::json{
+        {"t", seconds(now - start_).count()},
+        {"interval", seconds(now - last_).count()},
+        {"unix", seconds(std::chrono::system_clock::now().time_since_epoch()).count()},
+        {"phase", phase_},
+        {"ops", ops},
+        {"tickers", tickers},
+      }.dump() << '\n';
+
+      last_ = now;
+    }
+
+    std::ofstream file_;
+    std::chrono::milliseconds interval_;
+    std::vector<std::string> op_names_;
+    std::string phase_;
+    // One per replay thread, a histogram per operation.
+    std::vector<std::unique_ptr<std::vector<ConcurrentHistogram>>> slots_;
+    std::shared_ptr<rocksdb::Statistics> statistics_;
+    clock::time_point start_;
+    clock::time_point last_;
+    std::mutex mutex_;
+    std::condition_variable wake_;
+    bool stopped_ = false;
+    std::thread thread_;
+  };
+}
@@ -0,0 +1,160 @@
+#pragma once
+
+#include <cerrno>
+#include <cstring>
+#include <string>
+#include <string_view>
+#include <vector>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+// One `<op> <key>[ <arg>]` line of a workload trace. `arg` is the value of
+// I/U/M or the end (count) of S/R, P/D have only the key.
+struct TraceLine {
+  std::string_view op;
+  std::string_view key;
+  std::string_view arg;
+};
+
+inline TraceLine parse_line(const std::string_view line) {
+  TraceLine parsed;
+  const size_t pos = line.find(' ');
+  parsed.op = line.substr(0, pos);
+  if (pos == std::string_view::npos) return parsed;
+  const std::string_view rest = line.substr(pos + 1);
+  const size_t pos2 = rest.find(' ');
+  parsed.key = rest.substr(0, pos2);
+  if (pos2 != std::string_view::npos) parsed.arg = rest.substr(pos2 + 1);
+  return parsed;
+}
+
+// A `# <name>` line starts a new phase of the trace, e.g. the run phase after
+// the load phase. The harness reports every phase on its own. With --phases
+// it splits the trace by operation counts instead and skips markers.
+inline bool is_phase_marker(const std::string_view line) { return !line.empty() && line[0] == '#'; }
+
+inline std::string_view phase_name(std::string_view line) {
+  line.remove_prefix(1);
+  while (!line.empty() && line.front() == ' ') line.remove_prefix(1);
+  while (!line.empty() && (line.back() == ' ' || line.back() == '\r')) line.remove_suffix(1);
+  return line;
+}
+
+// Read-only mapping of a whole trace. Lines are handed out as views into the
+// mapping, so they stay valid for as long as the reader and nothing is copied
+// on the way to RocksDB. The kernel reads ahead of the sequential scan.
+//
+// A trace that isn't a regular file, `-` for stdin or a named pipe, is read
+// through a buffer of STREAM_BUFFER_SIZE instead, so a generator can pipe it
+// straight into the harness and blocks while the harness is behind. Its
+// lines only stay valid until the next call to next(), see is_stream().
+class TraceReader {
+public:
+  static constexpr size_t STREAM_BUFFER_SIZE = 4 << 20;
+  static constexpr int PIPE_SIZE = 1 << 20;
+
+  explicit TraceReader(const std::string &filename) {
+    const int fd = filename == "-" ? dup(STDIN_FILENO) : open(filename.c_str(), O_RDONLY);
+    if (fd < 0) return;
+    struct stat st {};
+    if (fstat(fd, &st) != 0) {
+      close(fd);
+      return;
+    }
+    if (!S_ISREG(st.st_mode)) {
+      // Fewer, larger writes from the generator. Only a hint, the default size works too.
+#ifdef F_SETPIPE_SZ
+      if (S_ISFIFO(st.st_mode)) fcntl(fd, F_SETPIPE_SZ, PIPE_SIZE);
+#endif
+      fd_ = fd;
+      buffer_.resize(STREAM_BUFFER_SIZE);
+      open_ = true;
+      return;
+    }
+
+    size_ = st.st_size;
+    if (size_ == 0) {
+      open_ = true;
+    } else if (void *data = mmap(nullptr, size_, PROT_READ, MAP_PRIVATE, fd, 0); data != MAP_FAILED) {
+      madvise(data, size_, MADV_SEQUENTIAL);
+      data_ = static_cast<const char *>(data);
+      open_ = true;
+    }
+    close(fd);
+  }
+
+  ~TraceReader() {
+    if (data_) munmap(const_cast<char *>(data_), size_);
+    if (fd_ >= 0) close(fd_);
+  }
+
+  TraceReader(const TraceReader &) = delete;
+  TraceReader &operator=(const TraceReader &) = delete;
+
+  [[nodiscard]] bool is_open() const { return open_; }
+
+  // Lines of a stream are overwritten by the next read, whatever holds on
+  // to one longer has to copy it.
+  [[nodiscard]] bool is_stream() const { return fd_ >= 0; }
+
+  // True when reading a stream failed, the trace ended early.
+  [[nodiscard]] bool failed() const { return error_ != 0; }
+
+  // Next line without its newline, false at the end of the trace.
+  bool next(std::string_view &line) {
+    if (is_stream()) return next_streamed(line);
+    if (pos_ >= size_) return false;
+    const std::string_view rest(data_ + pos_, size_ - pos_);
+    const size_t end = rest.find('\n');
+    line = rest.substr(0, end);
+    pos_ += end == std::string_view::npos ? rest.size() : end + 1;
+    return true;
+  }
+
+private:
+  bool next_streamed(std::string_view &line) {
+    while (true) {
+      const std::string_view rest(buffer_.data() + begin_, end_ - begin_);
+      if (const size_t end = rest.find('\n'); end != std::string_view::npos) {
+        line = rest.substr(0, end);
+        begin_ += end + 1;
+        return true;
+      }
+      if (eof_) {
+        if (rest.empty()) return false;
+        line = rest;
+        begin_ = end_;
+        return true;
+      }
+
+      // Moves the incomplete last line to the front and refills the rest. A
+      // line longer than the whole buffer grows it.
+      std::memmove(buffer_.data(), rest.data(), rest.size());
+      begin_ = 0;
+      end_ = rest.size();
+      if (end_ == buffer_.size()) buffer_.resize(2 * buffer_.size());
+      const ssize_t n = read(fd_, buffer_.data() + end_, buffer_.size() - end_);
+      if (n > 0) {
+        end_ += n;
+      } else if (n == 0 || errno != EINTR) {
+        if (n < 0) error_ = errno;
+        eof_ = true;
+      }
+    }
+  }
+
+  const char *data_ = nullptr;
+  size_t size_ = 0;
+  size_t pos_ = 0;
+  bool open_ = false;
+
+  // Streams only.
+  int fd_ = -1;
+  std::vector<char> buffer_;
+  size_t begin_ = 0;
+  size_t end_ = 0;
+  bool eof_ = false;
+  int error_ = 0;
+};
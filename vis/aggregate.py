@@ -0,0 +1,156 @@
+"""
+Aggregation of a metric over repeated runs, so plots can show how far runs
+of the same system spread and a difference between systems can be judged
+against that noise.
+
+`summarize` gives the mean, the standard deviation and a bootstrap
+confidence interval of the mean, resampling whole runs. It takes one value
+per run, or one series per run (rows, see `stack`) and then aggregates
+every step on its own. `outliers` flags runs by their modified z-score.
+
+Which runs are aggregated is up to the caller, leading warm-up runs are
+dropped explicitly with `drop_warm_up`, and runs experiment.py marked as not
+comparable to the others with `drop_not_comparable`.
+"""
+import json
+import re
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+CONFIDENCE = 0.95
+N_BOOTSTRAP = 2000
+# Resamples drawn at once, bounds the memory of bootstrapping long series.
+BOOTSTRAP_BATCH = 100
+# Modified z-score above which a run is an outlier (Iglewicz and Hoaglin).
+OUTLIER_THRESHOLD = 3.5
+
+RUN_INDEX = re.compile(r"\.(\d+)\.[^.]+$")
+
+
+@dataclass
+class Summary:
+    """Aggregate over runs, arrays with one entry per step for series."""
+
+    n: int | np.ndarray
+    mean: float | np.ndarray
+    std: float | np.ndarray
+    low: float | np.ndarray
+    high: float | np.ndarray
+
+    @property
+    def yerr(self) -> np.ndarray:
+        """Distance of the confidence interval from the mean, for `yerr` of matplotlib."""
+        return np.array([self.mean - self.low, self.high - self.mean])
+
+    def __str__(self) -> str:
+        return f"{self.mean:.4g} ± {self.std:.2g} [{self.low:.4g}, {self.high:.4g}] (n={self.n})"
+
+
+def run_index(path: Path) -> int:
+    """Run number of `<name>.<system>.<run>.<ext>`, so run 10 sorts after run 9."""
+    match = RUN_INDEX.search(path.name)
+    return int(match.group(1)) if match else -1
+
+
+def drop_warm_up(runs: list, warm_up: int, label: str = "") -> list:
+    """`runs` without the first `warm_up`, saying so."""
+    if warm_up > 0:
+        print(f"{label}: leaving out {min(warm_up, len(runs))} warm-up run(s) of {len(runs)}")
+    return runs[warm_up:]
+
+
+def drop_not_comparable(runs: list[Path], label: str = "") -> list[Path]:
+    """
+    `runs`, output files of experiment.py, without those of runs whose
+    metadata says `"comparable": false`, saying so. Runs without metadata
+    are kept.
+    """
+    excluded = set()
+    for directory in {path.parent for path in runs}:
+        for meta_path in directory.glob("meta.*.json"):
+            meta = json.loads(meta_path.read_text())
+            if not meta.get("comparable", True):
+                excluded.update(Path(p).resolve() for p in meta["outputs"].values())
+    kept = [path for path in runs if path.resolve() not in excluded]
+    if len(kept) < len(runs):
+        print(f"{label}: leaving out {len(runs) - len(kept)} run(s) not comparable to the others")
+    return kept
+
+
+def drop_warm_up_and_not_comparable(runs: list[Path], warm_up: int, label: str = "") -> list[Path]:
+    """
+    `runs` without the first `warm_up` and those not comparable. The warm-up
+    counts leading runs that aren't comparable, like the one that saved the
+    checkpoint, so such a run isn't left out on top of the warm-up.
+    """
+    return drop_not_comparable(drop_warm_up(runs, warm_up, label), label)
+
+
+def stack(series: list[np.ndarray]) -> np.ndarray:
+    """One row per run, padded with NaN to the longest run."""
+    values = np.full((len(series), max((len(s) for s in series), default=0)), np.nan)
+    for row, s in zip(values, series):
+        row[: len(s)] = s
+    return values
+
+
+def bootstrap_ci(
+    values: np.ndarray,
+    confidence: float = CONFIDENCE,
+    n_bootstrap: int = N_BOOTSTRAP,
+    seed: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Percentile bootstrap interval of the mean over axis 0 (the runs), ignoring NaN."""
+    rng = np.random.default_rng(seed)
+    n = values.shape[0]
+    means = np.empty((n_bootstrap,) + values.shape[1:])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # steps no resampled run reaches
+        for start in range(0, n_bootstrap, BOOTSTRAP_BATCH):
+            samples = rng.integers(0, n, size=(min(BOOTSTRAP_BATCH, n_bootstrap - start), n))
+            means[start : start + len(samples)] = np.nanmean(values[samples], axis=1)
+        alpha = 1 - confidence
+        low, high = np.nanquantile(means, [alpha / 2, 1 - alpha / 2], axis=0)
+    return low, high
+
+
+def summarize(
+    values,
+    confidence: float = CONFIDENCE,
+    n_bootstrap: int = N_BOOTSTRAP,
+    seed: int = 0,
+) -> Summary:
+    """
+    Aggregate of one value per run, or of one row per run of a series. NaN
+    marks a run without the value, it doesn't count towards `n`. A single
+    run has no spread, its std is 0 and its interval the value itself.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.shape[0] == 0:
+        raise ValueError("no runs to summarize")
+    n = np.sum(~np.isnan(values), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(values, axis=0)
+        std = np.where(n > 1, np.nanstd(values, axis=0, ddof=1), 0.0)
+    low, high = bootstrap_ci(values, confidence, n_bootstrap, seed)
+    if values.ndim == 1:
+        return Summary(int(n), float(mean), float(std), float(low), float(high))
+    return Summary(n, mean, std, low, high)
+
+
+def outliers(values, threshold: float = OUTLIER_THRESHOLD) -> np.ndarray:
+    """
+    Which runs are outliers: their modified z-score, the distance from the
+    median in median absolute deviations, is above `threshold`. Robust to
+    the outliers themselves, unlike mean and standard deviation.
+    """
+    values = np.asarray(values, dtype=float)
+    median = np.nanmedian(values)
+    mad = np.nanmedian(np.abs(values - median))
+    if mad == 0 or np.isnan(mad):
+        return np.zeros(len(values), dtype=bool)
+    return 0.6745 * np.abs(values - median) / mad > threshold
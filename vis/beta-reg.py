@@ -2,26 +2,17 @@ import numpy as np
 from collections import Counter
 from scipy import stats
 
+from tracefile import OpChar, factorize, load_trace, op_counts, value_counts
+
+
 def count_workload(filename: str) -> tuple[Counter, ...]:
-    with open(filename) as f:
-        counter_op = Counter()
-        counter_i = Counter()
-        counter_u = Counter()
-        counter_pq = Counter()
-        for line in f.readlines():
-            parts = line.strip().split(" ")
-            op = parts[0]
-            key = parts[1]
-
-            counter_op[op] += 1
-
-            if op == "I":
-                counter_i[key] += 1
-            elif op == "U":
-                counter_u[key] += 1
-            elif op == "P":
-                counter_pq[key] += 1
+    cols = load_trace(filename, with_keys=True)
+    uniq_keys, key_ids = factorize(cols)
 
+    counter_op = op_counts(cols)
+    counter_i = value_counts(key_ids[cols.op == OpChar.INSERT.code], uniq_keys)
+    counter_u = value_counts(key_ids[cols.op == OpChar.UPDATE.code], uniq_keys)
+    counter_pq = value_counts(key_ids[cols.op == OpChar.QUERY_POINT.code], uniq_keys)
 
     return counter_op, counter_i, counter_u, counter_pq
 
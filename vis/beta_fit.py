@@ -0,0 +1,108 @@
+from collections import Counter
+from dataclasses import dataclass
+from sys import float_info
+
+import numpy as np
+from scipy import special
+
+
+@dataclass
+class BetaStats:
+    """
+    Sufficient statistics of a (weighted) sample on (0, 1) for fitting a
+    Beta distribution: the total weight and the weighted sums of log(x),
+    log(1 - x), x and x². Instances can be updated as shards of a trace are
+    parsed and merged with `+`, fitting only needs these five numbers.
+    """
+
+    weight: float = 0.0
+    sum_log_x: float = 0.0
+    sum_log_1mx: float = 0.0
+    sum_x: float = 0.0
+    sum_x2: float = 0.0
+
+    def update(self, x, weights=None) -> "BetaStats":
+        x = np.asarray(x, dtype=np.float64)
+        w = np.ones_like(x) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.weight += w.sum()
+        self.sum_log_x += w @ np.log(x)
+        self.sum_log_1mx += w @ np.log1p(-x)
+        self.sum_x += w @ x
+        self.sum_x2 += w @ (x * x)
+        return self
+
+    def __add__(self, other: "BetaStats") -> "BetaStats":
+        return BetaStats(
+            self.weight + other.weight,
+            self.sum_log_x + other.sum_log_x,
+            self.sum_log_1mx + other.sum_log_1mx,
+            self.sum_x + other.sum_x,
+            self.sum_x2 + other.sum_x2,
+        )
+
+    def moments(self) -> tuple[float, float]:
+        """
+        Method of moments estimate, the starting point of `fit`. Raises
+        ValueError for a sample without weight or without variance, e.g. a
+        counter with a single key, which no Beta distribution fits.
+        """
+        if not self.weight > 0:
+            raise ValueError(f"Can't fit a Beta distribution to a sample of weight {self.weight}")
+        mean = self.sum_x / self.weight
+        var = self.sum_x2 / self.weight - mean * mean
+        # The sums of a constant sample leave rounding noise instead of 0.
+        if not var > 1e-12 * max(mean * mean, float_info.epsilon):
+            raise ValueError("Can't fit a Beta distribution to a sample without variance")
+        common_factor = mean * (1 - mean) / var - 1
+        return mean * common_factor, (1 - mean) * common_factor
+
+    def fit(self, tol: float = 1e-10, max_iter: int = 100) -> tuple[float, float]:
+        """
+        Maximum likelihood α, β by Newton's method on the log-likelihood
+
+            W (lnΓ(α+β) - lnΓ(α) - lnΓ(β)) + (α-1) Σw·log x + (β-1) Σw·log(1-x)
+
+        with step halving to keep both parameters positive. Raises
+        ValueError where `moments` does.
+        """
+        a, b = self.moments()
+        mean_log_x = self.sum_log_x / self.weight
+        mean_log_1mx = self.sum_log_1mx / self.weight
+
+        if not (a > 0 and b > 0 and np.isfinite(a) and np.isfinite(b)):
+            a, b = 1.0, 1.0
+
+        for _ in range(max_iter):
+            psi_ab = special.digamma(a + b)
+            grad = np.array([psi_ab - special.digamma(a) + mean_log_x, psi_ab - special.digamma(b) + mean_log_1mx])
+            tri_ab = special.polygamma(1, a + b)
+            hess = np.array([
+                [tri_ab - special.polygamma(1, a), tri_ab],
+                [tri_ab, tri_ab - special.polygamma(1, b)],
+            ])
+            step = np.linalg.solve(hess, grad)
+            scale = 1.0
+            while a - scale * step[0] <= 0 or b - scale * step[1] <= 0:
+                scale /= 2
+            a, b = a - scale * step[0], b - scale * step[1]
+            if abs(scale * step[0]) <= tol * a and abs(scale * step[1]) <= tol * b:
+                break
+        if not (np.isfinite(a) and np.isfinite(b)):
+            raise ValueError(f"Beta fit diverged to α = {a}, β = {b}")
+        return float(a), float(b)
+
+
+def rank_stats(freq) -> BetaStats:
+    """
+    Statistics of the normalized, frequency sorted ranks `calc_indices`
+    returns in graph.py: rank i of n (most frequent first) as i / n + ε,
+    weighted by freq[i].
+    """
+    freq = np.sort(np.asarray(freq, dtype=np.float64))[::-1]
+    x = np.arange(len(freq)) / len(freq) + float_info.epsilon
+    return BetaStats().update(x, freq)
+
+
+def fit_counter(counter: Counter) -> tuple[float, float]:
+    """α, β of `calc_indices(counter)`, without materializing it."""
+    return rank_stats(list(counter.values())).fit()
@@ -0,0 +1,119 @@
+import glob
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Cache entries live in a directory next to the trace they were computed from.
+CACHE_DIR_NAME = ".workload-cache"
+MAX_CACHE_BYTES = 16 * 1024**3
+
+# The content hash reads the head and tail of the trace plus evenly spaced
+# samples, a few MiB in total regardless of the trace size.
+EDGE_BYTES = 1024 * 1024
+SAMPLE_BYTES = 64 * 1024
+N_SAMPLES = 64
+
+
+def fingerprint(filename: str) -> str:
+    """Cache key of a trace: its size, mtime and a hash of sampled content."""
+    st = os.stat(filename)
+    h = hashlib.blake2b(digest_size=12)
+    h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(filename, "rb") as f:
+        h.update(f.read(EDGE_BYTES))
+        for i in range(1, N_SAMPLES + 1):
+            f.seek(st.st_size * i // (N_SAMPLES + 1))
+            h.update(f.read(SAMPLE_BYTES))
+        f.seek(max(st.st_size - EDGE_BYTES, 0))
+        h.update(f.read(EDGE_BYTES))
+    return h.hexdigest()
+
+
+def cache_dir_for(filename: str, cache_dir: str | Path | None = None) -> Path:
+    return Path(cache_dir) if cache_dir is not None else Path(filename).resolve().parent / CACHE_DIR_NAME
+
+
+def entry_prefix(filename: str, kind: str) -> str:
+    """
+    Start of the entry names of `filename`. Traces of the same name in other
+    directories can share a cache directory, so the name is followed by a
+    hash of the resolved path.
+    """
+    path = Path(filename).resolve()
+    path_hash = hashlib.blake2b(str(path).encode(), digest_size=4).hexdigest()
+    return f"{path.name}.{path_hash}.{kind}."
+
+
+def load(filename: str, kind: str, cache_dir: str | Path | None = None) -> dict[str, np.ndarray] | None:
+    """
+    Return the arrays cached for `filename` under `kind`, or None if there
+    is no entry for the trace's current fingerprint.
+    """
+    path = cache_dir_for(filename, cache_dir) / f"{entry_prefix(filename, kind)}{fingerprint(filename)}.npz"
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        # The mtime of an entry doubles as its last use for LRU eviction.
+        os.utime(path)
+    except FileNotFoundError:
+        # Never stored, or evicted by another process meanwhile.
+        return None
+    return arrays
+
+
+def store(
+    filename: str,
+    kind: str,
+    arrays: dict[str, np.ndarray],
+    cache_dir: str | Path | None = None,
+    max_bytes: int = MAX_CACHE_BYTES,
+):
+    """
+    Cache `arrays` for the current fingerprint of `filename`. Entries for
+    older versions of the trace are dropped, then the least recently used
+    entries are evicted until the cache fits in `max_bytes`.
+    """
+    directory = cache_dir_for(filename, cache_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    prefix = entry_prefix(filename, kind)
+    path = directory / f"{prefix}{fingerprint(filename)}.npz"
+
+    for stale in directory.glob(f"{glob.escape(prefix)}*.npz"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+
+    # One temporary file per writer, processes of a sweep may store the same entry.
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    tmp.replace(path)
+
+    evict(directory, max_bytes)
+
+
+def evict(directory: Path, max_bytes: int = MAX_CACHE_BYTES):
+    """
+    Remove the least recently used entries of `directory` until it fits in
+    `max_bytes`, always keeping the newest. Other processes may store and
+    evict entries at the same time, entries that are gone are skipped.
+    """
+    entries = []
+    for entry in directory.glob("*.npz"):
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, entry))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in entries[:-1]:
+        if total <= max_bytes:
+            break
+        total -= size
+        try:
+            entry.unlink()
+        except FileNotFoundError:
+            pass
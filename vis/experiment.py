@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Run an experiment described by a manifest (`experiment.toml` next to its
+results), replacing the per scale run.sh scripts:
+
+    python3 vis/experiment.py experiments/workload-similarity/100x/experiment.toml
+
+Every system's workload is generated once, into `workload_dir` (default
+`workloads/` next to the manifest), and reused by every run and every later
+invocation. It is named by the hash of its recipe, what it was generated
+from (the scaled Tectonic spec or the YCSB parameters), not of its content:
+the generators draw random keys, the same recipe gives another trace every
+time. With `fresh_workloads` every run gets its
+own. A workload is generated before the first run that needs it, while
+nothing is measured. With `lookahead` the next one is generated in a
+background thread while the current run replays instead, which needs the
+generators kept off the measured run: `generator_cpus` and `harness_cpus`
+must be disjoint and `workload_dir` must be on another device than the
+measured one (`device` and the project root, where the harness keeps
+`./db`), or the experiment doesn't start. `keep_workloads = false` deletes
+a workload after its last run. The workload a run replays is linked as `tec-workload-a.txt` /
+`ycsb-workload-a.txt` in the experiment directory when the run starts.
+
+Every run replays its workload in the iostat pass, the release harness
+with a timeline and property samples under iostat, then in the stats pass,
+the STATS build. Every finished run leaves
+`meta.<pass>.<system>.<run>.json` with the command, workload, options,
+commit and timing. A run whose metadata matches is skipped, so after a
+crash the same command resumes where it stopped.
+
+With `checkpoint_dir` (relative to the project root, where the harness
+keeps `./db`, so the checkpoint is on the same file system and its table
+files are hard linked) the load phase of a workload is replayed once: the
+first run of a workload saves the database at the end of its load phase to
+`<system>-<workload hash>-<options hash>` there (see src/checkpoint.h) and
+every later run of the same workload and options starts from a clone of it
+and replays only the run phase. The saving run also reports its load
+phase and ends with a flushed memtable, its metadata says
+`"comparable": false` and `aggregate.drop_not_comparable` leaves it out.
+Checkpoints aren't used with `fresh_workloads`, no workload is replayed
+twice.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import time
+import tomllib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from cache import fingerprint
+from mark_phases import OP_COUNT_KEYS, phases_arg, spec_phases
+from sweep import PROJECT_ROOT_DIR, SCHEMA, generate_trace, spec_hash
+
+HARNESS = PROJECT_ROOT_DIR / "cmake-build-release" / "rocksdb-benchmark-harness"
+STATS_HARNESS = PROJECT_ROOT_DIR / "cmake-build-release-with-stats" / "rocksdb-benchmark-harness"
+TECTONIC_DIR = PROJECT_ROOT_DIR / "vendor" / "tectonic"
+YCSB_DIR = PROJECT_ROOT_DIR / "vendor" / "YCSB"
+M2_REPOSITORY = Path.home() / ".m2" / "repository"
+YCSB_CLASSPATH = [
+    YCSB_DIR / "file" / "conf",
+    YCSB_DIR / "file" / "target" / "file-binding-0.18.0-SNAPSHOT.jar",
+    M2_REPOSITORY / "org/apache/htrace/htrace-core4/4.1.0-incubating/htrace-core4-4.1.0-incubating.jar",
+    M2_REPOSITORY / "org/hdrhistogram/HdrHistogram/2.1.12/HdrHistogram-2.1.12.jar",
+    M2_REPOSITORY / "org/codehaus/jackson/jackson-mapper-asl/1.9.4/jackson-mapper-asl-1.9.4.jar",
+    M2_REPOSITORY / "org/codehaus/jackson/jackson-core-asl/1.9.4/jackson-core-asl-1.9.4.jar",
+    YCSB_DIR / "core" / "target" / "core-0.18.0-SNAPSHOT.jar",
+]
+
+SYSTEMS = ["tectonic", "ycsb"]
+PASSES = ["iostat", "stats"]
+WORKLOAD_LINKS = {"tectonic": "tec-workload-a.txt", "ycsb": "ycsb-workload-a.txt"}
+
+
+@dataclass
+class Manifest:
+    path: Path
+    runs: int
+    scale: int
+    options: Path
+    systems: list[str]
+    passes: list[str]
+    device: str
+    drop_caches: bool
+    harness_args: list[str]
+    tectonic_spec: Path
+    tectonic_phases: list[str] | None
+    ycsb_workload: str
+    ycsb_records: int
+    ycsb_operations: int
+    java: str
+    workload_dir: Path
+    fresh_workloads: bool
+    keep_workloads: bool
+    lookahead: bool
+    generator_cpus: list[int] | None
+    harness_cpus: list[int] | None
+    checkpoint_dir: Path | None
+
+    @classmethod
+    def load(cls, path: Path) -> "Manifest":
+        path = path.resolve()
+        with open(path, "rb") as f:
+            m = tomllib.load(f)
+        tectonic = m.get("tectonic", {})
+        ycsb = m.get("ycsb", {})
+        manifest = cls(
+            path=path,
+            runs=m.get("runs", 5),
+            scale=m.get("scale", 1),
+            options=path.parent / m.get("options", "rocksdb-options.ini"),
+            systems=m.get("systems", SYSTEMS),
+            passes=m.get("passes", PASSES),
+            device=m.get("device", "nvme0n1"),
+            drop_caches=m.get("drop_caches", True),
+            harness_args=m.get("harness_args", []),
+            tectonic_spec=path.parent / tectonic.get("spec", "workload-a.spec.json"),
+            tectonic_phases=tectonic.get("phases"),
+            ycsb_workload=ycsb.get("workload", "workloada"),
+            ycsb_records=ycsb.get("records", 1_000_000),
+            ycsb_operations=ycsb.get("operations", 1_000_000),
+            java=ycsb.get("java", "/usr/lib/jvm/java-17-openjdk-amd64/bin/java"),
+            workload_dir=path.parent / m.get("workload_dir", "workloads"),
+            fresh_workloads=m.get("fresh_workloads", False),
+            keep_workloads=m.get("keep_workloads", True),
+            lookahead=m.get("lookahead", False),
+            generator_cpus=m.get("generator_cpus"),
+            harness_cpus=m.get("harness_cpus"),
+            checkpoint_dir=PROJECT_ROOT_DIR / m["checkpoint_dir"] if "checkpoint_dir" in m else None,
+        )
+        if unknown := set(manifest.systems) - set(SYSTEMS):
+            raise ValueError(f"{path}: unknown systems {sorted(unknown)}")
+        if unknown := set(manifest.passes) - set(PASSES):
+            raise ValueError(f"{path}: unknown passes {sorted(unknown)}")
+        return manifest
+
+    @property
+    def dir(self) -> Path:
+        return self.path.parent
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scaled_spec(spec: dict, scale: int) -> dict:
+    """`spec` with every operation count multiplied by `scale`."""
+    spec = json.loads(json.dumps(spec))
+    for section in spec["sections"]:
+        for group in section["groups"]:
+            for op in group.values():
+                if not isinstance(op, dict):
+                    continue
+                for key in OP_COUNT_KEYS:
+                    if key in op:
+                        op[key] *= scale
+    return spec
+
+
+def recipe(manifest: Manifest, system: str, run: int) -> dict:
+    """Everything the workload of `system` in `run` is generated from, its hash names the workload."""
+    if system == "tectonic":
+        spec = scaled_spec(json.loads(manifest.tectonic_spec.read_text()), manifest.scale)
+        spec.pop("$schema", None)
+        rec = {"system": system, "spec": spec, "phases": manifest.tectonic_phases}
+    else:
+        rec = {
+            "system": system,
+            "workload": manifest.ycsb_workload,
+            "records": manifest.ycsb_records * manifest.scale,
+            "operations": manifest.ycsb_operations * manifest.scale,
+        }
+    if manifest.fresh_workloads:
+        rec["run"] = run
+    return rec
+
+
+def generate_tectonic(manifest: Manifest, rec: dict, path: Path):
+    spec_path = path.with_suffix(".spec.json")
+    spec = {"$schema": os.path.relpath(SCHEMA, spec_path.parent), **rec["spec"]}
+    spec_path.write_text(json.dumps(spec, indent=2))
+    generate_trace(spec_path, path)
+
+
+def workload_phases(rec: dict) -> list[tuple[str, int]] | None:
+    """
+    Phases of the workload generated from `rec` for the harness's `--phases`.
+    A Tectonic trace is split at the group boundaries of its spec, YCSB
+    workloads carry phase markers.
+    """
+    if rec["system"] != "tectonic":
+        return None
+    return spec_phases(rec["spec"], rec["phases"])
+
+
+def generate_ycsb(manifest: Manifest, rec: dict, path: Path):
+    classpath = ":".join(str(p) for p in YCSB_CLASSPATH)
+    parts = []
+    for phase, flag in [("load", "-load"), ("run", "-t")]:
+        part = path.with_suffix(f".{phase}.part")
+        subprocess.run(
+            [
+                manifest.java, "-cp", classpath, "site.ycsb.Client",
+                "-db", "site.ycsb.db.FileClient",
+                "-P", f"workloads/{rec['workload']}",
+                "-p", f"file.output={part}",
+                "-p", f"recordcount={rec['records']}",
+                "-p", f"operationcount={rec['operations']}",
+                flag,
+            ],
+            cwd=YCSB_DIR,
+            check=True,
+        )
+        parts.append((phase, part))
+    with open(path, "wb") as out:
+        for phase, part in parts:
+            out.write(f"# {phase}\n".encode())
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out, 16 * 1024 * 1024)
+            part.unlink()
+
+
+@dataclass
+class Job:
+    """One replay: a run of a system in a pass, and the workload it needs."""
+    pass_: str
+    system: str
+    run: int
+    recipe: dict
+    digest: str
+    workload: Path
+    phases: list[tuple[str, int]] | None
+    checkpoint: Path | None
+
+
+def ensure_workload(manifest: Manifest, job: Job):
+    """Generates the workload of `job` if it doesn't exist yet."""
+    path = job.workload
+    if path.exists():
+        print(f"reusing {job.system} workload {path.name}")
+    else:
+        print(f"generating {job.system} workload {path.name}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Generated under a temporary name, so a crash never leaves a partial workload.
+        tmp = path.with_suffix(".tmp")
+        (generate_tectonic if job.system == "tectonic" else generate_ycsb)(manifest, job.recipe, tmp)
+        tmp.replace(path)
+
+
+def link_workload(manifest: Manifest, job: Job):
+    """
+    Points the system's workload link at the workload of `job`. Done by the
+    run, the generator thread is already working on the next workload.
+    """
+    link = manifest.dir / WORKLOAD_LINKS[job.system]
+    if link.is_symlink() or link.exists():
+        link.unlink()
+    link.symlink_to(os.path.relpath(job.workload, manifest.dir))
+
+
+def pin(cpus: list[int] | None):
+    """
+    Restricts the calling thread to `cpus`. Processes it starts inherit the
+    mask, which keeps the generators and the harness on their own cores.
+    """
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+
+def block_device(path: Path) -> str | None:
+    """The disk `path` is on as iostat names it, None if it isn't on a block device."""
+    dev = os.stat(path).st_dev
+    sys_dir = Path(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+    if not sys_dir.exists():
+        return None
+    sys_dir = sys_dir.resolve()
+    # Partitions are below their disk.
+    return sys_dir.parent.name if (sys_dir / "partition").exists() else sys_dir.name
+
+
+def check_lookahead(manifest: Manifest):
+    """Raises unless the background generators stay off the CPUs and the device of the measured runs."""
+    problems = []
+    if not manifest.generator_cpus or not manifest.harness_cpus:
+        problems.append("generator_cpus and harness_cpus")
+    elif overlap := set(manifest.generator_cpus) & set(manifest.harness_cpus):
+        problems.append(f"disjoint generator_cpus and harness_cpus, both have {sorted(overlap)}")
+    manifest.workload_dir.mkdir(parents=True, exist_ok=True)
+    if (
+        os.stat(manifest.workload_dir).st_dev == os.stat(PROJECT_ROOT_DIR).st_dev
+        or block_device(manifest.workload_dir) == manifest.device
+    ):
+        problems.append(f"a workload_dir on another device than {manifest.device}, not {manifest.workload_dir}")
+    if problems:
+        raise ValueError(f"{manifest.path}: lookahead needs " + " and ".join(problems))
+
+
+def run_files(manifest: Manifest, pass_: str, system: str, run: int) -> dict[str, Path]:
+    d = manifest.dir
+    if pass_ == "iostat":
+        return {
+            "iostat": d / f"iostat.{system}.{run}.json",
+            "timeline": d / f"timeline.{system}.{run}.jsonl",
+            "properties": d / f"properties.{system}.{run}.csv",
+        }
+    return {"stats": d / f"stats.{system}.{run}.json", "latency": d / f"op-latency.{system}.{run}.json"}
+
+
+def harness_command(
+    manifest: Manifest,
+    pass_: str,
+    workload: Path,
+    files: dict[str, Path],
+    phases: list[tuple[str, int]] | None = None,
+    checkpoint: Path | None = None,
+) -> list[str]:
+    args = [
+        *manifest.harness_args,
+        *(["--phases", phases_arg(phases)] if phases else []),
+        *(["--checkpoint", str(checkpoint)] if checkpoint else []),
+    ]
+    if pass_ == "iostat":
+        return [
+            str(HARNESS), *args,
+            "--timeline", str(files["timeline"]),
+            "--properties", str(files["properties"]),
+            str(manifest.options), str(workload),
+        ]
+    return [
+        str(STATS_HARNESS), *args,
+        str(manifest.options), str(workload), str(files["stats"]), str(files["latency"]),
+    ]
+
+
+def git_version() -> str:
+    result = subprocess.run(
+        ["git", "describe", "--always", "--dirty"], cwd=PROJECT_ROOT_DIR, capture_output=True, text=True
+    )
+    return result.stdout.strip() or "unknown"
+
+
+@contextlib.contextmanager
+def iostat(device: str, path: Path):
+    """Samples `device` into `path` every second until the block exits."""
+    with open(path, "w") as f:
+        proc = subprocess.Popen(
+            ["iostat", "-t", "-d", "-c", "-y", "1", device, "-o", "JSON"],
+            stdout=f,
+            env={**os.environ, "S_TIME_FORMAT": "ISO"},
+        )
+        try:
+            yield
+        finally:
+            # iostat closes its JSON document on SIGINT.
+            proc.send_signal(signal.SIGINT)
+            proc.wait()
+
+
+def meta_path(manifest: Manifest, job: Job) -> Path:
+    return manifest.dir / f"meta.{job.pass_}.{job.system}.{job.run}.json"
+
+
+def job_key(manifest: Manifest, job: Job) -> dict:
+    """What makes a finished run reusable: the same command on the same workload and options."""
+    files = run_files(manifest, job.pass_, job.system, job.run)
+    return {
+        "command": harness_command(manifest, job.pass_, job.workload, files, job.phases, job.checkpoint),
+        "workload_hash": job.digest,
+        "options_hash": file_hash(manifest.options),
+    }
+
+
+def is_done(manifest: Manifest, job: Job) -> bool:
+    path = meta_path(manifest, job)
+    if not path.exists():
+        return False
+    meta = json.loads(path.read_text())
+    return meta.get("status") == "ok" and all(meta.get(k) == v for k, v in job_key(manifest, job).items())
+
+
+def checkpoint_path(manifest: Manifest, system: str, digest: str, phases: list[tuple[str, int]] | None) -> Path | None:
+    """Where the load phase of the workload `digest` of `system` is checkpointed, None for no checkpoint."""
+    if manifest.checkpoint_dir is None or manifest.fresh_workloads:
+        return None
+    # The harness checkpoints the phase named "load", YCSB workloads always have one.
+    if phases is not None and "load" not in (name for name, _ in phases):
+        return None
+    return manifest.checkpoint_dir / f"{system}-{digest}-{file_hash(manifest.options)}"
+
+
+def plan(manifest: Manifest, force: bool = False) -> list[Job]:
+    """The runs that are left, in order: every pass of a run back to back, so they share its workload."""
+    jobs = []
+    for run in range(1, manifest.runs + 1):
+        for pass_ in manifest.passes:
+            for system in manifest.systems:
+                rec = recipe(manifest, system, run)
+                digest = spec_hash(rec)
+                workload = manifest.workload_dir / f"{system}-{digest}.txt"
+                phases = workload_phases(rec)
+                job = Job(
+                    pass_, system, run, rec, digest, workload, phases, checkpoint_path(manifest, system, digest, phases)
+                )
+                if not force and is_done(manifest, job):
+                    print(f"{system} {pass_} run {run}: done")
+                    continue
+                jobs.append(job)
+    return jobs
+
+
+def run_job(manifest: Manifest, job: Job):
+    files = run_files(manifest, job.pass_, job.system, job.run)
+    key = job_key(manifest, job)
+
+    # The run that saves the checkpoint replays the load phase too, see the module docstring.
+    saves_checkpoint = job.checkpoint is not None and not job.checkpoint.exists()
+    print(f"{job.system} {job.pass_} run {job.run}" + (", saving the checkpoint" if saves_checkpoint else ""))
+    if saves_checkpoint:
+        job.checkpoint.parent.mkdir(parents=True, exist_ok=True)
+    link_workload(manifest, job)
+    monitor = iostat(manifest.device, files["iostat"]) if job.pass_ == "iostat" else contextlib.nullcontext()
+    started = datetime.now(timezone.utc)
+    start = time.monotonic()
+    with monitor:
+        if manifest.drop_caches:
+            subprocess.run(["sudo", "sysctl", "-w", "vm.drop_caches=3"], check=True)
+        subprocess.run(key["command"], cwd=PROJECT_ROOT_DIR, check=True)
+    seconds = time.monotonic() - start
+
+    meta = {
+        **key,
+        "status": "ok",
+        "pass": job.pass_,
+        "system": job.system,
+        "run": job.run,
+        "manifest": str(manifest.path),
+        "scale": manifest.scale,
+        "workload": str(job.workload),
+        "workload_fingerprint": fingerprint(str(job.workload)),
+        "options": str(manifest.options),
+        "checkpoint": str(job.checkpoint) if job.checkpoint else None,
+        "checkpoint_saved": saves_checkpoint,
+        "comparable": not saves_checkpoint,
+        "outputs": {name: str(path) for name, path in files.items()},
+        "git": git_version(),
+        "host": platform.node(),
+        "kernel": platform.release(),
+        "started": started.isoformat(),
+        "seconds": seconds,
+    }
+    path = meta_path(manifest, job)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(meta, indent=2))
+    tmp.replace(path)
+
+
+def build():
+    print("Building tectonic")
+    subprocess.run(["cargo", "build", "--release"], cwd=TECTONIC_DIR, env={**os.environ, "CARGO_TARGET_DIR": "target"},
+                   check=True)
+    print("Building rocksdb-benchmark-harness")
+    for build_dir in [HARNESS.parent, STATS_HARNESS.parent]:
+        subprocess.run(
+            ["cmake", "--build", str(build_dir), "--target", "rocksdb-benchmark-harness", "--", f"-j{os.cpu_count()}"],
+            cwd=PROJECT_ROOT_DIR,
+            check=True,
+        )
+
+
+def run_experiment(manifest: Manifest, force: bool = False):
+    if manifest.lookahead:
+        check_lookahead(manifest)
+    # The harness, and iostat, inherit the mask of this thread.
+    pin(manifest.harness_cpus)
+    jobs = plan(manifest, force)
+    last_use = {job.workload: i for i, job in enumerate(jobs)}
+    generated: dict[Path, Future] = {}
+    # A single generator thread, so workloads are generated in the order the runs need them.
+    with ThreadPoolExecutor(max_workers=1, initializer=pin, initargs=(manifest.generator_cpus,)) as generator:
+        for i, job in enumerate(jobs):
+            # The workload of this run, and with lookahead the next different one, generated while this run replays.
+            for upcoming in jobs[i:]:
+                if upcoming.workload not in generated:
+                    generated[upcoming.workload] = generator.submit(ensure_workload, manifest, upcoming)
+                if upcoming.workload != job.workload or not manifest.lookahead:
+                    break
+            generated[job.workload].result()
+            run_job(manifest, job)
+            if not manifest.keep_workloads and last_use[job.workload] == i:
+                job.workload.unlink()
+                if job.checkpoint is not None:
+                    shutil.rmtree(job.checkpoint, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the experiment described by a manifest.")
+    parser.add_argument("manifest", type=Path, help="experiment.toml")
+    parser.add_argument("--no-build", action="store_true", help="don't build tectonic and the harness first")
+    parser.add_argument("--force", action="store_true", help="rerun runs that already finished")
+    args = parser.parse_args()
+
+    manifest = Manifest.load(args.manifest)
+    if not args.no_build:
+        build()
+    run_experiment(manifest, args.force)
+
+
+if __name__ == "__main__":
+    main()
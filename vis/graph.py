@@ -9,18 +9,13 @@ def _():
     import numpy as np
     from scipy import stats
     import matplotlib.pyplot as plt
-    from collections import Counter
     from sys import float_info
     import marimo as mo
-    if mo.running_in_notebook():
-        from tqdm.notebook import tqdm
-    else:
-        from tqdm import tqdm
 
     from enum import StrEnum
     from pathlib import Path
 
-    return Counter, Path, StrEnum, float_info, mo, np, plt, stats, tqdm
+    return Path, StrEnum, float_info, mo, np, plt, stats
 
 
 @app.cell
@@ -47,7 +42,7 @@ def _(Path):
 
 
 @app.cell
-def _(np, stats):
+def _(np):
     # Method 1: Method of Moments
     def estimate_beta_params_mom(samples):
         """Estimate Beta distribution parameters using method of moments"""
@@ -69,139 +64,23 @@ def _(np, stats):
         beta_est = (1 - mean) * common_factor
 
         return alpha_est, beta_est
-
-    # Method 2: Maximum Likelihood Estimation (using scipy)
-    def estimate_beta_params_mle(samples):
-        """Estimate Beta distribution parameters using MLE"""
-        # scipy.stats.beta.fit returns (a, b, loc, scale)
-        # For standard beta distribution, loc=0 and scale=1
-        params = stats.beta.fit(samples, floc=0, fscale=1)
-        return params[0], params[1]  # Return only alpha and beta
-    return (estimate_beta_params_mle,)
+    return
 
 
 @app.cell
-def _(Counter, StrEnum, float_info, np, tqdm):
-    class OpChar(StrEnum):
-        INSERT = "I"
-        UPDATE = "U"
-        MERGE = "M"
-        DELETE_POINT = "D"
-        DELETE_RANGE = "R"
-        QUERY_POINT = "P"
-        QUERY_RANGE = "S"
-
-    def bytes_to_human(n_bytes: int) -> str:
-        units = ["B", "KB", "MB", "GB", "TB"]
-        size = float(n_bytes)
-        for unit in units:
-            if size < 1024.0:
-                return f"{size:.2f} {unit}"
-            size /= 1024.0
-        return f"{size:.2f} PB"
-
-    def array_stats(arr: list[int]) -> dict:
-        arr = np.asarray(arr)  # ensure it's a numpy array
-
-        percentiles = np.percentile(arr, [25, 50, 75, 95, 99])
-
-        return {
-            "min": np.min(arr),
-            "p25": percentiles[0],
-            "p50": percentiles[1],  # median
-            "p75": percentiles[2],
-            "p95": percentiles[3],
-            "p99": percentiles[4],
-            "max": np.max(arr),
-            "mean": np.mean(arr),
-            "std": np.std(arr, ddof=1),  # sample std dev
-        }
-
-
-    def count_workload(filename: str):
-        print(f"counting {filename}")
-        with open(filename) as f:
-            lines = f.readlines()
-
-        db = {}
-        keys = []
-        key_to_idx = {}
-        bytes_written = 0
-        bytes_read = 0
-
-        key_len = []
-        insert_val_len = []
-        insert_duplicates = 0
-
-        update_idx = []
-        update_counter = Counter()
-        update_val_len = []
-
-        point_query_idx = []
-        point_query_counter = Counter()
-        empty_point_query_count = 0
-
-        pq_val_len = []
-
-
-        for line in tqdm(lines):
-            line = line.strip()
-            if line.startswith(OpChar.INSERT):
-                _, key, val = line.split(" ", maxsplit=2)
-                if key in db:
-                    insert_duplicates += 1
-
-                db[key] = val
-                keys.append(key)
-                key_to_idx[key] = len(keys) - 1
-
-                key_len.append(len(key))
-                bytes_written += len(key) + len(val)
-                insert_val_len.append(len(val))
-
-            elif line.startswith(OpChar.UPDATE):
-                _, key, val = line.split(" ", maxsplit=2)
-                db[key] = val
-
-                idx = key_to_idx[key]
-                update_idx.append(max(idx / len(keys), float_info.epsilon))
-                update_val_len.append(len(val))
-                bytes_written += len(key) + len(val)
-                update_counter[key] += 1
-            elif line.startswith(OpChar.QUERY_POINT):
-                _, key = line.split(" ", maxsplit=1)
-                bytes_read += len(key) + len(val) 
-
-                val = db.get(key)
-                if val is None:
-                    empty_point_query_count += 1
-                    continue
-                pq_val_len.append(len(val))
-                point_query_counter[key] += 1
-                idx = key_to_idx[key]
-                point_query_idx.append(max(idx / len(keys), float_info.epsilon))
-
-        print(f"{empty_point_query_count=}")
-        print(f"bytes read {bytes_to_human(bytes_read)} ({bytes_read} B)")
-        print(f"bytes written {bytes_to_human(bytes_written)} ({bytes_written} B)")
-
-        print("key len", array_stats(key_len))
-        print("insert", array_stats(insert_val_len))
-        print("update", array_stats(update_val_len))
-        print("pq", array_stats(pq_val_len))
-
-        return keys, (("Update", update_counter, update_idx), ("Point Query", point_query_counter, point_query_idx))
+def _():
+    from workload import count_workload
     return (count_workload,)
 
 
 @app.cell
 def _(np, plt, stats):
-    def plot_indices(indices, alpha, beta):
+    def plot_indices(indices, alpha, beta, weights=None):
         fig, ax1 = plt.subplots(1, 1, figsize=(12, 5))
 
         x = np.linspace(0, 1, 1000)
         ax1.hist(indices, bins=500, density=True, alpha=0.7, color='lightblue', 
-                label='Sample data')
+                label='Sample data', weights=weights)
         ax1.plot(x, stats.beta.pdf(x, alpha, beta), 'b:', linewidth=2, 
                  label=f'MLE: $\\alpha$={alpha:.2f}, $\\beta$={beta:.2f}')
         ax1.set_xlabel('x')
@@ -239,27 +118,20 @@ def _(np, plt):
 
 
 @app.cell
-def _(
-    estimate_beta_params_mle,
-    float_info,
-    np,
-    plot_bar_sorted,
-    plot_indices,
-    plt,
-):
+def _(float_info, np, plot_bar_sorted, plot_indices, plt):
+    from beta_fit import fit_counter
+
     # Updates
     def plot_op_stats(op_counter, op_idx):
         freq = np.array([freq for _, freq in op_counter.most_common()])
 
-        indices = np.arange(len(freq))
-        indices = np.repeat(indices, freq)
-        indices = indices / (indices.max() + 1)
-        indices = indices + float_info.epsilon
+        # Same samples as calc_indices, weighted by frequency instead of repeated.
+        indices = np.arange(len(freq)) / len(freq) + float_info.epsilon
 
-        alpha, beta = estimate_beta_params_mle(indices)
+        alpha, beta = fit_counter(op_counter)
         print(f"α = {alpha}, β = {beta}")
 
-        plot_indices(indices, alpha, beta)
+        plot_indices(indices, alpha, beta, weights=freq)
 
         plt.hist(op_idx, bins=1000, density=True, color="steelblue")
         plt.xlabel("Value")
@@ -273,16 +145,10 @@ def _(
 
 @app.cell
 def _(np):
-    def plot_bar_sorted_ax(ax, data, color="tab:red"):
-        counts, bin_edges = np.histogram(data, bins=1000, density=False)
-
-        # Compute bin centers
-        bin_centers = 0.5 * (bin_edges[:-1] + bin_edges[1:])
-
+    def plot_bar_sorted_ax(ax, counts, color="tab:red"):
+        """Bins of a histogram, e.g. of the indices in sweep.py's histograms, sorted by count."""
         # Sort bins by count (descending)
-        order = np.argsort(counts)[::-1]
-        counts_sorted = counts[order]
-        centers_sorted = bin_centers[order]
+        counts_sorted = np.sort(counts)[::-1]
 
         # Plot sorted histogram
         ax.bar(np.arange(len(counts_sorted)), counts_sorted, color=color, alpha=0.2)
@@ -370,22 +236,23 @@ def _(StrEnum):
 
 @app.cell
 def _(count_workload):
-    ycsb_keys, ycsb_op_stats = count_workload("../experiments/workload-similarity/ycsb-workload-a.txt")
-    tec_keys, tec_op_stats = count_workload("../experiments/workload-similarity/tec-workload-a.txt")
+    import os
+
+    ycsb_keys, ycsb_op_stats = count_workload("../experiments/workload-similarity/ycsb-workload-a.txt", processes=os.cpu_count(), cache=True)
+    tec_keys, tec_op_stats = count_workload("../experiments/workload-similarity/tec-workload-a.txt", processes=os.cpu_count(), cache=True)
     return tec_op_stats, ycsb_op_stats
 
 
 @app.cell
 def _(float_info, np):
     def calc_indices(counter):
+        """
+        Normalized ranks of the keys, most frequent first, and their
+        frequencies as histogram weights instead of one sample per request.
+        """
         freq = np.array([freq for _, freq in counter.most_common()])
-
-        indices = np.arange(len(freq))
-        indices = np.repeat(indices, freq)
-        indices = indices / (indices.max() + 1)
-        indices = indices + float_info.epsilon
-
-        return indices
+        indices = np.arange(len(freq)) / len(freq) + float_info.epsilon
+        return indices, freq
     return (calc_indices,)
 
 
@@ -406,17 +273,17 @@ def _(
 
             x = np.linspace(0, 1, 1000)
 
-            ycsb_indices = calc_indices(ycsb_counter)
-            ax1.hist(ycsb_indices, bins=500, density=True, alpha=0.7, 
+            ycsb_indices, ycsb_weights = calc_indices(ycsb_counter)
+            ax1.hist(ycsb_indices, bins=500, weights=ycsb_weights, density=True, alpha=0.7, 
                     label=f'YCSB {op}', **{**bar_styles[Style.YCSB],"color":"grey"} )
             ax1.set_xlabel('index (normalized + sorted)')
             ax1.set_ylabel('Frequency')
             ax1.set_title("YCSB")
             ax1.grid(True, alpha=0.3)
 
-            tec_indices = calc_indices(tec_counter)
+            tec_indices, tec_weights = calc_indices(tec_counter)
 
-            ax2.hist(tec_indices, bins=500, density=True, alpha=0.7, 
+            ax2.hist(tec_indices, bins=500, weights=tec_weights, density=True, alpha=0.7, 
                     label=f'Tectonic {op}', **{**bar_styles[Style.Tectonic],"color":"tab:red"})
             ax2.set_xlabel('index (normalized + sorted)')
             ax2.set_title("Tectonic")
@@ -487,17 +354,17 @@ def _(PLOTS_DIR, Style, bar_styles, plt, tec_op_stats, ycsb_op_stats):
 
             # x = np.linspace(0, 1, 1000)
 
-            # ycsb_indices = calc_indices(ycsb_counter)
-            # ax1.hist(ycsb_indices, bins=500, density=True, alpha=0.7, 
+            # ycsb_indices, ycsb_weights = calc_indices(ycsb_counter)
+            # ax1.hist(ycsb_indices, bins=500, weights=ycsb_weights, density=True, alpha=0.7, 
             #         label=f'YCSB {op}', **{**bar_styles[Style.YCSB],"color":"grey"} )
             # ax1.set_xlabel('index (normalized + sorted)')
             # ax1.set_ylabel('Frequency')
             # ax1.set_title("YCSB")
             # ax1.grid(True, alpha=0.3)
 
-            # tec_indices = calc_indices(tec_counter)
+            # tec_indices, tec_weights = calc_indices(tec_counter)
 
-            # ax2.hist(tec_indices, bins=500, density=True, alpha=0.7, 
+            # ax2.hist(tec_indices, bins=500, weights=tec_weights, density=True, alpha=0.7, 
             #         label=f'Tectonic {op}', **{**bar_styles[Style.Tectonic],"color":"tab:red"})
             # ax2.set_xlabel('index (normalized + sorted)')
             # ax2.set_title("Tectonic")
@@ -526,6 +393,25 @@ def _(PLOTS_DIR, Style, bar_styles, plt, tec_op_stats, ycsb_op_stats):
     return
 
 
+@app.cell
+def _(mo, tec_op_stats, ycsb_op_stats):
+    from similarity import distances, histograms, index_histogram, top_k_overlap
+
+    def _():
+        ycsb_hist = histograms(ycsb_op_stats)
+        tec_hist = histograms(tec_op_stats)
+        rows = []
+        for (op, _, ycsb_idx), (_, _, tec_idx) in zip(ycsb_op_stats, tec_op_stats, strict=True):
+            metrics = distances(tec_hist[op], ycsb_hist[op])
+            # Hot keys by insertion position, the key spaces of YCSB and Tectonic differ.
+            overlap = top_k_overlap(index_histogram(tec_idx), index_histogram(ycsb_idx))
+            rows.append({"op": op, **{name: float(value) for name, value in metrics.items()}, "top_100": float(overlap)})
+        return mo.ui.table(rows)
+
+    _()
+    return
+
+
 @app.cell
 def _(mo):
     mo.md(r"""## $\alpha$ - $\beta$ experiments. DO NOT INCLUDE IN PAPER""")
@@ -534,36 +420,49 @@ def _(mo):
 
 @app.cell
 def _(EXPERIMENT_DIR):
-    raise Exception("Don't run")
+    import csv
+
+    from sweep import HISTOGRAMS, TARGET, load_histograms
+
+    # Written by `python sweep.py`, plotting never touches the traces.
     multi_dir = EXPERIMENT_DIR / "multi"
-    tec_stats_multi = {}
-    for path in multi_dir.glob("*.txt"):
-        print(path)
-        # _, op_stats = count_workload(str(path))
-        # tec_stats_multi[path] = op_stats
+    sweep_results, multi_hists = None, None
+    if (multi_dir / "results.csv").exists():
+        with open(multi_dir / "results.csv") as f:
+            sweep_results = list(csv.DictReader(f))
+        multi_hists = load_histograms(multi_dir / HISTOGRAMS) or None
+    # Grid points by name, `{alpha}-{beta}`, and the YCSB trace's histograms.
+    multi_target = multi_hists.pop(TARGET, None) if multi_hists else None
+    multi_missing = "No sweep results, run `python sweep.py` first."
+    return multi_hists, multi_missing, multi_target, sweep_results
 
-    return (tec_stats_multi,)
+
+@app.cell
+def _(mo, multi_missing, sweep_results):
+    mo.ui.table(sweep_results) if sweep_results is not None else mo.md(multi_missing)
+    return
 
 
 @app.cell(hide_code=True)
-def _(Style, bar_styles, plt, tec_stats_multi):
+def _(Style, bar_styles, mo, multi_hists, multi_missing, multi_target, np, plt):
+    mo.stop(multi_hists is None or multi_target is None, mo.md(multi_missing))
+
     def _():
-        items = list(sorted(tec_stats_multi.items(), key=lambda x: x[0].stem))
+        op = next(iter(multi_target))
         fig, axes = plt.subplots(4, 4, figsize=(25, 25), dpi=150, constrained_layout=True)
         axes = axes.flatten()  # so we can index linearly
-        for i, (path, tec_op_stats) in enumerate(items):
-            (op, tec_counter, tec_idx) = tec_op_stats[0]
-            # print([x for x in tec_counter.most_common(10)])
+        for i, (name, hists) in enumerate(sorted(multi_hists.items())):
+            counts = hists[op]["index"]
             ax = axes[i]
             # fig, ax = plt.subplots(1, 1, figsize=(15, 6), dpi=150)
 
-
-            ax.hist(tec_idx, bins=1000, density=True, **{**bar_styles[Style.Tectonic],"color":"tab:red"})
+            edges = np.linspace(0, 1, len(counts) + 1)
+            ax.stairs(counts * len(counts) / counts.sum(), edges, fill=True, **{**bar_styles[Style.Tectonic],"color":"tab:red"})
             ax.set_xlabel(f"index (normalized)")
             ax.set_ylabel("Frequency")
             ax.set_yscale("log")
             ax.set_ylim(top=500)
-            ax.set_title(path.stem)
+            ax.set_title(name)
             # ax.set_ylim(100)
 
             fig.suptitle(f"Request index frequency: {op}")
@@ -575,24 +474,25 @@ def _(Style, bar_styles, plt, tec_stats_multi):
 
 
 @app.cell(hide_code=True)
-def _(Style, bar_styles, plt, tec_stats_multi):
+def _(Style, bar_styles, mo, multi_hists, multi_missing, multi_target, np, plt):
+    mo.stop(multi_hists is None or multi_target is None, mo.md(multi_missing))
+
     def _():
-        items = list(sorted(tec_stats_multi.items(), key=lambda x: x[0].stem))
+        op = next(iter(multi_target))
         fig, axes = plt.subplots(4, 4, figsize=(25, 25), dpi=150, constrained_layout=True)
         axes = axes.flatten()  # so we can index linearly
-        for i, (path, tec_op_stats) in enumerate(items):
-            (op, tec_counter, tec_idx) = tec_op_stats[0]
-            # print([x for x in tec_counter.most_common(10)])
+        for i, (name, hists) in enumerate(sorted(multi_hists.items())):
+            counts = hists[op]["index"]
             ax = axes[i]
             # fig, ax = plt.subplots(1, 1, figsize=(15, 6), dpi=150)
 
-
-            ax.hist(tec_idx, bins=1000, density=True, **{**bar_styles[Style.Tectonic],"color":"tab:red"})
+            edges = np.linspace(0, 1, len(counts) + 1)
+            ax.stairs(counts * len(counts) / counts.sum(), edges, fill=True, **{**bar_styles[Style.Tectonic],"color":"tab:red"})
             ax.set_xlabel(f"index (normalized)")
             ax.set_ylabel("Frequency")
             ax.set_yscale("log")
             ax.set_ylim(top=300)
-            ax.set_title(path.stem)
+            ax.set_title(name)
             # ax.set_ylim(100)
 
             fig.suptitle(f"Request index frequency: {op}")
@@ -603,32 +503,26 @@ def _(Style, bar_styles, plt, tec_stats_multi):
     return
 
 
-@app.cell
-def _(ycsb_op_stats):
-    _, ycsb_counter, ycsb_idx = ycsb_op_stats[0]
-    return ycsb_counter, ycsb_idx
-
-
 @app.cell(hide_code=True)
-def _(plot_bar_sorted_ax, plt, tec_stats_multi, ycsb_idx):
+def _(mo, multi_hists, multi_missing, multi_target, plot_bar_sorted_ax, plt):
+    mo.stop(multi_hists is None or multi_target is None, mo.md(multi_missing))
+
     def _():
-        items = list(sorted(tec_stats_multi.items(), key=lambda x: x[0].stem))
+        op = next(iter(multi_target))
         fig, axes = plt.subplots(4, 4, figsize=(25, 25), dpi=150, constrained_layout=True)
         axes = axes.flatten()  # so we can index linearly
-        for i, (path, tec_op_stats) in enumerate(items):
-            (op, tec_counter, tec_idx) = tec_op_stats[0]
-            # print([x for x in tec_counter.most_common(10)])
+        for i, (name, hists) in enumerate(sorted(multi_hists.items())):
             ax = axes[i]
             # fig, ax = plt.subplots(1, 1, figsize=(15, 6), dpi=150)
 
-            plot_bar_sorted_ax(ax, tec_idx)
-            plot_bar_sorted_ax(ax, ycsb_idx, color="grey")
+            plot_bar_sorted_ax(ax, hists[op]["index"])
+            plot_bar_sorted_ax(ax, multi_target[op]["index"], color="grey")
 
             # ax.hist(tec_idx, bins=1000, density=True, **{**bar_styles[Style.Tectonic],"color":"tab:red"})
             # ax.set_xlabel(f"index (normalized)")
             # ax.set_ylabel("Frequency")
             # ax.set_yscale("log")
-            ax.set_title(path.stem)
+            ax.set_title(name)
             ax.set_ylim(top=10**5)
 
             fig.suptitle(f"Request index frequency: {op}")
@@ -641,16 +535,18 @@ def _(plot_bar_sorted_ax, plt, tec_stats_multi, ycsb_idx):
 
 
 @app.cell(hide_code=True)
-def _(Style, bar_styles, calc_indices, np, plt, tec_stats_multi, ycsb_counter):
+def _(Style, bar_styles, mo, multi_hists, multi_missing, multi_target, np, plt):
+    mo.stop(multi_hists is None or multi_target is None, mo.md(multi_missing))
+
     def _():
-        items = list(sorted(tec_stats_multi.items(), key=lambda x: x[0].stem))
+        op = next(iter(multi_target))
         fig, axes = plt.subplots(4, 4, figsize=(25, 25), dpi=150, constrained_layout=True)
         axes = axes.flatten()  # so we can index linearly
-        ycsb_indices = calc_indices(ycsb_counter)
+        # rank_histogram of the sweep, the same as a weighted histogram of calc_indices.
+        ycsb_rank = multi_target[op]["rank"]
+        edges = np.linspace(0, 1, len(ycsb_rank) + 1)
 
-        for i, (path, tec_op_stats) in enumerate(items):
-            (op, tec_counter, tec_idx) = tec_op_stats[0]
-            # print([x for x in tec_counter.most_common(10)])
+        for i, (name, hists) in enumerate(sorted(multi_hists.items())):
             ax = axes[i]
             # fig, ax = plt.subplots(1, 1, figsize=(15, 6), dpi=150)
 
@@ -663,16 +559,14 @@ def _(Style, bar_styles, calc_indices, np, plt, tec_stats_multi, ycsb_counter):
             # # ax.set_yscale("log")
             # ax.set_title(path.stem)
             # ax.set_ylim(top=10**5)
-            x = np.linspace(0, 1, 1000)
-
-            tec_indices = calc_indices(tec_counter)
-            ax.hist(tec_indices, bins=500, density=True, alpha=0.2, 
+            tec_rank = hists[op]["rank"]
+            ax.stairs(tec_rank * len(tec_rank), edges, fill=True, alpha=0.2,
                     label=f'T {op}', **{**bar_styles[Style.Tectonic],"color":"tab:red"} )
-            ax.hist(ycsb_indices, bins=500, density=True, alpha=0.2, 
+            ax.stairs(ycsb_rank * len(ycsb_rank), edges, fill=True, alpha=0.2,
                     label=f'Y {op}', **{**bar_styles[Style.Tectonic],"color":"grey"} )
             ax.set_xlabel('index (normalized + sorted)')
             ax.set_ylabel('Frequency')
-            ax.set_title(path.stem)
+            ax.set_title(name)
             ax.set_yscale("log")
             ax.legend()
             ax.grid(True, alpha=0.3)
@@ -0,0 +1,105 @@
+"""
+Latency histograms written by the harness (`stats::Histogram` in
+src/histogram.h): one JSON object per latency file mapping each operation to
+its non-empty buckets and exact count, sum, min and max in nanoseconds.
+Traces with phase markers add a "phases" list of `{"name", "ops"}` objects,
+each with the same mapping for the operations of that phase.
+"""
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+
+def bucket_bounds(index: np.ndarray, sub_bits: int) -> tuple[np.ndarray, np.ndarray]:
+    """`[lower, upper)` of the buckets `index`, the inverse of `Histogram::bucket`."""
+    index = np.asarray(index, dtype=np.int64)
+    half = 1 << (sub_bits - 1)
+    shift = np.maximum(index // half - 1, 0)
+    # Floats, the top buckets don't fit in int64.
+    width = np.exp2(shift)
+    lower = np.where(index < 2 * half, index, index - shift * half) * width
+    return lower, lower + width
+
+
+@dataclass
+class LatencyHistogram:
+    sub_bits: int
+    index: np.ndarray
+    counts: np.ndarray
+    count: int
+    sum: int
+    min: int
+    max: int
+
+    @classmethod
+    def from_json(cls, obj: dict) -> "LatencyHistogram":
+        return cls(
+            sub_bits=obj["sub_bits"],
+            index=np.asarray(obj["index"], dtype=np.int64),
+            counts=np.asarray(obj["counts"], dtype=np.int64),
+            count=obj["count"],
+            sum=obj["sum"],
+            min=obj["min"],
+            max=obj["max"],
+        )
+
+    def __add__(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if self.sub_bits != other.sub_bits:
+            raise ValueError("histograms with different sub_bits can't be merged")
+        index, inverse = np.unique(np.concatenate([self.index, other.index]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([self.counts, other.counts]))
+        non_empty = [h for h in (self, other) if h.count]
+        return LatencyHistogram(
+            sub_bits=self.sub_bits,
+            index=index,
+            counts=counts.astype(np.int64),
+            count=self.count + other.count,
+            sum=self.sum + other.sum,
+            min=min((h.min for h in non_empty), default=0),
+            max=max(self.max, other.max),
+        )
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else float("nan")
+
+    def percentile(self, q) -> np.ndarray:
+        """
+        Percentiles `q` (0-100), interpolated linearly inside the bucket they
+        fall into and clamped to the exact min and max.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        lower, upper = bucket_bounds(self.index, self.sub_bits)
+        cum = np.cumsum(self.counts)
+        rank = q / 100 * self.count
+        i = np.minimum(np.searchsorted(cum, rank, side="left"), len(cum) - 1)
+        before = cum[i] - self.counts[i]
+        frac = np.clip((rank - before) / self.counts[i], 0, 1)
+        value = lower[i] + frac * (upper[i] - lower[i])
+        return np.clip(value, self.min, self.max)
+
+    def box_stats(self, whis: tuple[float, float] = (0, 99), scale: float = 1.0) -> dict:
+        """Statistics for `Axes.bxp`, the box plot `boxplot(..., whis=whis)` would draw."""
+        lo, q1, med, q3, hi = self.percentile([whis[0], 25, 50, 75, whis[1]]) / scale
+        return {"whislo": lo, "q1": q1, "med": med, "q3": q3, "whishi": hi, "mean": self.mean / scale, "fliers": []}
+
+
+def load_latency_file(path: Path, phase: str | None = None) -> dict[str, LatencyHistogram]:
+    """Histograms of the whole run, or of `phase` (summed if the name repeats, empty if it is missing)."""
+    with open(path) as f:
+        data = json.load(f)
+    phases = data.pop("phases", [])
+    if phase is None:
+        return {op: LatencyHistogram.from_json(obj) for op, obj in data.items()}
+    ops = {}
+    for p in phases:
+        if p["name"] != phase:
+            continue
+        for op, obj in p["ops"].items():
+            hist = LatencyHistogram.from_json(obj)
+            ops[op] = ops[op] + hist if op in ops else hist
+    return ops
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Phases of a Tectonic trace at the group boundaries of the spec that
+generated it, as the harness's `--phases` argument:
+
+    rocksdb-benchmark-harness --phases $(python3 vis/mark_phases.py spec.json --names load,run) ...
+
+Tectonic runs the groups of a spec one after the other and every group emits
+exactly the sum of its operations' `op_count`, so the boundaries follow from
+the spec alone and the trace is left as it is. Phases are named `--names`,
+one per group in order, or `s<section>g<group>`.
+"""
+import argparse
+import json
+from pathlib import Path
+
+# Alternative spelling of `op_count`, see naming.md.
+OP_COUNT_KEYS = ["op_count", "amount"]
+
+
+def group_sizes(spec: dict) -> list[tuple[str, int]]:
+    """Default name and number of operations of every group of `spec`, in order."""
+    sizes = []
+    for i, section in enumerate(spec["sections"]):
+        for j, group in enumerate(section["groups"]):
+            n = sum(
+                op[key]
+                for op in group.values()
+                if isinstance(op, dict)
+                for key in OP_COUNT_KEYS
+                if key in op
+            )
+            sizes.append((f"s{i}g{j}", n))
+    return sizes
+
+
+def spec_phases(spec: dict, names: list[str] | None = None) -> list[tuple[str, int]]:
+    """`group_sizes(spec)`, renamed to `names` if given."""
+    phases = group_sizes(spec)
+    if names is None:
+        return phases
+    if len(names) != len(phases):
+        raise ValueError(f"{len(names)} names for {len(phases)} groups")
+    return [(name, n) for name, (_, n) in zip(names, phases)]
+
+
+def phases_arg(phases: list[tuple[str, int]]) -> str:
+    """`phases` as the value of the harness's `--phases`."""
+    return ",".join(f"{name}={n}" for name, n in phases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the group boundaries of a Tectonic spec as harness --phases.")
+    parser.add_argument("spec", type=Path, help="spec the trace is generated from")
+    parser.add_argument("--names", help="comma separated phase names, one per group")
+    args = parser.parse_args()
+
+    spec = json.loads(args.spec.read_text())
+    try:
+        phases = spec_phases(spec, args.names.split(",") if args.names else None)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(phases_arg(phases))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Parse time of a workload trace, for the `readlines`/`str.split` loop the
+notebooks used to have and for `parse_trace`, on the text trace and
+optionally on the same trace converted with tracebin.py. Only parsing is
+timed, every timing is the best of `--repetitions` on a warm page cache.
+
+    python3 vis/parse_bench.py trace.txt --binary trace.bin
+
+`newline scan` is the first pass of `parse_block` on its own. Text parsing
+can't get faster than it, it reads every byte of every value.
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from tracefile import NEWLINE, iter_blocks, parse_trace
+
+
+def parse_lines(filename: str) -> int:
+    """The loop `count_workload` and beta-reg.py used to run, without the counting."""
+    n = 0
+    with open(filename) as f:
+        for line in f.readlines():
+            parts = line.strip().split(" ", maxsplit=2)
+            n += len(parts[0])
+    return n
+
+
+def scan_newlines(filename: str) -> int:
+    return sum(len(np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == NEWLINE)) for _, block in iter_blocks(filename))
+
+
+def best_of(fn, repetitions: int) -> float:
+    fn()  # warms up the page cache
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time parsing a workload trace.")
+    parser.add_argument("trace", help="text trace")
+    parser.add_argument("--binary", help="the same trace converted with tracebin.py")
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    n_lines = len(parse_trace(args.trace))
+    size = Path(args.trace).stat().st_size
+    cases = {
+        "line loop": lambda: parse_lines(args.trace),
+        "newline scan": lambda: scan_newlines(args.trace),
+        "parse_trace": lambda: parse_trace(args.trace),
+        "parse_trace, keys": lambda: parse_trace(args.trace, with_keys=True),
+    }
+    if args.binary:
+        cases["binary"] = lambda: parse_trace(args.binary)
+        cases["binary, keys"] = lambda: parse_trace(args.binary, with_keys=True)
+
+    print(f"{args.trace}: {n_lines} lines, {size / 1e6:.0f} MB")
+    baseline = None
+    for name, fn in cases.items():
+        seconds = best_of(fn, args.repetitions)
+        baseline = baseline or seconds
+        print(f"{name:>18}: {seconds:7.3f} s {seconds / n_lines * 1e9:7.0f} ns/line "
+              f"{size / seconds / 1e6:7.0f} MB/s {baseline / seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
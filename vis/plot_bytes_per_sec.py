@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import json
 from pathlib import Path
 
 import matplotlib
@@ -7,17 +6,29 @@ import matplotlib.pyplot as plt
 import matplotlib.font_manager as font_manager
 import numpy as np
 from matplotlib.ticker import MaxNLocator
+from aggregate import Summary, drop_warm_up_and_not_comparable, outliers, run_index, summarize
 from style import line_styles
+from timeseries import envelope, iostat_times, load_iostat, load_timeline, progress
 
 # Use non-interactive backend
 matplotlib.use("Agg")
 
 TAG = "100x"
+# Leading runs of every system left out. The first run after building and
+# generating the workloads starts with a cold page cache and device. With a
+# checkpoint_dir that run saves the checkpoint and is not comparable anyway,
+# so it is the warm-up run and 4 of 5 runs are left, as without checkpoints.
+WARM_UP_RUNS = 1
+# Axis the runs are lined up on: "time", seconds since the start of the run,
+# or "progress", the share of its operations done, which needs the timeline
+# of every run (written by the iostat pass of experiment.py).
+X_AXIS = "time"
+# Buckets the axis is split into, and markers drawn on each line.
+BUCKETS = 400
+MARKERS = 20
 
 # Constants
 BASE_DIR = Path(f"../experiments/workload-similarity/{TAG}")
-BYTE_TO_GB = 1024 * 1024 * 1024
-KB_TO_BYTES = 1024
 
 # Font setup
 FONT_PATH = "../LinLibertine_Mah.ttf"
@@ -27,65 +38,80 @@ plt.rcParams["text.usetex"] = True
 plt.rcParams["font.size"] = 22
 
 
-def load_iostat(path):
-    with open(path) as f:
-        data = json.load(f)
-    stats = data["sysstat"]["hosts"][0]["statistics"]
-
-    reads = [
-        float(s.get("disk", [{}])[0].get("kB_read/s", 0.0)) * KB_TO_BYTES / BYTE_TO_GB
-        for s in stats
-    ]
-    writes = [
-        float(s.get("disk", [{}])[0].get("kB_wrtn/s", 0.0)) * KB_TO_BYTES / BYTE_TO_GB
-        for s in stats
-    ]
-    return np.array(reads), np.array(writes)
+def run_axis(path: Path) -> np.ndarray:
+    """Position of every iostat sample of a run on X_AXIS, from the timeline of the run if there is one."""
+    timeline_path = path.with_name(path.name.replace("iostat.", "timeline.", 1)).with_suffix(".jsonl")
+    timeline = load_timeline(timeline_path) if timeline_path.exists() else None
+    times = iostat_times(path, timeline)
+    if X_AXIS == "time":
+        return times
+    if timeline is None:
+        raise RuntimeError(f"No timeline {timeline_path} to place {path} by progress")
+    return progress(times, timeline)
 
 
 def collect_runs(system):
-    paths = sorted(BASE_DIR.glob(f"iostat.{system}.*.json"))
-    runs = [load_iostat(p) for p in paths]
-    return runs[1:]
-
-
-def average_runs(runs):
-    if not runs:
-        return np.array([]), np.array([])
-    min_len = min(len(r) for r, _ in runs)
-    avg_reads = np.mean([r[:min_len] for r, _ in runs], axis=0)
-    avg_writes = np.mean([w[:min_len] for _, w in runs], axis=0)
-    return avg_reads, avg_writes
+    paths = sorted(BASE_DIR.glob(f"iostat.{system}.*.json"), key=run_index)
+    paths = drop_warm_up_and_not_comparable(paths, WARM_UP_RUNS, system)
+    runs = [(run_axis(p), *load_iostat(p)) for p in paths]
+
+    # Runs whose total traffic stands out from the others.
+    totals = np.array([r.sum() + w.sum() for _, r, w in runs])
+    for path in np.array(paths)[outliers(totals)]:
+        print(f"{system}: outlier {path}")
+    return runs
+
+
+def bucket_edges(runs) -> np.ndarray:
+    """BUCKETS equal buckets of X_AXIS, from the start to the end of the longest run."""
+    end = 1.0 if X_AXIS == "progress" else max(x[-1] for x, _, _ in runs)
+    return np.linspace(0.0, end, BUCKETS + 1)
+
+
+def summarize_runs(runs, edges) -> list[tuple[Summary, np.ndarray]]:
+    """
+    Read and write throughput over the runs in every bucket: the summary of
+    the bucket means of the runs, and the peak, the highest sample of any
+    run. A run past its end doesn't count towards a bucket.
+    """
+    result = []
+    for column in (1, 2):
+        envelopes = [envelope(run[0], run[column], edges) for run in runs]
+        means = summarize(np.array([e.mean for e in envelopes]))
+        peaks = np.fmax.reduce([e.max for e in envelopes])
+        result.append((means, peaks))
+    return result
 
 
 def plot_iostat(runs_tec, runs_ycsb, plot_file, legend_file):
-    r_tec, w_tec = average_runs(runs_tec)
-    r_ycsb, w_ycsb = average_runs(runs_ycsb)
-    n = min(len(r_tec), len(w_tec), len(r_ycsb), len(w_ycsb))
-    step = 200
-
-    x = np.arange(n) + 1
-    x = x[::step]
-    r_tec, w_tec = r_tec[:n:step], w_tec[:n:step]
-    r_ycsb, w_ycsb = r_ycsb[:n:step], w_ycsb[:n:step]
-
-    min_len = min(len(x), len(r_tec), len(w_tec), len(r_ycsb), len(w_ycsb))
-    x, r_tec, w_tec, r_ycsb, w_ycsb = (
-        x[:min_len],
-        r_tec[:min_len],
-        w_tec[:min_len],
-        r_ycsb[:min_len],
-        w_ycsb[:min_len],
-    )
-
+    edges = bucket_edges(runs_tec + runs_ycsb)
+    (r_tec, r_tec_peak), (w_tec, w_tec_peak) = summarize_runs(runs_tec, edges)
+    (r_ycsb, r_ycsb_peak), (w_ycsb, w_ycsb_peak) = summarize_runs(runs_ycsb, edges)
+    for system, reads, writes in [("tectonic", r_tec, w_tec), ("ycsb", r_ycsb, w_ycsb)]:
+        print(f"{system}: mean over the runs {np.nanmean(reads.mean):.3g} GB/s read, "
+              f"{np.nanmean(writes.mean):.3g} GB/s written")
+
+    x = (edges[:-1] + edges[1:]) / 2
+    if X_AXIS == "progress":
+        x = x * 100
     fig, ax = plt.subplots(figsize=(5, 3.5))
 
-    ax.plot(x, r_ycsb, **{**line_styles["YCSB"], "linestyle": "-", "label": "read (YCSB)"})
-    ax.plot(x, w_ycsb, **{**line_styles["YCSB"], "linestyle": "--", "label": "write (YCSB)"})
-    ax.plot(x, r_tec, **{**line_styles["Tectonic"], "linestyle": "-", "label": "read (Tectonic)"})
-    ax.plot(x, w_tec, **{**line_styles["Tectonic"], "linestyle": "--", "label": "write (Tectonic)"})
-
-    ax.set_xlabel("time (s)")
+    lines = [
+        (r_ycsb, r_ycsb_peak, "YCSB", "-", "read (YCSB)"),
+        (w_ycsb, w_ycsb_peak, "YCSB", "--", "write (YCSB)"),
+        (r_tec, r_tec_peak, "Tectonic", "-", "read (Tectonic)"),
+        (w_tec, w_tec_peak, "Tectonic", "--", "write (Tectonic)"),
+    ]
+    for summary, peak, system, linestyle, label in lines:
+        style = line_styles[system]
+        ax.plot(x, summary.mean, **{**style, "linestyle": linestyle, "label": label},
+                markevery=max(1, BUCKETS // MARKERS))
+        # Confidence interval of the mean over the runs.
+        ax.fill_between(x, summary.low, summary.high, color=style["color"], alpha=0.2, linewidth=0)
+        # Bursts within a bucket, which its mean smooths over.
+        ax.plot(x, peak, color=style["color"], linestyle=linestyle, linewidth=0.5, alpha=0.5)
+
+    ax.set_xlabel("progress (\\% of operations)" if X_AXIS == "progress" else "time (s)")
     ax.set_ylabel("GB/s")
     ax.set_ylim(0)
     ax.set_yticklabels([0] + [f"{tick:.1f}" for tick in ax.get_yticks()[1:]])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+from pathlib import Path
+
+import matplotlib
+import matplotlib.pyplot as plt
+import matplotlib.font_manager as font_manager
+import numpy as np
+
+# Use non-interactive backend
+matplotlib.use("Agg")
+
+TAG = "100x"
+RUN = 2
+
+# Constants
+BASE_DIR = Path(f"../experiments/workload-similarity/{TAG}")
+PLOTS_DIR = Path("../plots")
+PLOTS_DIR.mkdir(exist_ok=True)
+BYTE_TO_GB = 1024 * 1024 * 1024
+BYTE_TO_MB = 1024 * 1024
+FILES_AT_LEVEL = "rocksdb.num-files-at-level"
+
+# Font setup
+FONT_PATH = "../LinLibertine_Mah.ttf"
+prop = font_manager.FontProperties(fname=FONT_PATH)
+plt.rcParams["font.family"] = prop.get_name()
+plt.rcParams["text.usetex"] = True
+plt.rcParams["font.size"] = 16
+
+
+def load_properties(path: Path) -> dict[str, np.ndarray]:
+    """
+    Columns of a harness property file (`--properties`): `t`, `unix` and one
+    per sampled DB property, NaN where the DB didn't report it.
+    """
+    with open(path) as f:
+        names = f.readline().strip().split(",")
+    values = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    if len(values) == 0:
+        raise RuntimeError(f"Empty property file {path}")
+    columns = {name: values[:, i] for i, name in enumerate(names)}
+    for name, column in columns.items():
+        if name not in ("t", "unix"):
+            column[column < 0] = np.nan
+    return columns
+
+
+def files_per_level(props: dict[str, np.ndarray]) -> np.ndarray:
+    """Number of files on every level, one row per level."""
+    levels = sorted(int(name[len(FILES_AT_LEVEL):]) for name in props if name.startswith(FILES_AT_LEVEL))
+    return np.array([props[f"{FILES_AT_LEVEL}{level}"] for level in levels])
+
+
+def plot_lsm(system: str, props: dict[str, np.ndarray], plot_file: Path):
+    t = props["t"]
+    fig, (ax_files, ax_disk, ax_mem) = plt.subplots(3, 1, figsize=(8, 8), sharex=True, constrained_layout=True)
+
+    files = files_per_level(props)
+    used = np.flatnonzero(np.nan_to_num(files).any(axis=1))
+    ax_files.stackplot(t, np.nan_to_num(files[used]), labels=[f"L{level}" for level in used], step="post")
+    ax_files.set_ylabel("files")
+    ax_files.legend(frameon=False, ncol=min(len(used), 4), loc="upper left")
+
+    ax_disk.plot(t, props["rocksdb.total-sst-files-size"] / BYTE_TO_GB, color="black", label="SST files")
+    ax_disk.plot(t, props["rocksdb.estimate-pending-compaction-bytes"] / BYTE_TO_GB,
+                 color="tab:red", linestyle="--", label="pending compaction")
+    ax_disk.set_ylabel("GB")
+    ax_disk.set_ylim(0)
+    ax_disk.legend(frameon=False)
+
+    ax_mem.plot(t, props["rocksdb.cur-size-all-mem-tables"] / BYTE_TO_MB, color="tab:blue", label="memtables")
+    ax_mem.plot(t, props["rocksdb.block-cache-usage"] / BYTE_TO_MB, color="tab:green", label="block cache")
+    ax_mem.set_ylabel("MB")
+    ax_mem.set_xlabel("time (s)")
+    ax_mem.set_ylim(0)
+
+    # Samples with delayed or stopped writes.
+    stalled = (np.nan_to_num(props["rocksdb.actual-delayed-write-rate"]) > 0) | (
+        np.nan_to_num(props["rocksdb.is-write-stopped"]) > 0
+    )
+    ax_stall = ax_mem.twinx()
+    ax_stall.fill_between(t, 0, stalled, step="post", color="tab:orange", alpha=0.3, label="write stall")
+    ax_stall.set_ylim(0, 1)
+    ax_stall.set_yticks([])
+
+    handles, labels = ax_mem.get_legend_handles_labels()
+    stall_handles, stall_labels = ax_stall.get_legend_handles_labels()
+    ax_mem.legend(handles + stall_handles, labels + stall_labels, frameon=False, ncol=3)
+
+    fig.suptitle(system)
+    fig.savefig(plot_file, bbox_inches="tight", pad_inches=0.03)
+    plt.close(fig)
+    print(f"Saved: {plot_file}")
+
+
+def main():
+    for system in ["tectonic", "ycsb"]:
+        path = BASE_DIR / f"properties.{system}.{RUN}.csv"
+        if not path.exists():
+            raise RuntimeError(f"No property samples for system '{system}' run {RUN}")
+        plot_lsm("Tectonic" if system == "tectonic" else "YCSB", load_properties(path), PLOTS_DIR / f"lsm_{system}.pdf")
+
+
+if __name__ == "__main__":
+    main()
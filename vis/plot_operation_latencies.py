@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import json
 from pathlib import Path
 
 import matplotlib
@@ -7,16 +6,22 @@ import matplotlib.pyplot as plt
 import matplotlib.font_manager as font_manager
 import numpy as np
 
+from latency_histogram import LatencyHistogram, load_latency_file
+
 # Use non-interactive backend
 matplotlib.use("Agg")
 
 TAG = "100x"
+PHASE = None  # trace phase to plot, e.g. "load" or "run", None for the whole run
 
 # Constants
 BASE_DIR = Path(f"../experiments/workload-similarity/{TAG}")
 OUTPUT_DIR = Path("../plots")
 OUTPUT_DIR.mkdir(exist_ok=True)
 CONVERT_TO_MS = 1000.0  # nanoseconds → microseconds
+WHIS = (0, 99)
+TAIL_PERCENTILES = [50, 99, 99.9, 99.99]
+SUFFIX = "" if PHASE is None else f"_{PHASE}"
 
 # Font setup
 FONT_PATH = "../LinLibertine_Mah.ttf"
@@ -26,19 +31,25 @@ plt.rcParams["text.usetex"] = True
 plt.rcParams["font.size"] = 20
 
 
-def load_op_latency(system: str):
-    ops = {"insert": [], "pointquery": [], "update": []}
+def load_op_latency(system: str) -> dict[str, LatencyHistogram]:
+    ops = {}
     for i in range(1, 6):
         path = BASE_DIR / f"op-latency.{system}.{i}.json"
         if not path.exists():
             continue
-        with path.open() as f:
-            arr = json.load(f)
-        for d in arr:
-            op = str(d.get("operation", "")).lower().replace(" ", "")
-            if op in ops:
-                ops[op].append(float(d["latency"]))
-    return {k: np.array(v, dtype=float) for k, v in ops.items() if len(v) > 0}
+        for op, hist in load_latency_file(path, PHASE).items():
+            op = op.lower().replace(" ", "")
+            ops[op] = ops[op] + hist if op in ops else hist
+    return {k: v for k, v in ops.items() if v.count > 0}
+
+
+def print_tail_latencies(system: str, data: dict[str, LatencyHistogram]):
+    for op, hist in data.items():
+        p50, p99, p999, p9999 = hist.percentile(TAIL_PERCENTILES) / CONVERT_TO_MS
+        print(
+            f"{system:>8} {op:>10}: p50 {p50:.1f} p99 {p99:.1f} p99.9 {p999:.1f} "
+            f"p99.99 {p9999:.1f} max {hist.max / CONVERT_TO_MS:.1f} (us, {hist.count} ops)"
+        )
 
 
 def plot_latency_boxplot():
@@ -48,10 +59,12 @@ def plot_latency_boxplot():
     operations = [op for op in ["insert", "pointquery", "update"] if op in ycsb_data]
     if not operations:
         raise RuntimeError("No op-latency data found for YCSB.")
+    print_tail_latencies("YCSB", ycsb_data)
+    print_tail_latencies("Tectonic", tectonic_data)
 
-    ycsb_X = [ycsb_data[op] / CONVERT_TO_MS for op in operations]
+    ycsb_X = [ycsb_data[op].box_stats(WHIS, CONVERT_TO_MS) for op in operations]
     tectonic_X = [
-        tectonic_data[op] / CONVERT_TO_MS for op in operations if op in tectonic_data
+        tectonic_data[op].box_stats(WHIS, CONVERT_TO_MS) for op in operations if op in tectonic_data
     ]
 
     labels = [op if op != "pointquery" else "point\nquery" for op in operations]
@@ -61,13 +74,12 @@ def plot_latency_boxplot():
     width = 0.4
 
     # YCSB boxplots
-    bp_ycsb = ax.boxplot(
+    bp_ycsb = ax.bxp(
         ycsb_X,
         positions=positions - width / 2,
         widths=0.25,
         patch_artist=True,
         showfliers=False,
-        whis=[0, 99],
     )
     for patch in bp_ycsb["boxes"]:
         patch.set_facecolor("white")
@@ -78,13 +90,12 @@ def plot_latency_boxplot():
             item.set_color("black")
 
     # Tectonic boxplots
-    bp_tec = ax.boxplot(
+    bp_tec = ax.bxp(
         tectonic_X,
         positions=positions + width / 2,
         widths=0.25,
         patch_artist=True,
         showfliers=False,
-        whis=[0, 99],
     )
     for patch in bp_tec["boxes"]:
         patch.set_facecolor("tab:red")
@@ -102,7 +113,7 @@ def plot_latency_boxplot():
     # ax.set_ylim(0)
 
     # Save main plot
-    output_file = OUTPUT_DIR / "op_latency_box.pdf"
+    output_file = OUTPUT_DIR / f"op_latency_box{SUFFIX}.pdf"
     fig.savefig(output_file, bbox_inches="tight", pad_inches=0.03)
     print(f"Saved: {output_file}")
 
@@ -1,17 +1,20 @@
 #!/usr/bin/env python3
-import json
-import re
 from pathlib import Path
+from typing import Callable
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as font_manager
+from aggregate import Summary, drop_warm_up_and_not_comparable, outliers, run_index, summarize
+from rocksdb_stats import Table, load_runs
 from style import bar_styles
 
 # Use non-interactive backend
 matplotlib.use("Agg")
 
 TAG = "100x"
+PHASE = None  # trace phase to plot, e.g. "load" or "run", None for the whole run
+WARM_UP_RUNS = 0  # leading runs of every system left out, each run starts from an empty DB or the same checkpoint
 
 # Constants
 BASE_DIR = Path(f"../experiments/workload-similarity/{TAG}")
@@ -19,6 +22,10 @@ PLOTS_DIR = Path("../plots")
 PLOTS_DIR.mkdir(exist_ok=True)
 CONVERT_TO_TIB = 1024**4  # bytes → TiB
 CONVERT_TO_MILLION = 1_000_000
+SUFFIX = "" if PHASE is None else f"_{PHASE}"
+BYTES_READ = ["rocksdb.bytes.read", "rocksdb.compact.read.bytes"]
+BYTES_WRITTEN = ["rocksdb.wal.bytes", "rocksdb.flush.write.bytes", "rocksdb.compact.write.bytes"]
+ERROR_BAR_STYLE = {"ecolor": "black", "elinewidth": 1, "capsize": 3}
 
 # Font setup
 FONT_PATH = "../LinLibertine_Mah.ttf"
@@ -27,127 +34,107 @@ plt.rcParams["font.family"] = prop.get_name()
 plt.rcParams["text.usetex"] = True
 plt.rcParams["font.size"] = 20
 
-COUNT_LINE = re.compile(r"^(rocksdb\.[A-Za-z0-9\.\-_]+)\s+COUNT\s*:\s*([0-9]+)\s*$")
-COUNT_IN_METRIC = re.compile(
-    r"^(rocksdb\.[A-Za-z0-9\.\-_]+)\s+.*?\bCOUNT\s*:\s*([0-9]+)\b"
-)
-
-
-def parse_stats_file(path: Path) -> dict:
-    metrics = {}
-    with open(path, "r", errors="ignore") as f:
-        for line in f:
-            line = line.strip()
-            m = COUNT_LINE.match(line)
-            if m:
-                metrics[m.group(1)] = int(m.group(2))
-                continue
-            m2 = COUNT_IN_METRIC.match(line)
-            if m2:
-                metrics[m2.group(1)] = int(m2.group(2))
-    return metrics
-
-
-def avg_metrics(system: str) -> dict:
-    files = sorted(BASE_DIR.glob(f"stats.{system}.*.json"))
+
+def load_tickers(system: str) -> Table:
+    """Tickers of every run of `system` after the warm-up, one row per run."""
+    files = sorted(BASE_DIR.glob(f"stats.{system}.*.json"), key=run_index)
     if not files:
         raise RuntimeError(f"No stats files for system '{system}'")
-    acc = {}
-    count = 0
-    for f in files:
-        metrics = parse_stats_file(f)
-        if not metrics:
-            continue
-        count += 1
-        for k, v in metrics.items():
-            acc[k] = acc.get(k, 0) + v
-    if count == 0:
+    runs = load_runs(drop_warm_up_and_not_comparable(files, WARM_UP_RUNS, system), PHASE)
+    if not runs.tickers.runs:
         raise RuntimeError(f"No parsable stats for system '{system}'")
-    return {k: v / count for k, v in acc.items()}
-
-
-def plot_read_write(m_y, m_t):
-    bytes_read = m_y.get("rocksdb.bytes.read", 0) + m_y.get(
-        "rocksdb.compact.read.bytes", 0
-    )
-    bytes_written = (
-        m_y.get("rocksdb.wal.bytes", 0)
-        + m_y.get("rocksdb.flush.write.bytes", 0)
-        + m_y.get("rocksdb.compact.write.bytes", 0)
-    )
-    ycsb_vals = np.array([bytes_read, bytes_written]) / CONVERT_TO_TIB
-
-    bytes_read_t = m_t.get("rocksdb.bytes.read", 0) + m_t.get(
-        "rocksdb.compact.read.bytes", 0
-    )
-    bytes_written_t = (
-        m_t.get("rocksdb.wal.bytes", 0)
-        + m_t.get("rocksdb.flush.write.bytes", 0)
-        + m_t.get("rocksdb.compact.write.bytes", 0)
-    )
-    tectonic_vals = np.array([bytes_read_t, bytes_written_t]) / CONVERT_TO_TIB
-
-    categories = ["read", "write"]
+    return runs.tickers
+
+
+def total(tickers: Table, names: list[str]) -> np.ndarray:
+    """Sum of the tickers `names` of every run, a ticker a run lacks counts as 0."""
+    return np.sum([np.nan_to_num(tickers[name]) for name in names], axis=0)
+
+
+def summarize_runs(system: str, tickers: Table, metrics: dict[str, np.ndarray]) -> list[Summary]:
+    """Summaries of the per run `metrics`, printed along with runs that stand out."""
+    summaries = []
+    for name, values in metrics.items():
+        summary = summarize(values)
+        print(f"{system:>8} {name}: {summary}")
+        for run in np.flatnonzero(outliers(values)):
+            print(f"{system:>8} {name}: outlier {tickers.runs[run]} ({values[run]:.4g})")
+        summaries.append(summary)
+    return summaries
+
+
+def plot_bars(
+    categories: list[str],
+    s_y: list[Summary],
+    s_t: list[Summary],
+    ylabel: str,
+    tick_label: Callable[[float], str],
+    plot_file: Path,
+):
+    """YCSB and Tectonic side by side per category, the whiskers are the confidence interval of the mean."""
     x = np.arange(len(categories))
     width = 0.35
 
     fig, ax = plt.subplots(figsize=(2.5, 3.5), dpi=150)
-    ax.bar(x - width / 2, ycsb_vals, width, **bar_styles["YCSB"])
-    ax.bar(x + width / 2, tectonic_vals, width, **bar_styles["Tectonic"])
+    for offset, summaries, style in [(-width / 2, s_y, bar_styles["YCSB"]), (width / 2, s_t, bar_styles["Tectonic"])]:
+        ax.bar(
+            x + offset,
+            [s.mean for s in summaries],
+            width,
+            yerr=np.array([s.yerr for s in summaries]).T,
+            error_kw=ERROR_BAR_STYLE,
+            **style,
+        )
 
     ax.set_xticks(x)
     ax.set_xticklabels(categories)
-    ax.set_ylabel("bytes (TB)")
-    ax.set_yticklabels([0] + [f"{tick}" for tick in ax.get_yticks()[1:]])
-    fig.savefig(PLOTS_DIR / "read_write.pdf", bbox_inches="tight", pad_inches=0.03)
+    ax.set_ylabel(ylabel)
+    ax.set_ylim(0)
+    ax.set_yticklabels([0] + [tick_label(tick) for tick in ax.get_yticks()[1:]])
+    fig.savefig(plot_file, bbox_inches="tight", pad_inches=0.03)
     plt.close(fig)
-    print(f"Saved: {PLOTS_DIR / 'read_write.pdf'}")
-
-
-def plot_block_cache(m_y, m_t):
-    ycsb_vals = (
-        np.array(
-            [
-                m_y.get("rocksdb.block.cache.hit", 0),
-                m_y.get("rocksdb.block.cache.miss", 0),
-            ]
-        )
-        / CONVERT_TO_MILLION
+    print(f"Saved: {plot_file}")
+
+
+def plot_read_write(t_y: Table, t_t: Table):
+    def metrics(tickers: Table) -> dict[str, np.ndarray]:
+        return {
+            "bytes read (TB)": total(tickers, BYTES_READ) / CONVERT_TO_TIB,
+            "bytes written (TB)": total(tickers, BYTES_WRITTEN) / CONVERT_TO_TIB,
+        }
+
+    plot_bars(
+        ["read", "write"],
+        summarize_runs("ycsb", t_y, metrics(t_y)),
+        summarize_runs("tectonic", t_t, metrics(t_t)),
+        "bytes (TB)",
+        lambda tick: f"{tick}",
+        PLOTS_DIR / f"read_write{SUFFIX}.pdf",
     )
-    tectonic_vals = (
-        np.array(
-            [
-                m_t.get("rocksdb.block.cache.hit", 0),
-                m_t.get("rocksdb.block.cache.miss", 0),
-            ]
-        )
-        / CONVERT_TO_MILLION
-    )
-
-    categories = ["cache\nhit", "cache\nmiss"]
-    x = np.arange(len(categories))
-    width = 0.35
-
-    fig, ax = plt.subplots(figsize=(2.5, 3.5), dpi=150)
-    ax.bar(x - width / 2, ycsb_vals, width, **bar_styles["YCSB"])
-    ax.bar(x + width / 2, tectonic_vals, width, **bar_styles["Tectonic"])
-
-    ax.set_xticks(x)
-    ax.set_xticklabels(categories)
-    ax.set_ylabel("count (millions)")
 
-    ax.set_yticklabels([0] + [f"{int(tick) if tick/tick > 0 else tick}" for tick in ax.get_yticks()[1:]])
 
-    fig.savefig(PLOTS_DIR / "block_cache.pdf", bbox_inches="tight", pad_inches=0.03)
-    plt.close(fig)
-    print(f"Saved: {PLOTS_DIR / 'block_cache.pdf'}")
+def plot_block_cache(t_y: Table, t_t: Table):
+    def metrics(tickers: Table) -> dict[str, np.ndarray]:
+        return {
+            "cache hits (M)": total(tickers, ["rocksdb.block.cache.hit"]) / CONVERT_TO_MILLION,
+            "cache misses (M)": total(tickers, ["rocksdb.block.cache.miss"]) / CONVERT_TO_MILLION,
+        }
+
+    plot_bars(
+        ["cache\nhit", "cache\nmiss"],
+        summarize_runs("ycsb", t_y, metrics(t_y)),
+        summarize_runs("tectonic", t_t, metrics(t_t)),
+        "count (millions)",
+        lambda tick: f"{int(tick)}",
+        PLOTS_DIR / f"block_cache{SUFFIX}.pdf",
+    )
 
 
 def main():
-    m_y = avg_metrics("ycsb")
-    m_t = avg_metrics("tectonic")
-    plot_read_write(m_y, m_t)
-    plot_block_cache(m_y, m_t)
+    t_y = load_tickers("ycsb")
+    t_t = load_tickers("tectonic")
+    plot_read_write(t_y, t_t)
+    plot_block_cache(t_y, t_t)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+from pathlib import Path
+
+import matplotlib
+import matplotlib.pyplot as plt
+import matplotlib.font_manager as font_manager
+import numpy as np
+
+from style import line_styles
+from timeseries import iostat_times, load_iostat, load_timeline, lttb
+
+# Use non-interactive backend
+matplotlib.use("Agg")
+
+TAG = "100x"
+RUN = 2
+
+# Constants
+BASE_DIR = Path(f"../experiments/workload-similarity/{TAG}")
+PLOTS_DIR = Path("../plots")
+PLOTS_DIR.mkdir(exist_ok=True)
+CONVERT_TO_US = 1000.0  # nanoseconds → microseconds
+BYTE_TO_GB = 1024 * 1024 * 1024
+# Samples drawn per iostat line at most, thinned out with LTTB.
+MAX_POINTS = 2000
+
+# Font setup
+FONT_PATH = "../LinLibertine_Mah.ttf"
+prop = font_manager.FontProperties(fname=FONT_PATH)
+plt.rcParams["font.family"] = prop.get_name()
+plt.rcParams["text.usetex"] = True
+plt.rcParams["font.size"] = 16
+
+
+def phase_starts(timeline: dict) -> np.ndarray:
+    """Whether every interval is the first of its phase."""
+    phase = timeline["phase"]
+    return np.r_[True, phase[1:] != phase[:-1]]
+
+
+def ticker_rate(timeline: dict, name: str) -> np.ndarray:
+    """Per second increase of a ticker in every interval, tickers restart from zero with every phase."""
+    counts = timeline["tickers"][name]
+    previous = np.where(phase_starts(timeline), 0.0, np.roll(counts, 1))
+    return (counts - previous) / timeline["interval"]
+
+
+def plot_timeline(system: str, timeline: dict, iostat_path: Path | None, plot_file: Path):
+    t = timeline["t"]
+    fig, (ax_ops, ax_lat, ax_io) = plt.subplots(3, 1, figsize=(8, 8), sharex=True, constrained_layout=True)
+
+    for op, values in timeline["ops"].items():
+        if not values["count"].any():
+            continue
+        line, = ax_ops.plot(t, values["count"] / timeline["interval"], label=op)
+        busy = values["count"] > 0
+        ax_lat.plot(t[busy], values["p99"][busy] / CONVERT_TO_US, color=line.get_color(), label=f"{op} p99")
+    ax_ops.set_ylabel("ops/s")
+    ax_ops.legend(frameon=False, ncol=3)
+    ax_lat.set_ylabel("latency ($\\mu$s)")
+    ax_lat.set_yscale("log")
+
+    style = line_styles[system]
+    if iostat_path is not None and iostat_path.exists():
+        reads, writes = load_iostat(iostat_path)
+        x = iostat_times(iostat_path, timeline)
+        ax_io.plot(*lttb(x, reads, MAX_POINTS), **{**style, "linestyle": "-", "label": "read (iostat)"})
+        ax_io.plot(*lttb(x, writes, MAX_POINTS), **{**style, "linestyle": "--", "label": "write (iostat)"})
+    ax_io.plot(t, ticker_rate(timeline, "rocksdb.compact.write.bytes") / BYTE_TO_GB,
+               color="black", linestyle=":", label="compaction write")
+    ax_io.set_ylabel("GB/s")
+    ax_io.set_xlabel("time (s)")
+    ax_io.set_ylim(0)
+
+    # Share of each interval spent in write stalls.
+    stall = ticker_rate(timeline, "rocksdb.stall.micros") / 1e6
+    ax_stall = ax_io.twinx()
+    ax_stall.fill_between(t, 0, stall, step="pre", color="tab:orange", alpha=0.3, label="write stall")
+    ax_stall.set_ylim(0, 1)
+    ax_stall.set_ylabel("stalled")
+
+    handles, labels = ax_io.get_legend_handles_labels()
+    stall_handles, stall_labels = ax_stall.get_legend_handles_labels()
+    ax_io.legend(handles + stall_handles, labels + stall_labels, frameon=False, ncol=2)
+
+    for i in np.flatnonzero(phase_starts(timeline))[1:]:
+        for ax in (ax_ops, ax_lat, ax_io):
+            ax.axvline(t[i - 1], color="grey", linestyle="--", linewidth=0.8)
+        ax_ops.annotate(timeline["phase"][i], (t[i - 1], 1), xycoords=("data", "axes fraction"),
+                        xytext=(3, -3), textcoords="offset points", va="top", fontsize=10)
+
+    fig.suptitle(system)
+    fig.savefig(plot_file, bbox_inches="tight", pad_inches=0.03)
+    plt.close(fig)
+    print(f"Saved: {plot_file}")
+
+
+def main():
+    for system in ["tectonic", "ycsb"]:
+        path = BASE_DIR / f"timeline.{system}.{RUN}.jsonl"
+        if not path.exists():
+            raise RuntimeError(f"No timeline for system '{system}' run {RUN}")
+        plot_timeline(
+            "Tectonic" if system == "tectonic" else "YCSB",
+            load_timeline(path),
+            BASE_DIR / f"iostat.{system}.{RUN}.json",
+            PLOTS_DIR / f"timeline_{system}.pdf",
+        )
+
+
+if __name__ == "__main__":
+    main()
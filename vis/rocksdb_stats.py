@@ -0,0 +1,171 @@
+"""
+Parser for the stats files the harness writes under STATS.
+
+A stats file has three sections, each a header followed by RocksDB's
+`ToString()` output:
+
+    [rocksdb::get_perf_context]     name = value, ... (value@levelN per level)
+    [rocksdb::get_iostats_context]  name = value, ...
+    [options.statistics]            rocksdb.<ticker> COUNT : n
+                                    rocksdb.<histogram> P50 : x P95 : x ... SUM : x
+
+With `--threads`, the two context sections appear once per replay thread.
+When the trace has phase markers, every phase gets its own three sections
+after a `[phase <name>]` line.
+`parse_stats_file` reads one file (or one phase of it) into a `StatsFile`,
+`load_runs` stacks many into `RunTables` with one row per run.
+"""
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+PERF_CONTEXT = "rocksdb::get_perf_context"
+IOSTATS_CONTEXT = "rocksdb::get_iostats_context"
+STATISTICS = "options.statistics"
+
+HISTOGRAM_FIELDS = ["P50", "P95", "P99", "P100", "COUNT", "SUM"]
+
+PHASE = re.compile(r"^\[phase (.*)\]$")
+SECTION = re.compile(r"^\[(.+)\]$")
+STATISTIC = re.compile(r"^(rocksdb\.[A-Za-z0-9\.\-_]+)\s+(.*)$")
+STATISTIC_FIELD = re.compile(r"\b([A-Z0-9]+)\s*:\s*([0-9.eE+\-]+)")
+CONTEXT_FIELD = re.compile(r"\b(\w+) = ([0-9]+(?:@level[0-9]+(?:, [0-9]+@level[0-9]+)*)?)")
+LEVEL_VALUE = re.compile(r"([0-9]+)@level([0-9]+)")
+
+
+@dataclass
+class StatsFile:
+    """
+    One stats file. Per level context counters are named `name@levelN`. The
+    COUNT of a histogram is also a ticker, as the plots have always read it.
+    """
+
+    tickers: dict[str, int] = field(default_factory=dict)
+    histograms: dict[str, dict[str, float]] = field(default_factory=dict)
+    perf_context: dict[str, int] = field(default_factory=dict)
+    iostats_context: dict[str, int] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.tickers or self.histograms or self.perf_context or self.iostats_context)
+
+
+def parse_context(line: str, out: dict[str, int]):
+    """Add the counters of a context line to `out`, a section per replay thread is summed."""
+    for name, value in CONTEXT_FIELD.findall(line):
+        if name == "thread_pool_id":
+            continue
+        if "@" not in value:
+            out[name] = out.get(name, 0) + int(value)
+            continue
+        for count, level in LEVEL_VALUE.findall(value):
+            key = f"{name}@level{level}"
+            out[key] = out.get(key, 0) + int(count)
+
+
+def parse_stats_phases(path: Path) -> dict[str, StatsFile]:
+    """
+    Every phase of a stats file by name, a file without phases is the single
+    phase "". Counters of a phase name that occurs more than once are summed.
+    """
+    phases = {"": StatsFile()}
+    stats = phases[""]
+    section = None
+    with open(path, "r", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if m := PHASE.match(line):
+                stats = phases.setdefault(m.group(1), StatsFile())
+                section = None
+            elif m := SECTION.match(line):
+                section = m.group(1)
+            elif section == PERF_CONTEXT:
+                parse_context(line, stats.perf_context)
+            elif section == IOSTATS_CONTEXT:
+                parse_context(line, stats.iostats_context)
+            elif m := STATISTIC.match(line):
+                fields = {k: float(v) for k, v in STATISTIC_FIELD.findall(m.group(2))}
+                if "COUNT" in fields:
+                    stats.tickers[m.group(1)] = stats.tickers.get(m.group(1), 0) + int(fields["COUNT"])
+                if fields.keys() - {"COUNT"}:
+                    stats.histograms[m.group(1)] = fields
+    return {name: stats for name, stats in phases.items() if name or stats}
+
+
+def combine(phases: list[StatsFile]) -> StatsFile:
+    """Counters summed over `phases`. Histogram percentiles don't add up, they are only kept for a single phase."""
+    if len(phases) == 1:
+        return phases[0]
+    total = StatsFile()
+    for stats in phases:
+        for ours, theirs in [
+            (total.tickers, stats.tickers),
+            (total.perf_context, stats.perf_context),
+            (total.iostats_context, stats.iostats_context),
+        ]:
+            for name, value in theirs.items():
+                ours[name] = ours.get(name, 0) + value
+    return total
+
+
+def parse_stats_file(path: Path, phase: str | None = None) -> StatsFile:
+    """One phase of a stats file, or the whole run (see `combine`) if `phase` is None."""
+    phases = parse_stats_phases(path)
+    if phase is not None:
+        return phases.get(phase, StatsFile())
+    return combine(list(phases.values())) if phases else StatsFile()
+
+
+@dataclass
+class Table:
+    """Values of many runs: one row per run, one column per name, NaN where a run lacks a name."""
+
+    runs: list[str]
+    names: list[str]
+    values: np.ndarray
+
+    @classmethod
+    def from_dicts(cls, runs: list[str], rows: list[dict[str, float]]) -> "Table":
+        names = sorted(set().union(*rows)) if rows else []
+        column = {name: i for i, name in enumerate(names)}
+        values = np.full((len(rows), len(names)), np.nan)
+        for i, row in enumerate(rows):
+            values[i, [column[name] for name in row]] = list(row.values())
+        return cls(runs, names, values)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Column `name`, all NaN if no run has it."""
+        if name not in self.names:
+            return np.full(len(self.runs), np.nan)
+        return self.values[:, self.names.index(name)]
+
+    def mean(self) -> dict[str, float]:
+        """Mean of every column over the runs that have it."""
+        return dict(zip(self.names, np.nanmean(self.values, axis=0).tolist()))
+
+
+@dataclass
+class RunTables:
+    """Many stats files; `histograms` holds one table per field in HISTOGRAM_FIELDS."""
+
+    tickers: Table
+    histograms: dict[str, Table]
+    perf_context: Table
+    iostats_context: Table
+
+
+def load_runs(paths: list[Path], phase: str | None = None) -> RunTables:
+    """Parse `paths` (only `phase`, if given) into tables, skipping files without any stats."""
+    parsed = [(str(path), stats) for path in paths if (stats := parse_stats_file(path, phase))]
+    runs = [path for path, _ in parsed]
+    files = [stats for _, stats in parsed]
+    return RunTables(
+        tickers=Table.from_dicts(runs, [s.tickers for s in files]),
+        histograms={
+            f: Table.from_dicts(runs, [{name: h[f] for name, h in s.histograms.items() if f in h} for s in files])
+            for f in HISTOGRAM_FIELDS
+        },
+        perf_context=Table.from_dicts(runs, [s.perf_context for s in files]),
+        iostats_context=Table.from_dicts(runs, [s.iostats_context for s in files]),
+    )
@@ -0,0 +1,85 @@
+"""
+Distances between the per-operation index distributions of two traces.
+
+Distributions are compared as histograms of the normalized, frequency sorted
+ranks `calc_indices` builds in graph.py: bin j holds the share of requests
+that went to the keys with ranks in [j / bins, (j + 1) / bins). Every metric
+takes histograms of shape (..., bins) and reduces the last axis, so a
+(candidates, bins) array is ranked against one target in a single call.
+
+Keys of YCSB and Tectonic traces have nothing in common, so hot keys are
+compared by where they were inserted instead: `top_k_overlap` takes
+histograms of the normalized insertion indices of the requests, see
+`index_histogram`.
+"""
+import numpy as np
+
+BINS = 1000
+
+
+def rank_histogram(freq, bins: int = BINS) -> np.ndarray:
+    """Normalized histogram of `calc_indices` for the key frequencies `freq`."""
+    freq = np.sort(np.asarray(freq, dtype=np.float64))[::-1]
+    bin_of_rank = np.arange(len(freq)) * bins // max(len(freq), 1)
+    hist = np.bincount(bin_of_rank, weights=freq, minlength=bins)
+    return hist / hist.sum()
+
+
+def histograms(op_stats, bins: int = BINS) -> dict[str, np.ndarray]:
+    """`rank_histogram` of every operation in the `op_stats` of `count_workload`."""
+    return {op: rank_histogram(list(counter.values()), bins) for op, counter, _ in op_stats}
+
+
+def ks(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Kolmogorov-Smirnov statistic, the largest difference of the CDFs."""
+    return np.abs(np.cumsum(p, axis=-1) - np.cumsum(q, axis=-1)).max(axis=-1)
+
+
+def wasserstein(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Earth mover's distance on [0, 1], the area between the CDFs."""
+    return np.abs(np.cumsum(p, axis=-1) - np.cumsum(q, axis=-1)).sum(axis=-1) / np.shape(p)[-1]
+
+
+def js_divergence(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Jensen-Shannon divergence in bits, 0 for equal and 1 for disjoint histograms."""
+    p, q = np.broadcast_arrays(np.asarray(p, dtype=np.float64), np.asarray(q, dtype=np.float64))
+    m = (p + q) / 2
+
+    def kl(a):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            terms = np.where(a > 0, a * np.log2(a / m), 0.0)
+        return terms.sum(axis=-1)
+
+    return (kl(p) + kl(q)) / 2
+
+
+def index_histogram(idx, bins: int = BINS) -> np.ndarray:
+    """Normalized histogram of the normalized insertion indices `idx` of the requests."""
+    hist = np.histogram(idx, bins=bins, range=(0.0, 1.0))[0].astype(np.float64)
+    return hist / max(hist.sum(), 1.0)
+
+
+def top_k(hist: np.ndarray, k: int) -> np.ndarray:
+    """Mask of the k bins with the most requests, ties broken arbitrarily."""
+    hottest = np.argpartition(-hist, k - 1, axis=-1)[..., :k]
+    mask = np.zeros(np.shape(hist), dtype=bool)
+    np.put_along_axis(mask, hottest, True, axis=-1)
+    return mask
+
+
+def top_k_overlap(p: np.ndarray, q: np.ndarray, k: int = 100) -> np.ndarray:
+    """
+    Fraction of the k hottest bins of two `index_histogram`s that are the
+    same, 1 if both traces request the keys inserted at the same positions
+    the most.
+    """
+    return (top_k(p, k) & top_k(q, k)).sum(axis=-1) / k
+
+
+def distances(p: np.ndarray, q: np.ndarray) -> dict[str, np.ndarray]:
+    """Every histogram metric of `p` against `q`."""
+    return {
+        "ks": ks(p, q),
+        "wasserstein": wasserstein(p, q),
+        "js": js_divergence(p, q),
+    }
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Search the Beta(α, β) selection that makes Tectonic's requests look like a
+target trace, without generating a trace per candidate.
+
+Tectonic picks the key of a point query or update as Beta(α, β) scaled to
+the keys inserted so far, and the spec inserts every key first. So each
+candidate is simulated by drawing the target's number of requests per
+operation over its number of keys, and scored with a similarity metric
+against the target's rank histograms (see similarity.py). Large traces are
+simulated at a reduced scale that keeps the requests per key ratio, which is
+what shapes the tail of the rank distribution.
+"""
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from similarity import BINS, distances, rank_histogram
+from sweep import YCSB_TRACE, frequencies, spec_from_alpha_beta
+from workload import count_workload
+
+MAX_SAMPLES = 500_000
+# Coarse log-spaced grid, then ZOOM_ROUNDS finer grids around the best point.
+GRID = np.geomspace(0.02, 5.0, 16)
+ZOOM_ROUNDS = 3
+ZOOM_POINTS = 7
+
+
+@dataclass
+class SearchTarget:
+    """What a candidate has to reproduce: key count, requests and rank histogram per operation."""
+
+    n_keys: int
+    n_requests: dict[str, int]
+    hist: dict[str, np.ndarray]
+
+    @classmethod
+    def from_trace(cls, filename: str, bins: int = BINS) -> "SearchTarget":
+        key_to_idx, op_stats = count_workload(filename, vectorized=True, cache=True)
+        freq = frequencies(op_stats)
+        return cls(
+            n_keys=len(key_to_idx),
+            n_requests={op: int(f.sum()) for op, f in freq.items()},
+            hist={op: rank_histogram(f, bins) for op, f in freq.items()},
+        )
+
+
+def simulate(alpha: float, beta: float, n_keys: int, n_requests: int, rng: np.random.Generator) -> np.ndarray:
+    """Key frequencies of `n_requests` Beta(alpha, beta) selections, keys never requested left out."""
+    idx = np.minimum((rng.beta(alpha, beta, n_requests) * n_keys).astype(np.int64), n_keys - 1)
+    freq = np.bincount(idx, minlength=n_keys)
+    return freq[freq > 0]
+
+
+def score(
+    alpha: float,
+    beta: float,
+    target: SearchTarget,
+    metric: str = "wasserstein",
+    max_samples: int = MAX_SAMPLES,
+    seed: int = 0,
+) -> float:
+    """Mean `metric` distance of a simulated Beta(alpha, beta) spec to `target` over its operations."""
+    total = sum(target.n_requests.values())
+    scale = min(1.0, max_samples / total)
+    n_keys = max(1, round(target.n_keys * scale))
+    # The same seed for every candidate, so differences come from α/β, not sampling noise.
+    rng = np.random.default_rng(seed)
+    dist = []
+    for op, n in target.n_requests.items():
+        hist = target.hist[op]
+        freq = simulate(alpha, beta, n_keys, max(1, round(n * scale)), rng)
+        dist.append(distances(rank_histogram(freq, len(hist)), hist)[metric])
+    return float(np.mean(dist))
+
+
+def search(
+    target: SearchTarget,
+    metric: str = "wasserstein",
+    max_samples: int = MAX_SAMPLES,
+    seed: int = 0,
+) -> tuple[float, float, float]:
+    """Best `(alpha, beta, distance)` of a log grid search refined by zooming in on the best point."""
+    alphas = betas = GRID
+    best = (np.nan, np.nan, np.inf)
+    span = np.log(GRID[1] / GRID[0])
+    for round_ in range(ZOOM_ROUNDS + 1):
+        for alpha in alphas:
+            for beta in betas:
+                d = score(alpha, beta, target, metric, max_samples, seed)
+                if d < best[2]:
+                    best = (float(alpha), float(beta), d)
+        print(f"round {round_}: alpha={best[0]:.4g} beta={best[1]:.4g} {metric}={best[2]:.4g}")
+        offsets = np.exp(np.linspace(-span, span, ZOOM_POINTS))
+        alphas, betas = best[0] * offsets, best[1] * offsets
+        span /= (ZOOM_POINTS - 1) / 2
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the Beta selection of a Tectonic spec to a target trace.")
+    parser.add_argument("target", type=Path, nargs="?", default=YCSB_TRACE, help="trace to imitate")
+    parser.add_argument("-o", "--output", type=Path, default=Path("fitted.spec.json"), help="spec to write")
+    parser.add_argument("--metric", choices=["ks", "wasserstein", "js"], default="wasserstein")
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES, help="requests simulated per candidate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    target = SearchTarget.from_trace(str(args.target))
+    alpha, beta, _ = search(target, args.metric, args.max_samples, args.seed)
+    spec = spec_from_alpha_beta(alpha, beta, out_dir=args.output.resolve().parent)
+    args.output.write_text(json.dumps(spec, indent=2))
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
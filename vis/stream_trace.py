@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Pipe a trace from its generator straight into the harness, which reads the
+workload `-` from stdin (see src/trace.h), so the trace never lands on disk.
+With `--profile` the same stream is profiled on the way (see
+`workload.profile_lines`) and the profile saved as .npz, load it back with
+`profile_from_arrays(np.load(path))`:
+
+    python3 vis/stream_trace.py --profile tec-profile.npz \\
+        --generator "vendor/tectonic/target/release/tectonic-cli generate -w spec.json -o /dev/stdout" \\
+        -- cmake-build-release/rocksdb-benchmark-harness rocksdb-options.ini -
+
+The generator's output is copied in chunks of up to CHUNK_SIZE. A pipe
+blocks its writer while the reader is behind, so the slower of generator
+and harness sets the pace. The profiler runs in its own process, so it
+doesn't compete with the copy for the GIL, and gets the chunks through a
+queue of QUEUE_CHUNKS. It never holds up the harness it measures: when it
+falls that far behind, profiling is given up. The exit status is that of
+the harness, or NO_PROFILE when the harness succeeded but no profile was
+saved. Profile the trace offline with `count_workload` where the profiler
+can't keep up. Phases of a Tectonic stream are given to the harness with
+`--phases` (mark_phases.py).
+"""
+import argparse
+import multiprocessing
+import queue
+import shlex
+import subprocess
+import sys
+from multiprocessing.queues import Queue
+from multiprocessing.synchronize import Event
+from pathlib import Path
+
+import numpy as np
+
+from workload import profile_lines, profile_to_arrays, report, split_lines
+
+CHUNK_SIZE = 1024 * 1024
+QUEUE_CHUNKS = 64
+# Exit status of a successful run whose profile was not saved.
+NO_PROFILE = 3
+
+
+class GivenUp(Exception):
+    pass
+
+
+def profile_chunks(chunks: Queue, path: Path, give_up: Event):
+    """
+    Profiles the chunks put in `chunks` up to a None and saves the profile
+    to `path`, unless `give_up` is set first. Runs in the profiler process.
+    """
+
+    def take():
+        while (chunk := chunks.get()) is not None:
+            if give_up.is_set():
+                raise GivenUp
+            yield chunk
+
+    try:
+        profiled, summary = profile_lines(split_lines(take()))
+    except GivenUp:
+        return
+    report(summary)
+    with open(path, "wb") as f:
+        np.savez(f, **profile_to_arrays(profiled, summary))
+
+
+def end_profile(chunks: Queue, profiler: multiprocessing.Process):
+    """Puts the final None without blocking on a profiler that died with a full queue."""
+    while profiler.is_alive():
+        try:
+            chunks.put(None, timeout=0.1)
+            break
+        except queue.Full:
+            pass
+    profiler.join()
+    # Chunks a given up profiler never took are dropped instead of waited for at exit.
+    chunks.cancel_join_thread()
+
+
+def stream(generator: list[str], harness: list[str], profile: Path | None = None) -> int:
+    """
+    Runs `generator` into the stdin of `harness` and returns the exit status
+    of the harness, or of the generator when only that one failed, or
+    NO_PROFILE when both succeeded but no profile was saved.
+    """
+    chunks = None
+    profiler = None
+    give_up = multiprocessing.Event()
+    if profile is not None:
+        # Written under a temporary name, the profile is only kept when the run succeeded.
+        partial = profile.with_name(f"{profile.name}.tmp")
+        chunks = multiprocessing.Queue(QUEUE_CHUNKS)
+        # Started before the pipes exist, so the profiler holds no end of them.
+        profiler = multiprocessing.Process(target=profile_chunks, args=(chunks, partial, give_up))
+        profiler.start()
+
+    gen = subprocess.Popen(generator, stdout=subprocess.PIPE)
+    consumer = subprocess.Popen(harness, stdin=subprocess.PIPE)
+
+    try:
+        while chunk := gen.stdout.read1(CHUNK_SIZE):
+            consumer.stdin.write(chunk)
+            if chunks is None or give_up.is_set():
+                continue
+            try:
+                chunks.put_nowait(chunk)
+            except queue.Full:
+                # Waiting for the profiler would throttle the harness. It
+                # stops at the next chunk it takes from the full queue.
+                reason = "fell behind the harness" if profiler.is_alive() else "failed"
+                print(f"Warning: the profiler {reason}, not profiling the rest of the trace", file=sys.stderr)
+                give_up.set()
+        consumer.stdin.close()
+    except BrokenPipeError:
+        # The harness exited early, its status says why.
+        gen.kill()
+    finally:
+        if chunks is not None:
+            end_profile(chunks, profiler)
+
+    status = consumer.wait() or gen.wait()
+    if profile is None:
+        return status
+    if status != 0:
+        partial.unlink(missing_ok=True)
+        return status
+    if give_up.is_set() or profiler.exitcode != 0 or not partial.exists():
+        partial.unlink(missing_ok=True)
+        print(f"Warning: the run succeeded, but no profile was saved to {profile}", file=sys.stderr)
+        return NO_PROFILE
+    partial.replace(profile)
+    print(f"Saved: {profile}")
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pipe a generated trace into the harness, optionally profiling it on the way."
+    )
+    parser.add_argument("--generator", required=True, help="command that writes the trace to stdout")
+    parser.add_argument("--profile", type=Path, help="save the profile of the trace to this .npz")
+    parser.add_argument("harness", nargs=argparse.REMAINDER, help="harness command reading the workload `-`")
+    args = parser.parse_args()
+
+    harness = args.harness[1:] if args.harness[:1] == ["--"] else args.harness
+    if not harness:
+        parser.error("missing harness command")
+    sys.exit(stream(shlex.split(args.generator), harness, args.profile))
+
+
+if __name__ == "__main__":
+    main()
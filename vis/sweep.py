@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+α/β sweep over the Tectonic selection distribution.
+
+Every grid point gets a `{alpha}-{beta}.spec.json` and trace in `multi/`,
+is profiled (the profile lands in the on-disk cache, see cache.py) and
+fitted, and ends up as rows of `multi/results.csv`: one per grid point and
+operation with the fitted α/β and its distances to the YCSB trace (see
+similarity.py). The histograms the notebook plots, of the ranks and of the
+insertion indices of every point, operation and of the YCSB trace, go to
+`multi/histograms.npz` (see `load_histograms`), so plotting never needs the
+traces or their profiles.
+Points whose spec did not change since their row was written are skipped.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from beta_fit import rank_stats
+from similarity import BINS, distances, rank_histogram
+from workload import count_workload
+
+PROJECT_ROOT_DIR = Path(__file__).resolve().parent.parent
+EXPERIMENT_DIR = PROJECT_ROOT_DIR / "experiments" / "workload-similarity"
+MULTI_DIR = EXPERIMENT_DIR / "multi"
+BASE_SPEC = EXPERIMENT_DIR / "workload-a.spec.json"
+YCSB_TRACE = EXPERIMENT_DIR / "ycsb-workload-a.txt"
+SCHEMA = PROJECT_ROOT_DIR / "vendor" / "tectonic" / "workload_schema.json"
+TECTONIC_CLI = PROJECT_ROOT_DIR / "vendor" / "tectonic" / "target" / "release" / "tectonic-cli"
+
+ALPHAS = [0.1, 0.15, 0.25, 0.5]
+BETAS = [0.25, 0.55, 1.0, 2.0]
+
+RESULT_FIELDS = ["alpha", "beta", "op", "fit_alpha", "fit_beta", "ks", "wasserstein", "js", "spec_hash"]
+HISTOGRAMS = "histograms.npz"
+# Name of the YCSB trace's histograms in HISTOGRAMS, grid points are named `{alpha}-{beta}`.
+TARGET = "target"
+
+
+def spec_from_alpha_beta(alpha: float, beta: float, base: Path = BASE_SPEC, out_dir: Path = MULTI_DIR) -> dict:
+    """
+    `base` with every selection distribution replaced by Beta(alpha, beta),
+    for a spec file written to `out_dir`.
+    """
+    spec = json.loads(base.read_text())
+    spec["$schema"] = os.path.relpath(SCHEMA, out_dir)
+    for section in spec["sections"]:
+        for group in section["groups"]:
+            for op in group.values():
+                if "selection" in op:
+                    op["selection"] = {"beta": {"alpha": alpha, "beta": beta}}
+    return spec
+
+
+def point_paths(alpha: float, beta: float, out_dir: Path = MULTI_DIR) -> tuple[Path, Path]:
+    stem = f"{alpha}-{beta}"
+    return out_dir / f"{stem}.spec.json", out_dir / f"{stem}.txt"
+
+
+def spec_hash(spec: dict) -> str:
+    return hashlib.blake2b(json.dumps(spec, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+def frequencies(op_stats) -> dict[str, np.ndarray]:
+    return {op: np.fromiter(counter.values(), dtype=np.int64) for op, counter, _ in op_stats}
+
+
+def op_histograms(name: str, op_stats) -> dict[str, np.ndarray]:
+    """
+    `rank_histogram` and the counts of the normalized insertion indices in
+    BINS bins of every operation, as `{name}/{op}/rank` and `{name}/{op}/index`.
+    """
+    hists = {}
+    for op, counter, idx in op_stats:
+        hists[f"{name}/{op}/rank"] = rank_histogram(np.fromiter(counter.values(), dtype=np.int64))
+        hists[f"{name}/{op}/index"] = np.histogram(idx, bins=BINS, range=(0.0, 1.0))[0]
+    return hists
+
+
+def load_histograms(path: Path) -> dict[str, dict[str, dict[str, np.ndarray]]]:
+    """HISTOGRAMS as `{name: {op: {"rank": ..., "index": ...}}}`, empty if there is none."""
+    if not path.exists():
+        return {}
+    hists = {}
+    with np.load(path) as data:
+        for key in data.files:
+            name, op, kind = key.split("/")
+            hists.setdefault(name, {}).setdefault(op, {})[kind] = data[key]
+    return hists
+
+
+def write_histograms(path: Path, hists: dict[str, np.ndarray]):
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **hists)
+    tmp.replace(path)
+
+
+def generate_trace(spec_path: Path, trace_path: Path):
+    subprocess.run(
+        [str(TECTONIC_CLI), "generate", "-w", str(spec_path), "-o", str(trace_path)],
+        check=True,
+    )
+
+
+def run_point(
+    alpha: float, beta: float, target: dict[str, np.ndarray], out_dir: Path = MULTI_DIR
+) -> tuple[list[dict], dict[str, np.ndarray]]:
+    spec = spec_from_alpha_beta(alpha, beta, out_dir=out_dir)
+    spec_path, trace_path = point_paths(alpha, beta, out_dir)
+    text = json.dumps(spec, indent=2)
+    if not spec_path.exists() or spec_path.read_text() != text:
+        spec_path.write_text(text)
+    if not trace_path.exists() or trace_path.stat().st_mtime < spec_path.stat().st_mtime:
+        generate_trace(spec_path, trace_path)
+
+    _, op_stats = count_workload(str(trace_path), vectorized=True, cache=True)
+    rows = []
+    for op, freq in frequencies(op_stats).items():
+        fit_alpha, fit_beta = rank_stats(freq).fit()
+        if op in target:
+            metrics = distances(rank_histogram(freq), target[op])
+        else:
+            metrics = dict.fromkeys(("ks", "wasserstein", "js"), np.nan)
+        rows.append({
+            "alpha": alpha,
+            "beta": beta,
+            "op": op,
+            "fit_alpha": fit_alpha,
+            "fit_beta": fit_beta,
+            "ks": float(metrics["ks"]),
+            "wasserstein": float(metrics["wasserstein"]),
+            "js": float(metrics["js"]),
+            "spec_hash": spec_hash(spec),
+        })
+    return rows, op_histograms(trace_path.stem, op_stats)
+
+
+def load_results(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return list(csv.DictReader(f))
+
+
+def write_results(path: Path, rows: list[dict]):
+    rows = sorted(rows, key=lambda r: (float(r["alpha"]), float(r["beta"]), r["op"]))
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    tmp.replace(path)
+
+
+def sweep(
+    alphas: list[float] = ALPHAS,
+    betas: list[float] = BETAS,
+    jobs: int = 4,
+    target_trace: Path = YCSB_TRACE,
+    out_dir: Path = MULTI_DIR,
+) -> list[dict]:
+    """Run every grid point that has no up to date row in `results.csv`, `jobs` at a time."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    results_path = out_dir / "results.csv"
+    histograms_path = out_dir / HISTOGRAMS
+    existing = load_results(results_path)
+    stored = load_histograms(histograms_path)
+    # Rows missing a column, or a point without histograms, were written by an older version of the sweep.
+    done = {
+        (float(r["alpha"]), float(r["beta"])): r["spec_hash"]
+        for r in existing
+        if all(r.get(field) for field in RESULT_FIELDS) and f"{r['alpha']}-{r['beta']}" in stored
+    }
+    todo = [
+        (alpha, beta)
+        for alpha in alphas
+        for beta in betas
+        if done.get((alpha, beta)) != spec_hash(spec_from_alpha_beta(alpha, beta, out_dir=out_dir))
+    ]
+    keep = [r for r in existing if (float(r["alpha"]), float(r["beta"])) not in set(todo)]
+    hists = {
+        f"{name}/{op}/{kind}": hist
+        for name, ops in stored.items()
+        if name == TARGET or any(f"{r['alpha']}-{r['beta']}" == name for r in keep)
+        for op, kinds in ops.items()
+        for kind, hist in kinds.items()
+    }
+    print(f"{len(todo)} of {len(alphas) * len(betas)} grid points to run")
+    if not todo:
+        return keep
+
+    _, target_stats = count_workload(str(target_trace), vectorized=True, cache=True)
+    target = {op: rank_histogram(freq) for op, freq in frequencies(target_stats).items()}
+    hists.update(op_histograms(TARGET, target_stats))
+
+    rows = list(keep)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_point, alpha, beta, target, out_dir): (alpha, beta) for alpha, beta in todo}
+        for future in as_completed(futures):
+            alpha, beta = futures[future]
+            point_rows, point_hists = future.result()
+            rows.extend(point_rows)
+            hists.update(point_hists)
+            # Written after every point so an interrupted sweep keeps its progress.
+            write_results(results_path, rows)
+            write_histograms(histograms_path, hists)
+            print(f"done {alpha}-{beta}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate, profile and fit the α/β grid.")
+    parser.add_argument("--alphas", type=float, nargs="+", default=ALPHAS)
+    parser.add_argument("--betas", type=float, nargs="+", default=BETAS)
+    parser.add_argument("-j", "--jobs", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--target", type=Path, default=YCSB_TRACE, help="trace to measure the distance to")
+    parser.add_argument("--out-dir", type=Path, default=MULTI_DIR)
+    args = parser.parse_args()
+
+    sweep(args.alphas, args.betas, args.jobs, args.target, args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
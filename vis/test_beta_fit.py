@@ -0,0 +1,36 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from beta_fit import BetaStats, fit_counter
+
+
+def test_fit_matches_sample():
+    x = np.random.default_rng(0).beta(0.5, 2.0, 200_000)
+    alpha, beta = BetaStats().update(x).fit()
+    assert alpha == pytest.approx(0.5, rel=0.02)
+    assert beta == pytest.approx(2.0, rel=0.02)
+
+
+def test_weights_equal_repeats():
+    x = np.array([0.1, 0.4, 0.7])
+    freq = np.array([5, 2, 1])
+    weighted = BetaStats().update(x, freq).fit()
+    repeated = BetaStats().update(np.repeat(x, freq)).fit()
+    assert weighted == pytest.approx(repeated)
+
+
+@pytest.mark.parametrize(
+    "counter",
+    [Counter(), Counter({b"user1": 0}), Counter({b"user1": 7})],
+    ids=["empty", "zero weight", "single key"],
+)
+def test_degenerate_counter_raises(counter):
+    with pytest.raises(ValueError):
+        fit_counter(counter)
+
+
+def test_constant_sample_raises():
+    with pytest.raises(ValueError):
+        BetaStats().update(np.full(1000, 0.3)).fit()
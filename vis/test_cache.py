@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+import cache
+
+
+def test_entry_survives_until_trace_changes(tmp_path):
+    trace = tmp_path / "trace.txt"
+    trace.write_text("I a v\n")
+    cache.store(str(trace), "profile", {"x": np.arange(3)})
+    np.testing.assert_array_equal(cache.load(str(trace), "profile")["x"], np.arange(3))
+
+    # Same size, other mtime.
+    st = trace.stat()
+    os.utime(trace, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.load(str(trace), "profile") is None
+
+    cache.store(str(trace), "profile", {"x": np.arange(4)})
+    # Other size, the mtime is set back.
+    st = trace.stat()
+    trace.write_text("I a v\nP a\n")
+    os.utime(trace, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert cache.load(str(trace), "profile") is None
+
+
+def test_store_replaces_stale_entry(tmp_path):
+    trace = tmp_path / "trace.txt"
+    trace.write_text("I a v\n")
+    cache.store(str(trace), "profile", {"x": np.arange(3)})
+    trace.write_text("I a w\nP a\n")
+    cache.store(str(trace), "profile", {"x": np.arange(4)})
+    assert len(list((tmp_path / cache.CACHE_DIR_NAME).glob("*.npz"))) == 1
+
+
+def test_same_name_in_other_directories(tmp_path):
+    cache_dir = tmp_path / "cache"
+    traces = []
+    for d in ["a", "b"]:
+        (tmp_path / d).mkdir()
+        trace = tmp_path / d / "trace.txt"
+        trace.write_text(f"I {d} v\n")
+        cache.store(str(trace), "profile", {"x": np.array([ord(d)])}, cache_dir)
+        traces.append(trace)
+    for d, trace in zip(["a", "b"], traces):
+        assert cache.load(str(trace), "profile", cache_dir)["x"][0] == ord(d)
+
+
+def test_evict_least_recently_used(tmp_path):
+    entries = []
+    for i in range(4):
+        entry = tmp_path / f"entry{i}.npz"
+        entry.write_bytes(b"\0" * 1000)
+        os.utime(entry, (i, i))
+        entries.append(entry)
+    # Entry 0 was used last.
+    os.utime(entries[0], (10, 10))
+
+    cache.evict(tmp_path, max_bytes=2500)
+    assert sorted(p.name for p in tmp_path.glob("*.npz")) == ["entry0.npz", "entry3.npz"]
+
+
+def test_evict_keeps_newest_entry_over_cap(tmp_path):
+    entry = tmp_path / "entry.npz"
+    entry.write_bytes(b"\0" * 1000)
+    cache.evict(tmp_path, max_bytes=10)
+    assert entry.exists()
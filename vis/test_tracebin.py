@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from tracebin import HEADER, U64, convert, decode_varints, encode_varints, read_binary, read_section
+from tracefile import MappedTrace, parse_trace
+
+
+def write_trace(path, n_ops=500, seed=0):
+    """Every op, keys seen again across blocks, a key longer than KEY_WINDOW and values past one varint byte."""
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(n_ops):
+        key = f"user{rng.integers(60):04d}" if i % 50 else "k" * 70 + str(i)
+        op = "IUMPDSR"[i % 7]
+        if op in "IUM":
+            lines.append(f"{op} {key} {'v' * int(rng.integers(1, 300))}")
+        elif op in "SR":
+            lines.append(f"{op} {key} user{rng.integers(60):04d}")
+        else:
+            lines.append(f"{op} {key}")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def bodies(filename):
+    """Concatenated kept bodies of every block of a binary trace."""
+    with open(filename, "rb") as f:
+        data = memoryview(f.read())
+    pos, kept = HEADER.size, []
+    while pos < len(data):
+        pos += U64.size
+        for i in range(6):
+            if i == 2:
+                pos += U64.size
+            section, pos = read_section(data, pos)
+        kept.append(section.tobytes())
+    return b"".join(kept)
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2**32, 2**63 - 1, 2**64 - 1], dtype=np.uint64)
+    np.testing.assert_array_equal(decode_varints(encode_varints(values)), values)
+    assert len(encode_varints(np.array([127, 128]))) == 3
+
+
+@pytest.mark.parametrize("dict_keys", [True, False], ids=["dict", "no-dict"])
+@pytest.mark.parametrize("elide_values", [True, False], ids=["elide", "keep"])
+@pytest.mark.parametrize("with_keys", [True, False], ids=["keys", "no-keys"])
+def test_round_trip(tmp_path, dict_keys, elide_values, with_keys):
+    text = write_trace(tmp_path / "trace.txt")
+    binary = tmp_path / "trace.bin"
+    # Small blocks, so keys come back in later blocks.
+    convert(str(text), str(binary), dict_keys=dict_keys, elide_values=elide_values, block_size=2048)
+
+    expected = parse_trace(str(text), with_keys=with_keys)
+    actual = parse_trace(str(binary), with_keys=with_keys)
+    for column in ["op", "key_len", "val_len"]:
+        np.testing.assert_array_equal(getattr(actual, column), getattr(expected, column), err_msg=column)
+    if with_keys:
+        assert actual.keys.tolist() == expected.keys.tolist()
+        np.testing.assert_array_equal(actual.key_hash, expected.key_hash)
+    else:
+        assert actual.keys is None and actual.key_hash is None
+
+    lines = [line.split(" ", 2) for line in text.read_text().splitlines()]
+    kept = [parts[2] for parts in lines if len(parts) == 3 and not (elide_values and parts[0] in "IUM")]
+    assert bodies(binary) == "".join(kept).encode()
+
+
+def test_read_binary_matches_block_wise(tmp_path):
+    text = write_trace(tmp_path / "trace.txt")
+    one, many = tmp_path / "one.bin", tmp_path / "many.bin"
+    convert(str(text), str(one))
+    convert(str(text), str(many), block_size=1024)
+    a, b = read_binary(str(one), with_keys=True), read_binary(str(many), with_keys=True)
+    assert a.keys.tolist() == b.keys.tolist()
+    np.testing.assert_array_equal(a.key_len, b.key_len)
+
+
+def test_mapped_trace_keys(tmp_path):
+    text = write_trace(tmp_path / "trace.txt")
+    binary = tmp_path / "trace.bin"
+    convert(str(text), str(binary))
+    from_text, from_binary = MappedTrace(str(text), with_keys=True), MappedTrace(str(binary))
+    assert len(from_text) == len(from_binary)
+    for i in range(len(from_text)):
+        assert bytes(from_binary.key(i)).rstrip(b"\0") == bytes(from_text.key(i))
+    with pytest.raises(ValueError):
+        from_binary.value(0)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from workload import count_workload
+
+
+def write_trace(path, n_ops=3000, seed=0):
+    """
+    Random trace over a small key space, so keys are inserted more than once
+    and updated and queried before they are inserted, or never. A phase
+    marker splits it in two.
+    """
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(n_ops):
+        if i == n_ops // 3:
+            lines.append("# run")
+        key = f"user{rng.integers(400):05d}"
+        op = rng.choice(["I", "U", "P", "S", "D"], p=[0.3, 0.25, 0.35, 0.05, 0.05])
+        if op in "IU":
+            lines.append(f"{op} {key} {'v' * int(rng.integers(1, 40))}")
+        elif op == "S":
+            lines.append(f"S {key} user{rng.integers(400):05d}")
+        else:
+            lines.append(f"{op} {key}")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def assert_same_profile(actual, expected):
+    key_to_idx, op_stats = actual
+    expected_key_to_idx, expected_op_stats = expected
+    assert key_to_idx == expected_key_to_idx
+    assert len(op_stats) == len(expected_op_stats)
+    for (op, counter, idx), (expected_op, expected_counter, expected_idx) in zip(op_stats, expected_op_stats):
+        assert op == expected_op
+        assert counter == expected_counter
+        np.testing.assert_allclose(np.asarray(idx), np.asarray(expected_idx))
+
+
+@pytest.mark.parametrize("options", [{"vectorized": True}, {"processes": 1}, {"processes": 3}], ids=str)
+def test_modes_match_stream(tmp_path, options):
+    trace = str(write_trace(tmp_path / "trace.txt"))
+    expected = count_workload(trace)
+    assert_same_profile(count_workload(trace, **options), expected)
+
+
+def test_never_inserted_keys_are_left_out(tmp_path):
+    trace = tmp_path / "trace.txt"
+    trace.write_text("U a x\nP b\nI a v\nU a w\nP a\nP c\n")
+    key_to_idx, ((_, updates, update_idx), (_, queries, query_idx)) = count_workload(str(trace), processes=2)
+    assert set(key_to_idx) == {b"a"}
+    assert updates == {b"a": 1} and queries == {b"a": 1}
+    assert len(update_idx) == 1 and len(query_idx) == 1
@@ -0,0 +1,159 @@
+"""
+Time series of a run, iostat samples and the harness timeline, and their
+resampling for plots.
+
+Runs of the same system don't take the same time, and a long run has far
+more samples than a plot has pixels. Samples are first placed on a common
+axis: seconds since the start of the run (`iostat_times`) or the share of
+the run's operations done by then (`progress`), so runs line up by how far
+through the trace they are rather than by sample number. `envelope` then
+aggregates a series into fixed buckets of that axis, keeping the mean and
+also the min and max of every bucket so a burst of a few seconds still
+shows on a run of hours. `lttb` thins out a single line for drawing, it
+keeps the samples that preserve the shape of the line best.
+"""
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+BYTE_TO_GB = 1024 * 1024 * 1024
+KB_TO_BYTES = 1024
+# Timeline ops that group other ops, which are recorded on their own as well.
+BATCH_OPS = {"write batch", "multiget"}
+
+
+def load_iostat(path):
+    with open(path) as f:
+        data = json.load(f)
+    stats = data["sysstat"]["hosts"][0]["statistics"]
+
+    reads = [
+        float(s.get("disk", [{}])[0].get("kB_read/s", 0.0)) * KB_TO_BYTES / BYTE_TO_GB
+        for s in stats
+    ]
+    writes = [
+        float(s.get("disk", [{}])[0].get("kB_wrtn/s", 0.0)) * KB_TO_BYTES / BYTE_TO_GB
+        for s in stats
+    ]
+    return np.array(reads), np.array(writes)
+
+
+def load_timeline(path: Path) -> dict:
+    """
+    Columns of a harness timeline (`--timeline`): `t`, `interval`, `unix` and
+    `phase` per interval, `ops[op][field]` and `tickers[name]`, cumulative
+    since the start of the phase.
+    """
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        raise RuntimeError(f"Empty timeline {path}")
+    return {
+        "t": np.array([r["t"] for r in records]),
+        "interval": np.array([r["interval"] for r in records]),
+        "unix": np.array([r["unix"] for r in records]),
+        "phase": np.array([r.get("phase", "") for r in records]),
+        "ops": {
+            op: {k: np.array([r["ops"][op][k] for r in records], dtype=float) for k in fields}
+            for op, fields in records[0]["ops"].items()
+        },
+        "tickers": {
+            name: np.array([r["tickers"][name] for r in records], dtype=float)
+            for name in records[0]["tickers"]
+        },
+    }
+
+
+def iostat_times(path: Path, timeline: dict | None = None) -> np.ndarray:
+    """
+    Seconds since the start of the harness run at the end of every iostat
+    sample. With timestamps (`S_TIME_FORMAT=ISO iostat -t`) and a timeline
+    samples are placed by wall clock, otherwise iostat is assumed to have
+    started with the run.
+    """
+    with open(path) as f:
+        stats = json.load(f)["sysstat"]["hosts"][0]["statistics"]
+    if timeline is not None and stats and "timestamp" in stats[0]:
+        run_start = timeline["unix"][0] - timeline["t"][0]
+        return np.array([datetime.fromisoformat(s["timestamp"]).timestamp() - run_start for s in stats])
+    return np.arange(1, len(stats) + 1, dtype=float)
+
+
+def progress(times: np.ndarray, timeline: dict) -> np.ndarray:
+    """
+    Share of the run's operations done at `times`, seconds since the start
+    of the run, interpolated between the intervals of its timeline. Before
+    the run it is 0, after it 1.
+    """
+    counts = sum(v["count"] for op, v in timeline["ops"].items() if op not in BATCH_OPS)
+    done = np.cumsum(counts)
+    if done[-1] == 0:
+        raise RuntimeError("Timeline without operations")
+    return np.interp(times, np.r_[0.0, timeline["t"]], np.r_[0.0, done] / done[-1])
+
+
+@dataclass
+class Envelope:
+    """A series aggregated into buckets, NaN for buckets without samples."""
+
+    edges: np.ndarray
+    mean: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+
+    @property
+    def centers(self) -> np.ndarray:
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+
+def envelope(x: np.ndarray, y: np.ndarray, edges: np.ndarray) -> Envelope:
+    """
+    Mean, min and max of the `y` whose `x` falls into each bucket
+    `[edges[i], edges[i + 1])`, the last bucket includes its right edge.
+    Samples outside the edges are left out.
+    """
+    n = len(edges) - 1
+    bucket = np.searchsorted(edges, x, side="right") - 1
+    bucket[x == edges[-1]] = n - 1
+    inside = (bucket >= 0) & (bucket < n) & ~np.isnan(y)
+    bucket, y = bucket[inside], y[inside]
+
+    count = np.bincount(bucket, minlength=n)
+    total = np.bincount(bucket, weights=y, minlength=n)
+    low = np.full(n, np.nan)
+    high = np.full(n, np.nan)
+    # fmin and fmax take the other operand over NaN, the initial value.
+    np.fmin.at(low, bucket, y)
+    np.fmax.at(high, bucket, y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, total / count, np.nan)
+    return Envelope(edges, mean, low, high)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    `n_out` of the samples chosen by Largest-Triangle-Three-Buckets
+    (Steinarsson, 2013): the first and last sample, and from each of
+    `n_out - 2` buckets in between the sample forming the largest triangle
+    with the one chosen before and the mean of the next bucket. Peaks are
+    kept, unlike with a stride. Returns all samples if there are no more
+    than `n_out`.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    # Bucket i holds the samples [bounds[i], bounds[i + 1]), the last sample is a bucket on its own.
+    bounds = np.r_[np.linspace(1, n - 1, n_out - 1).astype(int), n]
+    chosen = np.empty(n_out, dtype=int)
+    chosen[0] = a = 0
+    for i in range(n_out - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_x = x[end : bounds[i + 2]].mean()
+        next_y = y[end : bounds[i + 2]].mean()
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        chosen[i + 1] = a = start + int(np.argmax(area))
+    chosen[-1] = n - 1
+    return x[chosen], y[chosen]
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Compact binary workload traces.
+
+A binary trace is the magic `TRCB`, a version byte and a flags byte
+(`DICT_KEYS`, `ELIDE_VALUES`), followed by blocks of records. Every block
+stores its records column by column so it can be decoded with array ops:
+
+    u64 n_records
+    u64 len, op bytes                  one opcode byte per record
+    u64 len, key varints               key id per record (DICT_KEYS) or key length
+    u64 n_new, u64 len, new key varints   lengths of the keys first seen in this block
+    u64 len, key bytes                 new keys (DICT_KEYS) or every key, concatenated
+    u64 len, value length varints      length of everything after the key
+    u64 len, body bytes                bodies that are kept, concatenated
+
+With `DICT_KEYS`, key ids are assigned in order of first appearance, so the
+new keys of a block are exactly the ids past the ones seen before. With
+`ELIDE_VALUES`, only the lengths of I/U/M values are kept, the end key or
+count of S/R operations is always stored.
+"""
+import argparse
+import struct
+
+import numpy as np
+
+from tracefile import (
+    BINARY_MAGIC as MAGIC,
+    BLOCK_SIZE,
+    OpChar,
+    TraceColumns,
+    concat,
+    gather,
+    iter_blocks,
+    map_file,
+    parse_block,
+)
+
+VERSION = 1
+DICT_KEYS = 1
+ELIDE_VALUES = 2
+
+HEADER = struct.Struct("<4sBB")
+U64 = struct.Struct("<Q")
+
+VALUE_OPS = [OpChar.INSERT.code, OpChar.UPDATE.code, OpChar.MERGE.code]
+
+
+def encode_varints(values: np.ndarray) -> np.ndarray:
+    """LEB128-encode unsigned integers into one byte array."""
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        n_bytes += values >= np.uint64(1 << (7 * k))
+    ends = np.cumsum(n_bytes)
+    out = np.empty(int(ends[-1]) if len(values) else 0, dtype=np.uint8)
+    starts = ends - n_bytes
+    for k in range(int(n_bytes.max()) if len(values) else 0):
+        m = n_bytes > k
+        byte = (values[m] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        byte |= np.where(n_bytes[m] > k + 1, np.uint64(0x80), np.uint64(0))
+        out[starts[m] + k] = byte
+    return out
+
+
+def decode_varints(buf: np.ndarray) -> np.ndarray:
+    """Decode a byte array of back-to-back LEB128 integers."""
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    n_bytes = ends - starts + 1
+    values = np.zeros(len(ends), dtype=np.uint64)
+    for k in range(int(n_bytes.max()) if len(ends) else 0):
+        m = n_bytes > k
+        values[m] |= (buf[starts[m] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+    return values
+
+
+def ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Indices of the concatenated ranges `[start, start + length)`."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, lengths) + np.arange(total)
+
+
+def write_section(f, data: np.ndarray):
+    f.write(U64.pack(len(data)))
+    f.write(np.ascontiguousarray(data, dtype=np.uint8).tobytes())
+
+
+def read_section(data: memoryview, pos: int) -> tuple[np.ndarray, int]:
+    (length,) = U64.unpack_from(data, pos)
+    pos += U64.size
+    return np.frombuffer(data[pos : pos + length], dtype=np.uint8), pos + length
+
+
+def convert(
+    src: str,
+    dst: str,
+    dict_keys: bool = True,
+    elide_values: bool = True,
+    block_size: int = 2 * BLOCK_SIZE,
+):
+    """
+    Stream the text trace `src` into the binary trace `dst`, one block of
+    text lines per binary block.
+    """
+    flags = (DICT_KEYS if dict_keys else 0) | (ELIDE_VALUES if elide_values else 0)
+    key_ids = {}
+    with open(dst, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags))
+        for _, block in iter_blocks(src, block_size):
+            buf = np.frombuffer(block, dtype=np.uint8)
+            cols = parse_block(buf, 0, with_keys=True)
+            key_start = cols.key_offset
+
+            if dict_keys:
+                uniq, first, inverse = np.unique(cols.key_hash, return_index=True, return_inverse=True)
+                # Ids of keys seen before, new keys get the next ids in order
+                # of their first appearance in the block.
+                ids = np.array([key_ids.get(h, -1) for h in uniq.tolist()], dtype=np.int64)
+                new = np.flatnonzero(ids < 0)
+                new = new[np.argsort(first[new])]
+                ids[new] = np.arange(len(key_ids), len(key_ids) + len(new))
+                key_ids.update(zip(uniq[new].tolist(), ids[new].tolist()))
+                key_field = ids[inverse.ravel()]
+                new_first = first[new]
+                new_len = cols.key_len[new_first]
+                key_bytes = buf[ranges(key_start[new_first], new_len)]
+            else:
+                key_field = cols.key_len
+                new_len = np.empty(0, dtype=np.uint32)
+                key_bytes = buf[ranges(key_start, cols.key_len)]
+
+            kept = np.ones(len(cols), dtype=bool)
+            if elide_values:
+                kept = ~np.isin(cols.op, VALUE_OPS)
+            body_start = key_start + cols.key_len + 1
+            body_len = np.where(kept & (cols.val_len > 0), cols.val_len, 0)
+            bodies = buf[ranges(body_start, body_len)]
+
+            f.write(U64.pack(len(cols)))
+            write_section(f, cols.op)
+            write_section(f, encode_varints(key_field))
+            f.write(U64.pack(len(new_len)))
+            write_section(f, encode_varints(new_len))
+            write_section(f, key_bytes)
+            write_section(f, encode_varints(cols.val_len))
+            write_section(f, bodies)
+
+
+def iter_binary_blocks(filename: str, with_keys: bool = True):
+    """
+    Yield `(columns, key_ids, new_keys, new_key_hash)` for every block of a
+    binary trace. With DICT_KEYS `columns.keys` is left empty, `key_ids`
+    holds the id of every record's key and `new_keys` the keys first seen
+    in the block, otherwise the last three are None. `columns.key_offset`
+    is not meaningful for binary traces and is -1. Without `with_keys` the
+    keys and their hashes are None, copying and hashing them is half the
+    time of reading a block.
+    """
+    data = memoryview(map_file(filename))
+    magic, version, flags = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{filename} is not a version {VERSION} binary trace")
+
+    # Lengths of the keys seen so far by id, grown by doubling.
+    known_len = np.empty(1024, dtype=np.uint32)
+    n_known = 0
+
+    pos = HEADER.size
+    while pos < len(data):
+        (n,) = U64.unpack_from(data, pos)
+        pos += U64.size
+        op, pos = read_section(data, pos)
+        key_field, pos = read_section(data, pos)
+        key_field = decode_varints(key_field).astype(np.int64)
+        pos += U64.size  # n_new, implied by the number of new key lengths
+        new_len, pos = read_section(data, pos)
+        new_len = decode_varints(new_len).astype(np.int64)
+        key_bytes, pos = read_section(data, pos)
+        val_len, pos = read_section(data, pos)
+        val_len = decode_varints(val_len).astype(np.uint32)
+        _, pos = read_section(data, pos)
+
+        lengths = new_len if flags & DICT_KEYS else key_field
+        keys, key_hash = gather(key_bytes, np.cumsum(lengths) - lengths, lengths) if with_keys else (None, None)
+        cols = TraceColumns(
+            op=op.copy(),
+            key_offset=np.full(n, -1, dtype=np.int64),
+            key_len=key_field.astype(np.uint32),
+            val_len=val_len,
+        )
+
+        if not flags & DICT_KEYS:
+            cols.keys, cols.key_hash = keys, key_hash
+            yield cols, None, None, None
+            continue
+
+        if n_known + len(new_len) > len(known_len):
+            grown = np.empty(max(2 * len(known_len), n_known + len(new_len)), dtype=np.uint32)
+            grown[:n_known] = known_len[:n_known]
+            known_len = grown
+        known_len[n_known : n_known + len(new_len)] = new_len
+        n_known += len(new_len)
+        cols.key_len = known_len[key_field]
+        yield cols, key_field, keys, key_hash
+
+
+def read_binary(filename: str, with_keys: bool = False) -> TraceColumns:
+    """Read a whole binary trace into the same columns `parse_trace` returns."""
+    parts, ids, dictionary, dictionary_hash = [], [], [], []
+    for cols, key_ids, new_keys, new_hash in iter_binary_blocks(filename, with_keys):
+        parts.append(cols)
+        if key_ids is not None:
+            ids.append(key_ids)
+            dictionary.append(new_keys)
+            dictionary_hash.append(new_hash)
+    cols = concat(parts)
+    if with_keys and ids:
+        ids = np.concatenate(ids)
+        cols.keys = np.concatenate(dictionary)[ids]
+        cols.key_hash = np.concatenate(dictionary_hash)[ids]
+    elif not with_keys:
+        cols.keys = cols.key_hash = None
+    return cols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a text workload trace into a binary trace.")
+    parser.add_argument("src", help="text trace written by tectonic-cli or YCSB")
+    parser.add_argument("dst", help="binary trace to write")
+    parser.add_argument("--no-dict", action="store_true", help="store every key instead of key ids")
+    parser.add_argument("--keep-values", action="store_true", help="keep value bodies, needed for replay")
+    args = parser.parse_args()
+
+    convert(args.src, args.dst, dict_keys=not args.no_dict, elide_values=not args.keep_values)
+
+
+if __name__ == "__main__":
+    main()
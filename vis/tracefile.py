@@ -0,0 +1,389 @@
+import mmap
+import os
+from collections import Counter
+from dataclasses import dataclass
+from enum import StrEnum
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+import cache
+
+# Parse the trace 4 MiB at a time, every block is handled with array ops only.
+# The lines of a block stay in the CPU caches between the passes over them,
+# with 64 MiB blocks every pass misses and parsing takes twice as long.
+BLOCK_SIZE = 4 * 1024 * 1024
+# Bytes read from the start of every key at once to find its end, longer
+# keys are walked byte by byte from there.
+KEY_WINDOW = 40
+
+NEWLINE = ord("\n")
+CARRIAGE_RETURN = ord("\r")
+SPACE = ord(" ")
+# Lines starting with it mark the start of a trace phase for the harness.
+PHASE_MARKER = ord("#")
+
+# First bytes of a binary trace, see tracebin.py.
+BINARY_MAGIC = b"TRCB"
+
+FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+FNV_PRIME = np.uint64(0x100000001B3)
+
+
+class OpChar(StrEnum):
+    INSERT = "I"
+    UPDATE = "U"
+    MERGE = "M"
+    DELETE_POINT = "D"
+    DELETE_RANGE = "R"
+    QUERY_POINT = "P"
+    QUERY_RANGE = "S"
+
+    @property
+    def code(self) -> int:
+        """Byte value of the operation, as stored in `TraceColumns.op`."""
+        return ord(self.value)
+
+
+@dataclass
+class TraceColumns:
+    """
+    Columnar view of a workload trace, one row per operation.
+
+    `val_len` is the length of everything after the key: the value for
+    I/U/M, the end key (or count) for S/R and 0 for P/D. `keys` holds the
+    keys as a fixed-width bytes array and `key_hash` their 64-bit FNV-1a
+    hash, both are only filled when requested.
+    """
+
+    op: np.ndarray
+    key_offset: np.ndarray
+    key_len: np.ndarray
+    val_len: np.ndarray
+    keys: np.ndarray | None = None
+    key_hash: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.op)
+
+
+def is_binary(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def map_file(filename: str) -> mmap.mmap | bytes:
+    """
+    Map `filename` read-only. The mapping is never closed explicitly, it is
+    released once the last view into it is dropped.
+    """
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, "madvise"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+
+def iter_blocks(
+    filename: str,
+    block_size: int = BLOCK_SIZE,
+    start: int = 0,
+    end: int | None = None,
+    mapped: mmap.mmap | bytes | None = None,
+):
+    """
+    Yield `(file_offset, block)` pairs where every block is a run of whole
+    lines of `filename[start:end]`, as a zero-copy view into the mapped file.
+    A final line without a newline is copied and gets one appended.
+
+    Pages of a block are dropped from the mapping once the next block is
+    requested, they stay in the page cache but no longer count towards RSS.
+    """
+    if mapped is None:
+        mapped = map_file(filename)
+    data = memoryview(mapped)
+    end = len(data) if end is None else end
+    while start < end:
+        cut = mapped.find(b"\n", min(start + block_size, end) - 1, end) + 1
+        if cut == 0:
+            yield start, bytes(data[start:end]) + b"\n"
+            return
+        yield start, data[start:cut]
+        release(mapped, start, cut)
+        start = cut
+
+
+def release(mapped: mmap.mmap | bytes, start: int, end: int):
+    """Drop the whole pages of `mapped[start:end]` from the process' resident set."""
+    if not hasattr(mapped, "madvise") or not hasattr(mmap, "MADV_DONTNEED"):
+        return
+    first = -(-start // mmap.PAGESIZE) * mmap.PAGESIZE
+    last = end // mmap.PAGESIZE * mmap.PAGESIZE
+    if last > first:
+        mapped.madvise(mmap.MADV_DONTNEED, first, last - first)
+
+
+def windows(buf: np.ndarray, start: np.ndarray, width: int) -> np.ndarray:
+    """
+    `buf[start:start + width]` for every start as the rows of one array,
+    zero past the end of `buf`. One fancy index through a strided view of
+    `buf` copies all rows, instead of one pass over the starts per byte.
+    """
+    out = np.zeros((len(start), width), dtype=np.uint8)
+    last = len(buf) - width
+    inside = start <= last
+    if last >= 0:
+        rows = as_strided(buf, (last + 1, width), (buf.strides[0], 1), writeable=False)
+        out[inside] = rows[start[inside]]
+    # Only the last few lines of a buffer come this close to its end.
+    for i in np.flatnonzero(~inside):
+        tail = buf[start[i] : start[i] + width]
+        out[i, : len(tail)] = tail
+    return out
+
+
+def gather(buf: np.ndarray, start: np.ndarray, length: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Copy the byte ranges `buf[start:start + length]` into a fixed-width bytes
+    array, and return it along with the FNV-1a hash of every range.
+    """
+    if len(start) == 0:
+        return np.empty(0, dtype="S1"), np.empty(0, dtype=np.uint64)
+    width = max(int(length.max()), 1)
+    out = windows(buf, start, width)
+    hashes = np.full(len(start), FNV_OFFSET, dtype=np.uint64)
+    shortest = int(length.min())
+    if shortest < width:
+        out[np.arange(width) >= length[:, None]] = 0
+    # The columns every key covers need no masking.
+    for col in range(width):
+        column = out[:, col]
+        if col < shortest:
+            np.bitwise_xor(hashes, column, out=hashes)
+            np.multiply(hashes, FNV_PRIME, out=hashes)
+            continue
+        inside = length > col
+        hashes[inside] = (hashes[inside] ^ column[inside]) * FNV_PRIME
+    return out.view(f"S{width}").ravel(), hashes
+
+
+def key_lengths(buf: np.ndarray, key_start: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Length of every key: up to the first space or the end of its line. Only
+    the first KEY_WINDOW bytes of a line are looked at unless its key is
+    longer, that way the (long) values are never scanned.
+    """
+    limit = ends - key_start
+    space = windows(buf, key_start, KEY_WINDOW) == SPACE
+    first = space.argmax(axis=1)
+    found = space[np.arange(len(first)), first]
+    key_len = np.minimum(np.where(found, first, KEY_WINDOW), limit)
+
+    pending = np.flatnonzero(~found & (limit > KEY_WINDOW))
+    pos, end = key_start[pending] + KEY_WINDOW, ends[pending]
+    while len(pending):
+        done = (buf[pos] == SPACE) | (pos == end)
+        if done.any():
+            key_len[pending[done]] = pos[done] - key_start[pending[done]]
+            left = ~done
+            pending, pos, end = pending[left], pos[left], end[left]
+        pos += 1
+    return key_len
+
+
+def parse_block(buf: np.ndarray, base: int = 0, with_keys: bool = False) -> TraceColumns:
+    """
+    Parse a buffer of whole `<op> <key>[ <rest>]` lines. Offsets are
+    relative to `base`, phase markers are skipped.
+    """
+    ends = np.flatnonzero(buf == NEWLINE)
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    ends -= (ends > starts) & (buf[ends - 1] == CARRIAGE_RETURN)
+
+    non_empty = (ends > starts) & (buf[starts] != PHASE_MARKER)
+    starts, ends = starts[non_empty], ends[non_empty]
+
+    key_start = np.minimum(starts + 2, ends)
+    key_len = key_lengths(buf, key_start, ends).astype(np.uint32)
+    key_end = key_start + key_len
+    val_len = np.where(key_end < ends, ends - key_end - 1, 0).astype(np.uint32)
+
+    keys, key_hash = gather(buf, key_start, key_len) if with_keys else (None, None)
+    return TraceColumns(
+        op=buf[starts],
+        key_offset=key_start.astype(np.int64) + base,
+        key_len=key_len,
+        val_len=val_len,
+        keys=keys,
+        key_hash=key_hash,
+    )
+
+
+def concat(parts: list[TraceColumns]) -> TraceColumns:
+    with_keys = bool(parts) and all(p.keys is not None for p in parts)
+    return TraceColumns(
+        op=np.concatenate([p.op for p in parts]) if parts else np.empty(0, np.uint8),
+        key_offset=np.concatenate([p.key_offset for p in parts]) if parts else np.empty(0, np.int64),
+        key_len=np.concatenate([p.key_len for p in parts]) if parts else np.empty(0, np.uint32),
+        val_len=np.concatenate([p.val_len for p in parts]) if parts else np.empty(0, np.uint32),
+        keys=np.concatenate([p.keys for p in parts]) if with_keys else None,
+        key_hash=np.concatenate([p.key_hash for p in parts]) if with_keys else None,
+    )
+
+
+def parse_trace(
+    filename: str,
+    with_keys: bool = False,
+    block_size: int = BLOCK_SIZE,
+    start: int = 0,
+    end: int | None = None,
+    mapped: mmap.mmap | bytes | None = None,
+) -> TraceColumns:
+    """
+    Parse an I/U/P/S/D/R/M trace into columns, either whole or only the
+    lines in the byte range `[start, end)` (see `split_ranges`). Binary
+    traces (see `tracebin.py`) are always read whole.
+    """
+    if is_binary(filename):
+        # tracebin builds on this module, so it is only imported when needed.
+        from tracebin import read_binary
+
+        return read_binary(filename, with_keys)
+    parts = [
+        parse_block(np.frombuffer(block, dtype=np.uint8), offset, with_keys)
+        for offset, block in iter_blocks(filename, block_size, start, end, mapped)
+    ]
+    return concat(parts)
+
+
+def load_trace(filename: str, with_keys: bool = False, cache_dir: str | None = None) -> TraceColumns:
+    """`parse_trace` for a whole file, cached on disk next to the trace (see `cache.py`)."""
+    kind = "columns-keys" if with_keys else "columns"
+    if (arrays := cache.load(filename, kind, cache_dir)) is not None:
+        return TraceColumns(**arrays)
+    cols = parse_trace(filename, with_keys)
+    cache.store(filename, kind, {name: value for name, value in vars(cols).items() if value is not None}, cache_dir)
+    return cols
+
+
+def split_ranges(filename: str, n_ranges: int) -> list[tuple[int, int]]:
+    """
+    Split `filename` into at most `n_ranges` byte ranges of roughly equal
+    size. Every range starts at the beginning of a line and ends right after
+    a newline (or at the end of the file), so ranges can be parsed on their
+    own and concatenated in order. Binary traces are a single range.
+    """
+    size = os.path.getsize(filename)
+    if is_binary(filename):
+        return [(0, size)]
+    bounds = [0]
+    with open(filename, "rb") as f:
+        for i in range(1, n_ranges):
+            target = size * i // n_ranges
+            if target <= bounds[-1]:
+                continue
+            # Step back one byte so a range that starts right after a
+            # newline is not pushed to the next line.
+            f.seek(target - 1)
+            f.readline()
+            bound = min(f.tell(), size)
+            if bound > bounds[-1]:
+                bounds.append(bound)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class MappedTrace:
+    """
+    A trace mapped into memory together with its parsed columns.
+
+    Keys and values are handed out as memoryviews into the mapping, so
+    counting, hashing and length statistics never decode or copy a value.
+    Views stay valid as long as they are referenced.
+
+    Binary traces (see tracebin.py) have no key offsets into the file, their
+    keys are always loaded and handed out from the key column instead, and
+    their values are not available.
+    """
+
+    def __init__(self, filename: str, with_keys: bool = False, block_size: int = BLOCK_SIZE):
+        self.filename = filename
+        self.binary = is_binary(filename)
+        self.mapped = map_file(filename)
+        self.data = memoryview(self.mapped)
+        self.columns = parse_trace(filename, with_keys or self.binary, block_size, mapped=self.mapped)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def op(self, i: int) -> OpChar:
+        return OpChar(chr(self.columns.op[i]))
+
+    def key(self, i: int) -> memoryview:
+        if self.binary:
+            # Fixed-width bytes lose trailing NUL bytes, the length restores them.
+            return memoryview(self.columns.keys[i].ljust(int(self.columns.key_len[i]), b"\0"))
+        start = int(self.columns.key_offset[i])
+        return self.data[start : start + int(self.columns.key_len[i])]
+
+    def value(self, i: int) -> memoryview:
+        """Everything after the key, see `TraceColumns.val_len`."""
+        if self.binary:
+            raise ValueError(f"{self.filename} is a binary trace, values are not available")
+        start = int(self.columns.key_offset[i] + self.columns.key_len[i]) + 1
+        return self.data[start : start + int(self.columns.val_len[i])]
+
+    def keys(self, indices=None):
+        """Yield the keys of all operations, or of `indices` (positions or a mask)."""
+        positions = np.arange(len(self)) if indices is None else np.arange(len(self))[indices]
+        for i in positions:
+            yield self.key(i)
+
+
+def op_counts(cols: TraceColumns) -> Counter:
+    codes, counts = np.unique(cols.op, return_counts=True)
+    return Counter({chr(code): int(count) for code, count in zip(codes, counts)})
+
+
+def value_counts(values: np.ndarray, labels: np.ndarray | None = None) -> Counter:
+    """Count occurrences of `values`, reported as `labels[value]` if given."""
+    uniq, counts = np.unique(values, return_counts=True)
+    if labels is not None:
+        uniq = labels[uniq]
+    return Counter(dict(zip(uniq.tolist(), counts.tolist())))
+
+
+def factorize(cols: TraceColumns) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return `(unique_keys, key_ids)` with `unique_keys[key_ids] == cols.keys`.
+    Keys are told apart by their 64-bit hash, which sorts much faster than
+    the fixed-width bytes.
+    """
+    _, first, key_ids = np.unique(cols.key_hash, return_index=True, return_inverse=True)
+    return cols.keys[first], key_ids.ravel()
+
+
+def last_occurrence(mask: np.ndarray, key_ids: np.ndarray) -> np.ndarray:
+    """
+    For every operation, the position of the latest operation at or before
+    it on the same key for which `mask` is set, or -1 if there is none.
+    """
+    n = len(key_ids)
+    order = np.argsort(key_ids, kind="stable")
+    sorted_ids = key_ids[order]
+
+    candidate = np.where(mask[order], np.arange(n), -1)
+    filled = np.maximum.accumulate(candidate) if n else candidate
+
+    group_start = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]) if n else candidate
+    start_of = group_start[np.searchsorted(group_start, np.arange(n), side="right") - 1]
+
+    result = np.full(n, -1, dtype=np.int64)
+    valid = filled >= start_of
+    result[order[valid]] = order[filled[valid]]
+    return result
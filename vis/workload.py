@@ -0,0 +1,477 @@
+import json
+import os
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+from sys import float_info
+
+import numpy as np
+
+from cache import load as cache_load, store as cache_store
+from tracefile import OpChar, last_occurrence, parse_trace, split_ranges, value_counts
+
+# Read the trace in 64 MiB chunks, values are never decoded or kept around.
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def bytes_to_human(n_bytes: int) -> str:
+    units = ["B", "KB", "MB", "GB", "TB"]
+    size = float(n_bytes)
+    for unit in units:
+        if size < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+
+def array_stats(arr) -> dict:
+    arr = np.asarray(arr)  # ensure it's a numpy array
+    if arr.size == 0:
+        return {}
+
+    percentiles = np.percentile(arr, [25, 50, 75, 95, 99])
+
+    return {
+        "min": np.min(arr),
+        "p25": percentiles[0],
+        "p50": percentiles[1],  # median
+        "p75": percentiles[2],
+        "p95": percentiles[3],
+        "p99": percentiles[4],
+        "max": np.max(arr),
+        "mean": np.mean(arr),
+        "std": np.std(arr, ddof=1),  # sample std dev
+    }
+
+
+def iter_lines(filename: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield the lines of `filename` as bytes (without the trailing newline),
+    reading `chunk_size` bytes at a time so the whole trace is never resident.
+    """
+    with open(filename, "rb") as f:
+        yield from split_lines(iter(lambda: f.read(chunk_size), b""))
+
+
+def split_lines(chunks):
+    """Yield the lines of a trace that arrives as arbitrary `chunks` of bytes."""
+    tail = b""
+    for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def profile_summary(
+    empty_point_query_count, insert_duplicates, not_inserted_count, bytes_read, bytes_written,
+    key_len, insert_val_len, update_val_len, pq_val_len,
+) -> dict:
+    """Counts and length statistics of a profile, what `report` prints, as plain numbers."""
+    def stats(arr):
+        return {name: value.item() for name, value in array_stats(arr).items()}
+
+    return {
+        "empty_point_query_count": int(empty_point_query_count),
+        "insert_duplicates": int(insert_duplicates),
+        "not_inserted_count": int(not_inserted_count),
+        "bytes_read": int(bytes_read),
+        "bytes_written": int(bytes_written),
+        "key len": stats(key_len),
+        "insert": stats(insert_val_len),
+        "update": stats(update_val_len),
+        "pq": stats(pq_val_len),
+    }
+
+
+def report(summary: dict):
+    for name in ["empty_point_query_count", "insert_duplicates", "not_inserted_count"]:
+        print(f"{name}={summary[name]}")
+    print(f"bytes read {bytes_to_human(summary['bytes_read'])} ({summary['bytes_read']} B)")
+    print(f"bytes written {bytes_to_human(summary['bytes_written'])} ({summary['bytes_written']} B)")
+
+    for name in ["key len", "insert", "update", "pq"]:
+        print(name, summary[name])
+
+
+def count_workload(
+    filename: str,
+    chunk_size: int = CHUNK_SIZE,
+    vectorized: bool = False,
+    processes: int | None = None,
+    cache: bool = False,
+    cache_dir: str | None = None,
+):
+    """
+    Profile a workload trace, by default in a single streaming pass (see
+    `count_workload_stream`).
+
+    With `vectorized=True` the trace is parsed into columns with NumPy
+    instead, see `count_workload_columns`, and with `processes` set the
+    columns are built by that many worker processes, see
+    `count_workload_parallel`. With `cache=True` the result is stored on
+    disk and reused until the trace changes, see `cache.py`. The summary
+    (see `report`) is printed either way.
+
+    Returns `(key_to_idx, op_stats)` where `op_stats` is
+    `(("Update", counter, idx), ("Point Query", counter, idx))`. Keys, of
+    `key_to_idx` and the counters, are the raw `bytes` of the trace.
+
+    Updates and point queries of a key that was never inserted have no
+    insertion index. They count as writes and reads, but are left out of
+    `counter` and `idx` and counted in `not_inserted_count` instead, the
+    same in every mode.
+    """
+    arrays = cache_load(filename, "profile", cache_dir) if cache else None
+    # Entries cached before summaries were stored are computed again.
+    if arrays is not None and (summary := summary_from_arrays(arrays)) is not None:
+        print(f"loaded {filename} from cache")
+        report(summary)
+        return profile_from_arrays(arrays)
+
+    print(f"counting {filename}")
+    if processes is not None:
+        result, summary = count_workload_parallel(filename, processes)
+    elif vectorized:
+        result, summary = count_workload_columns(filename)
+    else:
+        result, summary = count_workload_stream(filename, chunk_size)
+    report(summary)
+
+    if cache:
+        cache_store(filename, "profile", profile_to_arrays(result, summary), cache_dir)
+    return result
+
+
+def profile_to_arrays(result, summary: dict | None = None) -> dict[str, np.ndarray]:
+    key_to_idx, op_stats = result
+    arrays = {
+        "keys": np.array(list(key_to_idx), dtype=bytes),
+        "key_idx": np.fromiter(key_to_idx.values(), dtype=np.int64, count=len(key_to_idx)),
+        "ops": np.array([op for op, _, _ in op_stats]),
+    }
+    if summary is not None:
+        arrays["summary"] = np.array(json.dumps(summary))
+    for i, (_, counter, idx) in enumerate(op_stats):
+        arrays[f"labels{i}"] = np.array(list(counter), dtype=bytes)
+        arrays[f"counts{i}"] = np.fromiter(counter.values(), dtype=np.int64, count=len(counter))
+        arrays[f"idx{i}"] = np.asarray(idx, dtype=np.float64)
+    return arrays
+
+
+def profile_from_arrays(arrays: dict[str, np.ndarray]):
+    key_to_idx = dict(zip(arrays["keys"].tolist(), arrays["key_idx"].tolist()))
+    op_stats = tuple(
+        (
+            str(op),
+            Counter(dict(zip(arrays[f"labels{i}"].tolist(), arrays[f"counts{i}"].tolist()))),
+            arrays[f"idx{i}"],
+        )
+        for i, op in enumerate(arrays["ops"])
+    )
+    return key_to_idx, op_stats
+
+
+def summary_from_arrays(arrays: dict[str, np.ndarray]) -> dict | None:
+    return json.loads(str(arrays["summary"])) if "summary" in arrays else None
+
+
+def count_workload_stream(filename: str, chunk_size: int = CHUNK_SIZE):
+    """Profile a workload trace in a single streaming pass, see `profile_lines`. Returns `(result, summary)`."""
+    return profile_lines(iter_lines(filename, chunk_size))
+
+
+def profile_lines(lines):
+    """
+    Profile the `lines` of a workload trace in a single pass, e.g. of a trace
+    that is never written to disk (see stream_trace.py).
+
+    Only key -> insertion index and value lengths are kept, the values
+    themselves are dropped as soon as their length is known. Lengths and
+    normalized indices live in typed arrays (8 bytes or less per op) instead
+    of lists of Python objects.
+
+    Returns the `count_workload` result and its summary (see `report`).
+    """
+    insert = OpChar.INSERT.encode()
+    update = OpChar.UPDATE.encode()
+    query_point = OpChar.QUERY_POINT.encode()
+
+    key_to_idx = {}
+    val_len = {}
+    n_inserts = 0
+    bytes_written = 0
+    bytes_read = 0
+
+    key_len = array("I")
+    insert_val_len = array("I")
+    insert_duplicates = 0
+
+    update_idx = array("d")
+    update_counter = Counter()
+    update_val_len = array("I")
+
+    point_query_idx = array("d")
+    point_query_counter = Counter()
+    empty_point_query_count = 0
+    not_inserted_count = 0
+
+    pq_val_len = array("I")
+
+    for line in lines:
+        line = line.rstrip()
+        op = line[:1]
+        if op == insert:
+            _, key, val = line.split(b" ", maxsplit=2)
+            if key in key_to_idx:
+                insert_duplicates += 1
+
+            key_to_idx[key] = n_inserts
+            val_len[key] = len(val)
+            n_inserts += 1
+
+            key_len.append(len(key))
+            bytes_written += len(key) + len(val)
+            insert_val_len.append(len(val))
+
+        elif op == update:
+            _, key, val = line.split(b" ", maxsplit=2)
+            val_len[key] = len(val)
+            update_val_len.append(len(val))
+            bytes_written += len(key) + len(val)
+
+            idx = key_to_idx.get(key)
+            if idx is None:
+                not_inserted_count += 1
+                continue
+            update_idx.append(max(idx / n_inserts, float_info.epsilon))
+            update_counter[key] += 1
+
+        elif op == query_point:
+            _, key = line.split(b" ", maxsplit=1)
+
+            length = val_len.get(key)
+            if length is None:
+                empty_point_query_count += 1
+                bytes_read += len(key)
+                continue
+            bytes_read += len(key) + length
+            pq_val_len.append(length)
+
+            idx = key_to_idx.get(key)
+            if idx is None:
+                not_inserted_count += 1
+                continue
+            point_query_counter[key] += 1
+            point_query_idx.append(max(idx / n_inserts, float_info.epsilon))
+
+    summary = profile_summary(
+        empty_point_query_count, insert_duplicates, not_inserted_count, bytes_read, bytes_written,
+        key_len, insert_val_len, update_val_len, pq_val_len,
+    )
+    return (key_to_idx, (
+        ("Update", update_counter, np.frombuffer(update_idx, dtype=np.float64)),
+        ("Point Query", point_query_counter, np.frombuffer(point_query_idx, dtype=np.float64)),
+    )), summary
+
+
+def count_workload_columns(filename: str):
+    """
+    Same profile as `count_workload`, computed with array operations over the
+    parsed trace. Keeps a few columns per operation in memory, in exchange it
+    does not touch any Python object per operation. Returns `(result, summary)`.
+    """
+    return merge_shards([profile_range(filename)])
+
+
+def count_workload_parallel(filename: str, processes: int | None = None):
+    """
+    `count_workload_columns` with the trace split into newline-aligned byte
+    ranges that are profiled in a process pool and merged in file order.
+    """
+    processes = processes or os.cpu_count()
+    ranges = split_ranges(filename, processes)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        shards = list(pool.map(profile_range, repeat(filename), *zip(*ranges)))
+    return merge_shards(shards)
+
+
+@dataclass
+class ShardProfile:
+    """
+    Profile of one byte range of a trace.
+
+    Insertion ordinals are local to the shard and -1 for lookups of keys
+    that were not inserted earlier in the same shard, those are resolved
+    against the earlier shards' `table_*` (last insert ordinal and last
+    written value length per key) by `merge_shards`.
+    """
+
+    n_inserts: int
+    bytes_written: int
+    pq_key_bytes: int
+
+    key_len: np.ndarray
+    insert_val_len: np.ndarray
+    update_val_len: np.ndarray
+    insert_keys: np.ndarray
+    insert_hash: np.ndarray
+
+    # Per update / point query: key hash, local ordinal, inserts so far.
+    update_hash: np.ndarray
+    update_ordinal: np.ndarray
+    update_seen: np.ndarray
+    pq_hash: np.ndarray
+    pq_ordinal: np.ndarray
+    pq_val_len: np.ndarray
+    pq_seen: np.ndarray
+
+    # Per distinct key of the shard.
+    table_hash: np.ndarray
+    table_keys: np.ndarray
+    table_ordinal: np.ndarray
+    table_val_len: np.ndarray
+
+
+def profile_range(filename: str, start: int = 0, end: int | None = None) -> ShardProfile:
+    cols = parse_trace(filename, with_keys=True, start=start, end=end)
+    _, first, key_ids = np.unique(cols.key_hash, return_index=True, return_inverse=True)
+    key_ids = key_ids.ravel()
+
+    is_insert = cols.op == OpChar.INSERT.code
+    is_update = cols.op == OpChar.UPDATE.code
+    is_pq = cols.op == OpChar.QUERY_POINT.code
+    is_write = is_insert | is_update
+
+    # Number of inserts seen so far, the denominator of the normalized index.
+    n_inserts = np.cumsum(is_insert)
+    last_insert = last_occurrence(is_insert, key_ids)
+    last_write = last_occurrence(is_write, key_ids)
+    ordinal = np.where(last_insert >= 0, n_inserts[last_insert] - 1, -1)
+    val_len = np.where(last_write >= 0, cols.val_len[last_write].astype(np.int64), -1)
+
+    # Positions of the last insert / write of every key in the shard.
+    final_insert = np.full(len(first), -1, dtype=np.int64)
+    np.maximum.at(final_insert, key_ids[is_insert], np.flatnonzero(is_insert))
+    final_write = np.full(len(first), -1, dtype=np.int64)
+    np.maximum.at(final_write, key_ids[is_write], np.flatnonzero(is_write))
+
+    writes = cols.key_len[is_write].sum(dtype=np.int64) + cols.val_len[is_write].sum(dtype=np.int64)
+    return ShardProfile(
+        n_inserts=int(n_inserts[-1]) if len(n_inserts) else 0,
+        bytes_written=int(writes),
+        pq_key_bytes=int(cols.key_len[is_pq].sum(dtype=np.int64)),
+        key_len=cols.key_len[is_insert],
+        insert_val_len=cols.val_len[is_insert],
+        update_val_len=cols.val_len[is_update],
+        insert_keys=cols.keys[is_insert],
+        insert_hash=cols.key_hash[is_insert],
+        update_hash=cols.key_hash[is_update],
+        update_ordinal=ordinal[is_update],
+        update_seen=n_inserts[is_update],
+        pq_hash=cols.key_hash[is_pq],
+        pq_ordinal=ordinal[is_pq],
+        pq_val_len=val_len[is_pq],
+        pq_seen=n_inserts[is_pq],
+        table_hash=cols.key_hash[first],
+        table_keys=cols.keys[first],
+        table_ordinal=np.where(final_insert >= 0, n_inserts[final_insert] - 1, -1),
+        table_val_len=np.where(final_write >= 0, cols.val_len[final_write].astype(np.int64), -1),
+    )
+
+
+def merge_shards(shards: list[ShardProfile]):
+    """
+    Combine shard profiles, given in file order, into the `count_workload`
+    result and its summary. Local insertion ordinals are rebased by the
+    number of inserts in the preceding shards, and unresolved lookups take
+    the last insert / write of their key from the closest preceding shard
+    that has one.
+    """
+    inserts_before = np.cumsum([0] + [s.n_inserts for s in shards])
+    n = len(shards)
+
+    def rebased(field):
+        return np.concatenate([
+            np.where(getattr(s, field) >= 0, getattr(s, field) + inserts_before[i], -1)
+            for i, s in enumerate(shards)
+        ])
+
+    def cat(field):
+        return np.concatenate([getattr(s, field) for s in shards])
+
+    def shard_of(field):
+        return np.repeat(np.arange(n), [len(getattr(s, field)) for s in shards])
+
+    update_ordinal = rebased("update_ordinal")
+    pq_ordinal = rebased("pq_ordinal")
+    pq_val_len = cat("pq_val_len")
+    update_hash, pq_hash = cat("update_hash"), cat("pq_hash")
+
+    # Unresolved lookups sort right before the table of their own shard, so
+    # the last table entry before them comes from an earlier shard.
+    table_ordinal = rebased("table_ordinal")
+    table_val_len = cat("table_val_len")
+    table_hash = cat("table_hash")
+    events_hash = np.concatenate([table_hash, update_hash, pq_hash])
+    events_shard = np.concatenate([shard_of("table_hash"), shard_of("update_hash"), shard_of("pq_hash")])
+    events_kind = np.repeat([1, 0, 0], [len(table_hash), len(update_hash), len(pq_hash)])
+    order = np.lexsort((events_kind, events_shard))
+    is_table = events_kind[order] == 1
+    events = events_hash[order]
+
+    def resolve(table_values):
+        values = np.concatenate([table_values, np.full(len(events_hash) - len(table_hash), -1)])[order]
+        last = last_occurrence(is_table & (values >= 0), events)
+        resolved = np.empty(len(events_hash), dtype=np.int64)
+        resolved[order] = np.where(last >= 0, values[np.maximum(last, 0)], -1)
+        return resolved[len(table_hash):]
+
+    ordinal_lookup = resolve(table_ordinal)
+    val_len_lookup = resolve(table_val_len)
+    n_updates = len(update_hash)
+    update_ordinal = np.where(update_ordinal >= 0, update_ordinal, ordinal_lookup[:n_updates])
+    pq_ordinal = np.where(pq_ordinal >= 0, pq_ordinal, ordinal_lookup[n_updates:])
+    pq_val_len = np.where(pq_val_len >= 0, pq_val_len, val_len_lookup[n_updates:])
+
+    update_seen = np.concatenate([s.update_seen + inserts_before[i] for i, s in enumerate(shards)])
+    pq_seen = np.concatenate([s.pq_seen + inserts_before[i] for i, s in enumerate(shards)])
+
+    found = pq_val_len >= 0
+    pq_val_len = pq_val_len[found]
+    insert_hash = cat("insert_hash")
+    # Lookups of keys written by updates only, see `count_workload`.
+    update_inserted = update_ordinal >= 0
+    pq_inserted = pq_ordinal[found] >= 0
+
+    summary = profile_summary(
+        empty_point_query_count=int(np.count_nonzero(~found)),
+        insert_duplicates=int(len(insert_hash) - len(np.unique(insert_hash))),
+        not_inserted_count=int(np.count_nonzero(~update_inserted) + np.count_nonzero(~pq_inserted)),
+        bytes_read=sum(s.pq_key_bytes for s in shards) + int(pq_val_len.sum(dtype=np.int64)),
+        bytes_written=sum(s.bytes_written for s in shards),
+        key_len=cat("key_len"),
+        insert_val_len=cat("insert_val_len"),
+        update_val_len=cat("update_val_len"),
+        pq_val_len=pq_val_len,
+    )
+
+    label_hash, first = np.unique(table_hash, return_index=True)
+    labels = cat("table_keys")[first]
+
+    def counter(hashes):
+        return value_counts(np.searchsorted(label_hash, hashes), labels)
+
+    def normalized_idx(ordinal, seen):
+        return np.maximum(ordinal / seen, float_info.epsilon)
+
+    key_to_idx = dict(zip(cat("insert_keys").tolist(), range(int(inserts_before[-1]))))
+    return (key_to_idx, (
+        ("Update", counter(update_hash[update_inserted]),
+         normalized_idx(update_ordinal[update_inserted], update_seen[update_inserted])),
+        ("Point Query", counter(pq_hash[found][pq_inserted]),
+         normalized_idx(pq_ordinal[found][pq_inserted], pq_seen[found][pq_inserted])),
+    )), summary